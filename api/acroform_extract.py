@@ -0,0 +1,58 @@
+import re
+from typing import Dict, Optional, Tuple
+
+from widget_schemas_ import widget_mapping, widget_form_names, widget_required_entities
+
+# Widget values are read verbatim from the PDF, so they are reported as certain
+WIDGET_CONFIDENCE = 1.0
+
+# Suffix PDF mergers append to field names that collide, e.g. "Page1[0] [780].f1_01[0]"
+MERGE_SUFFIX = re.compile(r" \[\d+\]")
+
+
+def read_widget_values(doc, start_page: int = 0, end_page: Optional[int] = None) -> Dict[str, str]:
+    """Collect every non-empty form widget value in a page range, keyed by field name"""
+    if end_page is None:
+        end_page = len(doc) - 1
+
+    values = {}
+    for page_number in range(start_page, end_page + 1):
+        for widget in doc[page_number].widgets():
+            value = widget.field_value
+            if value in (None, "", "Off") or isinstance(value, bool):
+                continue
+            values.setdefault(MERGE_SUFFIX.sub("", widget.field_name), str(value))
+    return values
+
+
+def map_widget_values(form_name: str, widget_values: Dict[str, str]) -> Optional[Tuple[Dict[str, str], Dict[str, float]]]:
+    """
+    Map raw widget values to the entity names the Document AI processor emits.
+    Returns (form_data, confidence_data), or None when the form has no usable
+    widgets or any required entity is blank, so the caller falls back to Document AI.
+    """
+    mapping = widget_mapping.get(form_name)
+    if not mapping or not widget_values:
+        return None
+
+    form_data = {}
+    for entity_name, widget_names in mapping.items():
+        if isinstance(widget_names, str):
+            value = widget_values.get(widget_names, "")
+        else:
+            parts = [widget_values.get(widget_name, "").strip() for widget_name in widget_names]
+            value = "-".join(parts) if all(parts) else ""
+
+        # Same normalisation as trim_text, plus the CR/LF pairs widgets keep
+        value = " ".join(value.split())
+        if value:
+            form_data[entity_name] = value
+
+    if any(not form_data.get(entity_name) for entity_name in widget_required_entities.get(form_name, [])):
+        return None
+
+    if form_name in widget_form_names:
+        form_data["form_name"] = widget_form_names[form_name]
+
+    confidence_data = {field_name: WIDGET_CONFIDENCE for field_name in form_data}
+    return form_data, confidence_data
@@ -1,21 +1,36 @@
 import pandas as pd
-import pymupdf
 import io
 import os
-import tempfile
 import time
-import gc  # Add garbage collection import
-import json
-from flask import Flask, jsonify, request, send_file
+import itertools
+import multiprocessing
+import hashlib
+from contextlib import closing
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from flask_cors import CORS
 from google.cloud import documentai_v1 as documentai
-from google.oauth2 import service_account
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from google.api_core.exceptions import Unauthenticated
+from google.auth.exceptions import DefaultCredentialsError
+from google.protobuf import field_mask_pb2
 
 # Import your existing modules
-from schemas_ import map_forms_to_processor_ids, FILE_TEXT, field_mapping, file_paths
-from tac_calc import calculate_form_1040_values
+from schemas_ import map_forms_to_processor_ids, processor_page_limits, field_mapping, file_paths
+from tac_calc import calculate_form_1040_values, recalculate_form_1040_values
+from tax_tables import describe_tax_tables, TAX_METHOD
+from tax_batch import sweep_scenarios, iter_sweep_records
+from form_records import normalize_form
+from form_index import load_form_index, classify_texts, score_texts
+from acroform_extract import map_widget_values
+from docai_clients import get_client, reset_client, warm_up
+from docai_dispatcher import dispatch_iter, FakeProcessor
+from extraction_cache import open_extraction_cache
+from jobs import JobQueue, QueueFullError
+from pdf_templates import get_template, get_templates, preload_templates, FILL_MODES, FIELD_DATA_MIMETYPES, TEMPLATE_SOURCES
+from batch_fill import iter_filled, iter_zip, read_payloads, BATCH_FILL_MAX_JSON_BYTES
+from pdf_cache import open_filled_pdf_cache, filled_pdf_key
+from uploads import read_uploads, close_uploads, UploadTooLargeError, UploadBudgetExceeded, UPLOAD_BUDGET, MAX_REQUEST_BYTES
+from memory_stats import MemoryMonitor
+import cpu_pool
 
 app = Flask(__name__)
 CORS(app, origins=[
@@ -34,165 +49,674 @@ PROJECT_ID = "tax-docs-ext"
 LOCATION = "us"  # Format is 'us' or 'eu'
 MIME_TYPE = "application/pdf"
 
-brackets_2024 = [11_600, 47_150, 100_525, 191_950, 243_725, 609_350, -1]
-tax_rates_2024 = [0.10, 0.12, 0.22, 0.24, 0.32, 0.35, 0.37]
+# Response fields requested from Document AI (a FieldMask); only the entities are read,
+# so text, pages, layout and tokens are left out. Document AI accepts only top-level
+# Document fields or pages.{field} here (entities.type is rejected with InvalidArgument),
+# so the entities come back whole. Empty asks for the whole Document
+DOCAI_FIELD_MASK = [path for path in os.environ.get('DOCAI_FIELD_MASK', 'entities').split(',') if path]
 
-def cleanup_memory():
-    """Force garbage collection to free up memory"""
-    gc.collect()
+# Send each processor only the leading pages it extracts from (see processor_page_limits)
+DOCAI_TRIM_PAGES = os.environ.get('DOCAI_TRIM_PAGES', '1') != '0'
+
+# Spawned CPU pool workers run this script again as "__mp_main__" while they start (under
+# `python app.py`), before parent_process() is set; they load their own templates and index in
+# cpu_pool._init_worker, so the startup of the API process itself is skipped there
+IS_POOL_WORKER = __name__ == "__mp_main__" or multiprocessing.parent_process() is not None
+
+# TF-IDF form index, fitted once over the form texts and loaded at boot
+FORM_INDEX = None if IS_POOL_WORKER else load_form_index()
+
+# Extraction results keyed by file hash and processor, so re-uploads skip extraction and Document AI
+# (disabled under the fake processor so its output never lands in the cache)
+EXTRACTION_CACHE = None if os.environ.get('DOCAI_FAKE_PROCESSOR') or IS_POOL_WORKER else open_extraction_cache()
+
+# Fillable templates (the 1040 and its schedules) are loaded from the prebuilt registry once
+if not IS_POOL_WORKER:
+    preload_templates()
+
+# Recently filled PDFs, so reopening the results view does not refill the form
+FILLED_PDF_CACHE = open_filled_pdf_cache()
+
+# RSS and latency of every request, with adaptive garbage collection instead of a gc.collect() per call
+MEMORY = MemoryMonitor()
+
+@app.before_request
+def start_memory_tracking():
+    g.memory = MEMORY.start(request.endpoint or request.path)
+
+@app.after_request
+def record_response_status(response):
+    g.status_code = response.status_code
+    return response
+
+@app.teardown_request
+def finish_memory_tracking(exc=None):
+    # Streamed responses keep the request context, so this runs once the stream ends
+    tracker = g.pop("memory", None)
+    if tracker is not None:
+        MEMORY.finish(tracker, g.pop("status_code", 500 if exc else None))
+
+# Build the Document AI client and fetch a token at app start, not on the first upload
+if os.environ.get('DOCAI_WARM_UP', '1') != '0' and not IS_POOL_WORKER:
+    warm_up([LOCATION])
+
+# Start the CPU pool (PDF parsing, TF-IDF, form filling) with templates and index loaded in each worker
+if os.environ.get('CPU_POOL_WARM_UP', '1') != '0' and not IS_POOL_WORKER:
+    try:
+        cpu_pool.warm_up()
+    except Exception as e:
+        print(f"⚠️ CPU worker pool failed to start ({e}); running PDF tasks inline")
+        cpu_pool.run_inline()
 
 def online_process(project_id: str, location: str, processor_id: str, file_content: bytes, mime_type: str) -> documentai.Document:
     """
     Processes a document using the Document AI Online Processing API.
     Modified to work with file content instead of file path.
     """
-    opts = {"api_endpoint": f"{location}-documentai.googleapis.com"}
-    
-    # Handle Google Cloud authentication
-    credentials = None
-    if 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in os.environ:
-        # Use service account from environment variable (for Render deployment)
-        credentials_json = json.loads(os.environ['GOOGLE_APPLICATION_CREDENTIALS_JSON'])
-        credentials = service_account.Credentials.from_service_account_info(credentials_json)
-    
-    # Instantiates a client
-    if credentials:
-        documentai_client = documentai.DocumentProcessorServiceClient(
-            client_options=opts, 
-            credentials=credentials
-        )
-    else:
-        # Fall back to default credentials (for local development)
-        documentai_client = documentai.DocumentProcessorServiceClient(client_options=opts)
+    # Shared, lazily created client for this location (see docai_clients)
+    documentai_client = get_client(location)
     
     # The full resource name of the processor
     resource_name = documentai_client.processor_path(project_id, location, processor_id)
     
-    # Load Binary Data into Document AI RawDocument Object
-    raw_document = documentai.RawDocument(content=file_content, mime_type=mime_type)
+    # Load Binary Data into Document AI RawDocument Object (the request needs its own bytes,
+    # so a memoryview over an upload buffer is copied here and nowhere earlier)
+    raw_document = documentai.RawDocument(content=bytes(file_content), mime_type=mime_type)
     
-    # Configure the process request
-    request = documentai.ProcessRequest(name=resource_name, raw_document=raw_document)
+    # Configure the process request, asking only for the fields that are read back
+    request = documentai.ProcessRequest(
+        name=resource_name,
+        raw_document=raw_document,
+        field_mask=field_mask_pb2.FieldMask(paths=DOCAI_FIELD_MASK) if DOCAI_FIELD_MASK else None
+    )
     
     # Use the Document AI client to process the document
-    result = documentai_client.process_document(request=request)
+    try:
+        result = documentai_client.process_document(request=request)
+    except Unauthenticated:
+        # Credentials were revoked or rotated: rebuild the client once and retry
+        reset_client(location, documentai_client)
+        result = get_client(location).process_document(request=request)
     
     return result.document
 
+# Callable used for Document AI requests; DOCAI_FAKE_PROCESSOR swaps in a local fake for load testing
+if os.environ.get('DOCAI_FAKE_PROCESSOR'):
+    document_processor = FakeProcessor.from_spec(os.environ['DOCAI_FAKE_PROCESSOR'])
+    print(f"⚠️ Using fake Document AI processor: {os.environ['DOCAI_FAKE_PROCESSOR']}")
+else:
+    document_processor = online_process
+
 def trim_text(text: str):
     """Remove extra space characters from text"""
     return text.strip().replace("\n", " ")
 
-def get_text_from_pdf(pdf_file_data):
-    """Extract text from PDF file data for form identification"""
+def extract_entities(**kwargs):
+    """
+    Run the configured Document AI processor and keep only what the pipeline reads:
+    a compact [{"type", "mention_text", "confidence"}] list, so the Document is dropped at once
+    """
+    document = document_processor(**kwargs)
+    return [
+        {"type": trim_text(entity.type_), "mention_text": trim_text(entity.mention_text), "confidence": entity.confidence}
+        for entity in document.entities
+    ]
+
+def classify_pdf(pdf_bytes):
+    """
+    Classify a PDF reading only as many pages as it takes to be confident.
+    Runs on the CPU pool; returns (text read, classification) and raises if the PDF cannot be opened.
+    """
+    return cpu_pool.result(cpu_pool.submit_pdf(cpu_pool.classify_pdf_task, pdf_bytes))
+
+def identify_forms(filled_doc_txts):
+    """Identify the form type of many documents against all templates in one pass (on the CPU pool)"""
+    if not filled_doc_txts:
+        return []
     try:
-        if hasattr(pdf_file_data, 'read'):
-            pdf_bytes = pdf_file_data.read()
-        else:
-            pdf_bytes = pdf_file_data
-        
-        doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
-        res_text = ""
-        
-        for page in doc:
-            text = page.get_text()
-            res_text += text + "\n"
+        return cpu_pool.run(cpu_pool.classify_texts_task, filled_doc_txts)
+    except Exception as e:
+        print(f"Error classifying documents: {e}")
+        return [{"identified_form": None, "similarity_score": 0} for _ in filled_doc_txts]
+
+def fill_pdf_form(template, data_to_fill, field_mapping, mode="full"):
+    """
+    Fill PDF form fields with provided data and return filled PDF bytes.
+    `template` is a registered PdfTemplate, filled on the CPU pool from the workers' copy;
+    `mode` is one of FILL_MODES ("fdf"/"xfdf" return field data instead of a PDF).
+    """
+    try:
+        return cpu_pool.run(cpu_pool.fill_task, template.name, data_to_fill, field_mapping, mode)
         
-        doc.close()
-        res_text = res_text.replace(".\n", " ").replace("\n", " ")
-        return res_text
     except Exception as e:
-        return f"Error reading PDF: {str(e)}"
+        print(f"Error filling PDF: {e}")
+        import traceback
+        traceback.print_exc()
+        return None, [], [str(e)]
 
-def identify_form(filled_doc_txt):
-    """Identify which tax form this document represents using cosine similarity"""
-    highest_cosine_similarity = 0
-    highest_cosine_similarity_form = None
+def iter_process_uploads(uploads, progress=None):
+    """
+    Run the extract -> classify -> Document AI -> tax calculation pipeline, yielding
+    records as they are ready: one {"type": "result", "index", "sequence", "result"}
+    per form as soon as it is classified and extracted (in completion order), then a
+    final {"type": "summary", ...} with the tax calculation.
+    `uploads` is a list of {"filename", "content"} dicts (see uploads.read_uploads, whose
+    "sha256" is reused when present); `index` is the position of the
+    upload a result belongs to and `sequence` orders results within the whole batch.
+    `progress(position, stage)` is called as each upload moves through the pipeline.
+    """
+    def report(position, stage):
+        if progress:
+            try:
+                progress(position, stage)
+            except Exception as e:
+                print(f"⚠️ Progress callback failed: {e}")
     
-    filled_doc_txt = filled_doc_txt.replace("\n", " ")
-
-    # Compare against each form template
-    for form_name, form_txt in FILE_TEXT.items():
+    sequence = itertools.count()
+    pending = []
+    classification_paths = {"fingerprint": 0, "tfidf": 0}
+    extraction_paths = {"acroform": 0, "document_ai": 0}
+    counts = {"total_files": 0, "successful_extractions": 0}
+    
+    def emit(position, result, order=None):
+        counts["total_files"] += 1
+        if result.get("status") == "success":
+            counts["successful_extractions"] += 1
+        return {
+            "type": "result",
+            "index": position,
+            "sequence": next(sequence) if order is None else order,
+            "result": result
+        }
+    
+    # Step 1: Split every upload into its forms on the CPU pool, all uploads at once,
+    # skipping files whose extraction is cached
+    cached = {}
+    splits = {}
+    for position, upload in enumerate(uploads):
+        file_content = upload["content"]
+        if not upload["filename"].lower().endswith('.pdf') or file_content is None:
+            continue
         try:
-            vectorizer = TfidfVectorizer()
-            tfidf_matrix = vectorizer.fit_transform([filled_doc_txt, form_txt])
-            cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+            file_hash = upload.get("sha256") or hashlib.sha256(file_content).hexdigest()
             
-            if cosine_sim > highest_cosine_similarity:
-                highest_cosine_similarity = cosine_sim
-                highest_cosine_similarity_form = form_name
+            # Re-uploaded file: reuse every form extracted from it last time
+            cached_forms = EXTRACTION_CACHE.lookup(file_hash, map_forms_to_processor_ids) if EXTRACTION_CACHE else None
+            if cached_forms:
+                cached[position] = (file_hash, cached_forms)
+            else:
+                # Header signatures mark where each form starts; the pages are walked once
+                splits[position] = (file_hash, cpu_pool.submit_pdf(cpu_pool.split_pdf_task, file_content))
         except Exception as e:
-            print(f"Error comparing with {form_name}: {e}")
+            splits[position] = (None, e)
+    
+    # Then collect them in upload order
+    for position, upload in enumerate(uploads):
+        filename = upload["filename"]
+        
+        if position in cached:
+            file_hash, cached_forms = cached.pop(position)
+            for form in cached_forms:
+                pending.append({
+                    "position": position,
+                    "sequence": next(sequence),
+                    "filename": filename + form["segment_label"],
+                    "file_hash": file_hash,
+                    "pages": form["pages"],
+                    "classification": {
+                        "identified_form": form["identified_form"],
+                        "similarity_score": form["similarity_score"],
+                        "classification_path": form["classification_path"],
+                        "classification_ms": 0
+                    },
+                    "form_data": form["form_data"],
+                    "confidence_data": form["confidence_data"],
+                    "extraction_path": form["extraction_path"],
+                    "cache": "hit"
+                })
             continue
-
-    # Return the best matching form if similarity threshold met
-    if highest_cosine_similarity >= 0.8:
-        return highest_cosine_similarity_form, highest_cosine_similarity
-    return None, highest_cosine_similarity
-
-def fill_pdf_form(input_pdf_bytes, data_to_fill, field_mapping):
-    """
-    Fill PDF form fields with provided data and return filled PDF bytes.
-    """
-    try:
-        # Create temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_input:
-            temp_input.write(input_pdf_bytes)
-            temp_input_path = temp_input.name
         
-        # Open the PDF document
-        doc = pymupdf.open(temp_input_path)
+        if position not in splits:
+            yield emit(position, {
+                "filename": filename,
+                "error": "File is not a PDF",
+                "status": "error"
+            })
+            continue
         
-        filled_fields = []
-        not_found_fields = []
+        file_hash, split = splits.pop(position)
+        try:
+            if isinstance(split, Exception):
+                raise split
+            segments = cpu_pool.result(split)
+        except Exception as e:
+            print(f"Error reading {filename}: {e}")
+            yield emit(position, {
+                "filename": filename,
+                "error": str(e),
+                "status": "error"
+            })
+            continue
+        
+        if not segments:
+            yield emit(position, {
+                "filename": filename,
+                "error": "Error reading PDF: document has no pages",
+                "status": "error"
+            })
+            continue
         
-        # Iterate through the data to fill
-        for user_field_name, value in data_to_fill.items():
-            pdf_field_name = field_mapping.get(user_field_name)
+        for segment in segments:
+            entry = {
+                "position": position,
+                "sequence": next(sequence),
+                "filename": filename + segment["segment_label"],
+                "segment_label": segment["segment_label"],
+                "file_hash": file_hash,
+                "cache": "miss",
+                # A single form is sent as the upload itself; packet forms carry their own pages
+                "file_content": segment["content"] if segment["content"] is not None else upload["content"],
+                "pages": [segment["start_page"] + 1, segment["end_page"] + 1],
+                "widget_values": segment["widget_values"]
+            }
             
-            if not pdf_field_name:
-                not_found_fields.append(user_field_name)
-                continue
+            if segment["identified_form"]:
+                entry["classification"] = {
+                    "identified_form": segment["identified_form"],
+                    "similarity_score": None,
+                    "classification_path": "fingerprint",
+                    "classification_ms": segment["elapsed_ms"]
+                }
+            else:
+                entry["extracted_text"] = segment["extracted_text"]
+                entry["extraction_ms"] = segment["elapsed_ms"]
             
-            # Find and update the field in the PDF
-            field_found = False
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                widgets = page.widgets()
+            pending.append(entry)
+    
+    MEMORY.stage("extract_text")
+    
+    # Forms still outstanding per upload, so each upload reports "done" as its last form finishes
+    remaining = {}
+    for entry in pending:
+        remaining[entry["position"]] = remaining.get(entry["position"], 0) + 1
+    for position in range(len(uploads)):
+        report(position, "classifying" if position in remaining else "done")
+    
+    def finish(entry):
+        """Build the result of a form once its extraction is over and free its file contents"""
+        filename = entry["filename"]
+        classification = entry["classification"]
+        identified_form = classification["identified_form"]
+        
+        if "result" not in entry:
+            if "error" in entry:
+                error = entry["error"]
+                print(f"Error processing {filename}: {error}")
+                if isinstance(error, DefaultCredentialsError):
+                    entry["result"] = {
+                        "filename": filename,
+                        "status": "error",
+                        "error": "Google Cloud authentication not configured. Please set up service account credentials.",
+                        "identified_form": identified_form,
+                        "similarity_score": classification["similarity_score"],
+                        "classification_path": classification["classification_path"]
+                    }
+                else:
+                    entry["result"] = {
+                        "filename": filename,
+                        "error": str(error),
+                        "status": "error"
+                    }
+            else:
+                form_data = entry["form_data"]
+                confidence_data = entry["confidence_data"]
+                extraction_paths[entry["extraction_path"]] += 1
+                # Parsed once here; the tax calculation reads the typed record
+                entry["record"] = normalize_form(identified_form, form_data)
                 
-                for widget in widgets:
-                    if widget.field_name == pdf_field_name:
-                        widget.field_value = str(value)
-                        widget.update()
-                        filled_fields.append(f"{user_field_name} -> {pdf_field_name}: {value}")
-                        field_found = True
-                        break
+                entry["result"] = {
+                    "filename": filename,
+                    "status": "success",
+                    "identified_form": identified_form,
+                    "similarity_score": classification["similarity_score"],
+                    "classification_path": classification["classification_path"],
+                    "classification_ms": classification["classification_ms"],
+                    "extraction_path": entry["extraction_path"],
+                    "cache": entry["cache"],
+                    "pages": entry["pages"],
+                    "extracted_fields": len(form_data),
+                    "form_data": form_data,
+                    "confidence_data": confidence_data,
+                    "average_confidence": sum(confidence_data.values()) / len(confidence_data) if confidence_data else 0,
+                    "parse_errors": list(entry["record"].errors)
+                }
                 
-                if field_found:
-                    break
-            
-            if not field_found:
-                not_found_fields.append(f"{user_field_name} (PDF field: {pdf_field_name})")
+                print(f"✅ Successfully processed {filename} as {identified_form}")
         
-        # Save to bytes
-        pdf_bytes = doc.tobytes()
-        doc.close()
+        # Only the status is needed from here on; the result itself goes to the caller
+        result = entry.pop("result")
+        entry["status"] = result["status"]
+        for key in ("file_content", "widget_values", "extracted_text"):
+            entry.pop(key, None)
         
-        # Clean up temporary file
-        os.unlink(temp_input_path)
+        remaining[entry["position"]] -= 1
+        if not remaining[entry["position"]]:
+            report(entry["position"], "done")
         
-        return pdf_bytes, filled_fields, not_found_fields
+        return emit(entry["position"], result, entry["sequence"])
+    
+    # Step 2: Identify the remaining form types with TF-IDF in one vectorized pass
+    needs_tfidf = [entry for entry in pending if "classification" not in entry]
+    started = time.perf_counter()
+    classifications = identify_forms([entry["extracted_text"] for entry in needs_tfidf])
+    tfidf_ms_per_file = (time.perf_counter() - started) * 1000 / max(len(needs_tfidf), 1)
+    
+    for entry, classification in zip(needs_tfidf, classifications):
+        entry["classification"] = {
+            "identified_form": classification["identified_form"],
+            "similarity_score": classification["similarity_score"],
+            "classification_path": "tfidf",
+            # Header check + full extraction, plus this file's share of the batch TF-IDF pass
+            "classification_ms": entry["extraction_ms"] + tfidf_ms_per_file
+        }
+    
+    MEMORY.stage("classify")
+    docai_entries = []
+    
+    # Step 3: Route each form: widget values for fillable PDFs, otherwise its Document AI processor.
+    # Everything that needs no Document AI call is sent out straight away
+    for entry in pending:
+        filename = entry["filename"]
+        classification = entry["classification"]
+        identified_form = classification["identified_form"]
+        similarity_score = classification["similarity_score"]
+        classification_path = classification["classification_path"]
+        classification_paths[classification_path] += 1
         
-    except Exception as e:
-        print(f"Error filling PDF: {e}")
-        import traceback
-        traceback.print_exc()
-        return None, [], [str(e)]
+        if not identified_form:
+            extracted_text = entry.get("extracted_text") or ""
+            entry["result"] = {
+                "filename": filename,
+                "status": "warning",
+                "message": f"Could not identify form type (similarity: {similarity_score:.3f})",
+                "extracted_text_preview": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text,
+                "classification_path": classification_path,
+                "classification_ms": classification["classification_ms"]
+            }
+            yield finish(entry)
+            continue
+        
+        if entry["cache"] == "hit":
+            print(f"Reusing cached extraction of {filename} as {identified_form}")
+            yield finish(entry)
+            continue
+        
+        print(f"Processing {filename} as {identified_form} (via {classification_path})")
+        
+        processor_id = map_forms_to_processor_ids.get(identified_form)
+        entry["processor_id"] = processor_id
+        
+        if not processor_id:
+            entry["result"] = {
+                "filename": filename,
+                "status": "error",
+                "error": f"No processor configured for form type: {identified_form}"
+            }
+            yield finish(entry)
+            continue
+        
+        try:
+            widget_result = map_widget_values(identified_form, entry["widget_values"])
+        except Exception as e:
+            print(f"Error reading form widgets of {filename}: {e}")
+            widget_result = None
+        
+        if widget_result:
+            entry["form_data"], entry["confidence_data"] = widget_result
+            entry["extraction_path"] = "acroform"
+            yield finish(entry)
+        else:
+            docai_entries.append(entry)
+    
+    # Send each processor only the pages it reads (page 1 of a W-2 uploaded with its other copies)
+    trims = {}
+    if DOCAI_TRIM_PAGES:
+        for index, entry in enumerate(docai_entries):
+            page_limit = processor_page_limits.get(entry["classification"]["identified_form"])
+            if page_limit and entry["pages"][1] - entry["pages"][0] + 1 > page_limit:
+                trims[index] = cpu_pool.submit_pdf(cpu_pool.extract_pages_task, entry["file_content"], 0, page_limit - 1)
+    for index, future in trims.items():
+        entry = docai_entries[index]
+        try:
+            entry["file_content"] = cpu_pool.result(future)
+            print(f"✂️ Sending only the first {processor_page_limits[entry['classification']['identified_form']]} page(s) of {entry['filename']}")
+        except Exception as e:
+            print(f"⚠️ Could not trim {entry['filename']}, sending every page: {e}")
+    trims = None
+    
+    MEMORY.stage("route")
+    for position in {entry["position"] for entry in docai_entries}:
+        report(position, "extracting")
+    
+    # Step 4: Send the rest to Document AI concurrently, under per-processor quotas with retries,
+    # passing each form on as soon as its call returns
+    jobs = [
+        {
+            "processor_id": entry["processor_id"],
+            "kwargs": {
+                "project_id": PROJECT_ID,
+                "location": LOCATION,
+                "processor_id": entry["processor_id"],
+                "file_content": entry["file_content"],
+                "mime_type": MIME_TYPE
+            }
+        }
+        for entry in docai_entries
+    ]
+    
+    # Closed with this generator, so a client that goes away cancels the calls not yet sent
+    with closing(dispatch_iter(jobs, extract_entities)) as outcomes:
+        for index, outcome in outcomes:
+            entry = docai_entries[index]
+            jobs[index] = None
+            
+            if "error" in outcome:
+                entry["error"] = outcome["error"]
+            else:
+                # Step 5: Extract structured data
+                form_data = {}
+                confidence_data = {}
+            
+                for entity in outcome["result"]:
+                    form_data[entity["type"]] = entity["mention_text"]
+                    confidence_data[entity["type"]] = entity["confidence"]
+            
+                entry["form_data"] = form_data
+                entry["confidence_data"] = confidence_data
+                entry["extraction_path"] = "document_ai"
+            
+            yield finish(entry)
+    
+    jobs = None
+    docai_entries = None
+    MEMORY.stage("document_ai")
+    
+    # Cache each newly extracted file whose forms all succeeded
+    if EXTRACTION_CACHE:
+        forms_by_file = {}
+        for entry in pending:
+            forms_by_file.setdefault(entry["position"], []).append(entry)
+        
+        for entries in forms_by_file.values():
+            if entries[0]["cache"] == "miss" and all(entry["status"] == "success" for entry in entries):
+                try:
+                    EXTRACTION_CACHE.store(entries[0]["file_hash"], [
+                        {
+                            "identified_form": entry["classification"]["identified_form"],
+                            "processor_id": entry["processor_id"],
+                            "pages": entry["pages"],
+                            "segment_label": entry["segment_label"],
+                            "similarity_score": entry["classification"]["similarity_score"],
+                            "classification_path": entry["classification"]["classification_path"],
+                            "extraction_path": entry["extraction_path"],
+                            "form_data": entry["form_data"],
+                            "confidence_data": entry["confidence_data"]
+                        }
+                        for entry in entries
+                    ])
+                except Exception as e:
+                    print(f"⚠️ Could not cache extraction of {entries[0]['filename']}: {e}")
+    
+    # Later forms of the same type win, in upload order, whatever order they finished in
+    processed_forms_data = {}
+    for entry in pending:
+        if entry["status"] == "success":
+            processed_forms_data[entry["classification"]["identified_form"]] = entry["record"]
+    pending = None
+    
+    # Step 6: Perform tax calculations with available forms (handles missing data)
+    calculated_data = None
+    
+    if processed_forms_data:  # If we have any forms at all
+        try:
+            print(f"🧮 Attempting tax calculations with available forms: {list(processed_forms_data.keys())}")
+            calculated_data = calculate_form_1040_values(processed_forms_data)
+            print("✅ Tax calculations completed (missing data assumed as zeros)")
+        except Exception as e:
+            print(f"❌ Error in tax calculations: {e}")
+            import traceback
+            traceback.print_exc()
+            calculated_data = {"error": str(e)}
+    MEMORY.stage("tax_calculation")
+    
+    yield {
+        "type": "summary",
+        "total_files": counts["total_files"],
+        "successful_extractions": counts["successful_extractions"],
+        "processed_forms": list(processed_forms_data.keys()),
+        "classification_paths": classification_paths,
+        "extraction_paths": extraction_paths,
+        "calculated_tax_data": calculated_data
+    }
+
+def process_uploads(uploads, progress=None):
+    """
+    Run the whole pipeline and return one response: every result in upload order,
+    the summary counts and tax calculation, and the extracted data of each form.
+    """
+    records = []
+    summary = {}
+    for record in iter_process_uploads(uploads, progress):
+        if record["type"] == "result":
+            records.append(record)
+        else:
+            summary = record
+    
+    records.sort(key=lambda record: (record["index"], record["sequence"]))
+    results = [record["result"] for record in records]
+    
+    forms_data = {}
+    for result in results:
+        if result.get("status") == "success":
+            forms_data[result["identified_form"]] = result["form_data"]
+    
+    response_data = {
+        "results": results,
+        "total_files": summary.get("total_files", len(results)),
+        "successful_extractions": summary.get("successful_extractions", 0),
+        "processed_forms": summary.get("processed_forms", []),
+        "classification_paths": summary.get("classification_paths"),
+        "extraction_paths": summary.get("extraction_paths"),
+        "calculated_tax_data": summary.get("calculated_tax_data"),
+        "forms_data": forms_data
+    }
+    
+    return response_data
+
+def run_job(uploads, progress=None):
+    """Pipeline of a background job, tracked in /api/memory like a request"""
+    with MEMORY.track("job"):
+        return process_uploads(uploads, progress)
+
+# Background workers for /api/jobs, running the same pipeline
+JOB_QUEUE = JobQueue(run_job)
+
+STREAM_MIMETYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def get_stream_format():
+    """Streaming format asked for with ?stream=ndjson|sse or the Accept header, else None"""
+    stream_format = request.args.get('stream', '').lower()
+    if stream_format in STREAM_MIMETYPES:
+        return stream_format
+    accept = request.headers.get('Accept', '')
+    for stream_format, mimetype in STREAM_MIMETYPES.items():
+        if mimetype in accept:
+            return stream_format
+    return None
+
+def stream_results(uploads, stream_format):
+    """
+    Stream pipeline records as NDJSON lines or Server-Sent Events: one "result" record
+    per form as soon as it is ready, then a "summary" record with the tax calculation
+    """
+    def format_record(record):
+        payload = app.json.dumps(record)
+        if stream_format == "sse":
+            return f"event: {record['type']}\ndata: {payload}\n\n"
+        return payload + "\n"
+    
+    def generate():
+        try:
+            for record in iter_process_uploads(uploads):
+                yield format_record(record)
+        except Exception as e:
+            print(f"General error: {e}")
+            import traceback
+            traceback.print_exc()
+            yield format_record({"type": "error", "error": str(e)})
+        finally:
+            close_uploads(uploads)
+    
+    # Proxies such as nginx would otherwise buffer the stream until it ends
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    response = Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format], headers=headers)
+    # Also release the uploads if the client goes away before the stream starts
+    response.call_on_close(lambda: close_uploads(uploads))
+    return response
+
+def check_request_size():
+    """
+    413 response for a request body over MAX_REQUEST_BYTES, checked before it is parsed,
+    or 503 while memory stays above MEMORY_HIGH_WATER_BYTES; else None
+    """
+    if request.content_length and request.content_length > MAX_REQUEST_BYTES:
+        return jsonify({"error": f"Request body is {request.content_length} bytes, over the {MAX_REQUEST_BYTES} byte limit"}), 413
+    if MEMORY.under_pressure():
+        response = jsonify({"error": "Server memory is above its high-water mark; try again shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    return None
+
+def upload_rejected(e):
+    """Response for uploads refused by read_uploads: 413 when too large, 503 when the server is full"""
+    if isinstance(e, UploadBudgetExceeded):
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
+    return jsonify({"error": str(e)}), 413
 
 @app.route('/api/process-tax-documents', methods=['POST'])
 def process_tax_documents():
-    """Advanced processing of tax documents with Document AI and form filling"""
+    """
+    Advanced processing of tax documents with Document AI and form filling.
+    With ?stream=ndjson or ?stream=sse, results are streamed per form as they finish.
+    """
+    uploads = None
     try:
+        too_large = check_request_size()
+        if too_large:
+            return too_large
+        
         # Check if files were uploaded
         if 'pdfs' not in request.files:
             return jsonify({"error": "No PDF files provided"}), 400
@@ -202,164 +726,100 @@ def process_tax_documents():
         if not files or files[0].filename == '':
             return jsonify({"error": "No PDF files selected"}), 400
         
-        results = []
-        processed_forms_data = {}
+        uploads = read_uploads(files)
+        MEMORY.stage("read_uploads")
         
-        for file in files:
-            if file and file.filename.lower().endswith('.pdf'):
-                try:
-                    file.seek(0)
-                    file_content = file.read()
-                    
-                    # Step 1: Extract text for form identification
-                    file.seek(0)
-                    extracted_text = get_text_from_pdf(file)
-                    
-                    if extracted_text.startswith("Error"):
-                        results.append({
-                            "filename": file.filename,
-                            "error": extracted_text,
-                            "status": "error"
-                        })
-                        continue
-                    
-                    # Step 2: Identify form type
-                    identified_form, similarity_score = identify_form(extracted_text)
-                    
-                    if not identified_form:
-                        results.append({
-                            "filename": file.filename,
-                            "status": "warning",
-                            "message": f"Could not identify form type (similarity: {similarity_score:.3f})",
-                            "extracted_text_preview": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text
-                        })
-                        continue
-                    
-                    print(f"Processing {file.filename} as {identified_form}")
-                    
-                    # Step 3: Get processor ID for this form type
-                    processor_id = map_forms_to_processor_ids.get(identified_form)
-                    
-                    if not processor_id:
-                        results.append({
-                            "filename": file.filename,
-                            "status": "error",
-                            "error": f"No processor configured for form type: {identified_form}"
-                        })
-                        continue
-                    
-                    # Step 4: Process with Document AI
-                    try:
-                        document = online_process(
-                            project_id=PROJECT_ID,
-                            location=LOCATION,
-                            processor_id=processor_id,
-                            file_content=file_content,
-                            mime_type=MIME_TYPE,
-                        )
-                    except Exception as auth_error:
-                        if "DefaultCredentialsError" in str(auth_error):
-                            results.append({
-                                "filename": file.filename,
-                                "status": "error",
-                                "error": "Google Cloud authentication not configured. Please set up service account credentials.",
-                                "identified_form": identified_form,
-                                "similarity_score": similarity_score
-                            })
-                            continue
-                        else:
-                            raise auth_error
-                    
-                    # Step 5: Extract structured data
-                    form_data = {}
-                    confidence_data = {}
-                    
-                    for entity in document.entities:
-                        field_name = trim_text(entity.type_)
-                        field_value = trim_text(entity.mention_text)
-                        form_data[field_name] = field_value
-                        confidence_data[field_name] = entity.confidence
-                    
-                    processed_forms_data[identified_form] = form_data
-                    
-                    results.append({
-                        "filename": file.filename,
-                        "status": "success",
-                        "identified_form": identified_form,
-                        "similarity_score": similarity_score,
-                        "extracted_fields": len(form_data),
-                        "form_data": form_data,
-                        "confidence_data": confidence_data,
-                        "average_confidence": sum(confidence_data.values()) / len(confidence_data) if confidence_data else 0
-                    })
-                    
-                    print(f"✅ Successfully processed {file.filename} as {identified_form}")
-                    
-                except Exception as e:
-                    print(f"Error processing {file.filename}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    results.append({
-                        "filename": file.filename,
-                        "error": str(e),
-                        "status": "error"
-                    })
-                finally:
-                    # Clear file content from memory after processing each file
-                    file_content = None
-                    extracted_text = None
-                    document = None
-                    form_data = None
-                    confidence_data = None
-            else:
-                results.append({
-                    "filename": file.filename if file else "Unknown",
-                    "error": "File is not a PDF",
-                    "status": "error"
-                })
+        stream_format = get_stream_format()
+        if stream_format:
+            # The stream releases the uploads once it is done with them
+            streamed, uploads = uploads, None
+            return stream_results(streamed, stream_format)
         
-        # Step 6: Perform tax calculations with available forms (handles missing data)
-        calculated_data = None
+        response_data = process_uploads(uploads)
+        close_uploads(uploads)
+        uploads = None
         
-        if processed_forms_data:  # If we have any forms at all
-            try:
-                print(f"🧮 Attempting tax calculations with available forms: {list(processed_forms_data.keys())}")
-                calculated_data = calculate_form_1040_values(processed_forms_data)
-                print("✅ Tax calculations completed (missing data assumed as zeros)")
-            except Exception as e:
-                print(f"❌ Error in tax calculations: {e}")
-                import traceback
-                traceback.print_exc()
-                calculated_data = {"error": str(e)}
+        return jsonify(response_data)
         
-        response_data = {
-            "results": results,
-            "total_files": len(results),
-            "successful_extractions": len([r for r in results if r.get("status") == "success"]),
-            "processed_forms": list(processed_forms_data.keys()),
-            "calculated_tax_data": calculated_data,
-            "forms_data": processed_forms_data
-        }
+    except (UploadTooLargeError, UploadBudgetExceeded) as e:
+        print(f"⚠️ Upload rejected: {e}")
+        return upload_rejected(e)
+    except Exception as e:
+        print(f"General error: {e}")
+        import traceback
+        traceback.print_exc()
+        close_uploads(uploads)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_processing_job():
+    """Queue tax documents for background processing and return a job ID immediately"""
+    uploads = None
+    try:
+        too_large = check_request_size()
+        if too_large:
+            return too_large
         
-        # Clear large variables and force garbage collection
-        results = None
-        processed_forms_data = None
-        calculated_data = None
-        cleanup_memory()
+        if 'pdfs' not in request.files:
+            return jsonify({"error": "No PDF files provided"}), 400
         
-        return jsonify(response_data)
+        files = request.files.getlist('pdfs')
+        
+        if not files or files[0].filename == '':
+            return jsonify({"error": "No PDF files selected"}), 400
+        
+        # Queued uploads keep their share of the in-flight budget until the job has run
+        uploads = read_uploads(files)
+        job_id = JOB_QUEUE.submit(uploads)
+        uploads = None
+        print(f"📥 Queued job {job_id} with {len(files)} file(s)")
         
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/jobs/{job_id}",
+            "result_url": f"/api/jobs/{job_id}/result"
+        }), 202
+        
+    except (UploadTooLargeError, UploadBudgetExceeded) as e:
+        print(f"⚠️ Upload rejected: {e}")
+        return upload_rejected(e)
+    except QueueFullError as e:
+        close_uploads(uploads)
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        print(f"General error: {e}")
+        print(f"❌ Error queueing job: {e}")
         import traceback
         traceback.print_exc()
-        # Clear memory even on error
-        cleanup_memory()
+        close_uploads(uploads)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_processing_job(job_id):
+    """Status and per-file progress of a processing job"""
+    status = JOB_QUEUE.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job ID"}), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_processing_job_result(job_id):
+    """Final results of a processing job, in the same shape as /api/process-tax-documents"""
+    status = JOB_QUEUE.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job ID"}), 404
+    if status["status"] == "failed":
+        return jsonify({"error": status["error"], "status": "failed"}), 500
+    if status["status"] != "completed":
+        return jsonify(status), 202
+    return jsonify(JOB_QUEUE.result(job_id))
+
 @app.route('/api/generate-filled-pdf', methods=['POST'])
 def generate_filled_pdf():
-    """Generate a filled PDF from calculated tax data and return the file directly"""
+    """
+    Generate a filled PDF from calculated tax data and return the file directly.
+    "mode" (in the body or query string) picks full, fast (NeedAppearances), fdf or xfdf output.
+    """
     try:
         data = request.get_json()
         
@@ -367,61 +827,344 @@ def generate_filled_pdf():
             return jsonify({"error": "No calculated data provided"}), 400
         
         calculated_data = data['calculated_data']
+        mode = str(data.get('mode') or request.args.get('mode') or 'full').lower()
         
-        print("🔄 Generating filled PDF using f1040.pdf template...")
-        
-        # Use the f1040.pdf from pdfs directory
-        template_path = "./f1040.pdf"
+        if mode not in FILL_MODES:
+            return jsonify({"error": f"Unknown fill mode: {mode}", "available_modes": list(FILL_MODES)}), 400
         
-        if not os.path.exists(template_path):
-            return jsonify({"error": f"Template file not found: {template_path}"}), 400
-        
-        # Read template PDF
-        with open(template_path, 'rb') as f:
-            template_bytes = f.read()
-        
-        # Fill the form
-        filled_pdf_bytes, filled_fields, not_found_fields = fill_pdf_form(
-            template_bytes, calculated_data, field_mapping
-        )
+        # The registry holds f1040.pdf and its widget index in memory; every request fills a copy
+        try:
+            template = get_template("f1040")
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if filled_pdf_bytes is None:
-            return jsonify({
-                "error": "Failed to fill PDF form",
-                "not_found_fields": not_found_fields
-            }), 500
+        # The same data, template, mapping and mode always fill the same form,
+        # so the cache key doubles as the ETag
+        cache_key = filled_pdf_key(template.fingerprint, template.field_mapping, calculated_data, mode)
+        if request.if_none_match.contains_weak(cache_key):
+            response = Response(status=304)
+            response.set_etag(cache_key, weak=True)
+            return response
         
-        print(f"✅ Filled PDF generated successfully")
-        print(f"📝 Filled {len(filled_fields)} fields")
-        if not_found_fields:
-            print(f"⚠️ Could not find {len(not_found_fields)} fields: {not_found_fields}")
+        cached = FILLED_PDF_CACHE.get(cache_key) if FILLED_PDF_CACHE else None
+        if cached:
+            print(f"♻️ Serving cached filled PDF ({mode} mode)")
+            filled_pdf_bytes = cached["output"]
+        else:
+            print(f"🔄 Generating filled PDF using f1040.pdf template ({mode} mode)...")
+            
+            # Fill the form
+            filled_pdf_bytes, filled_fields, not_found_fields = fill_pdf_form(
+                template, calculated_data, template.field_mapping, mode
+            )
+            
+            if filled_pdf_bytes is None:
+                return jsonify({
+                    "error": "Failed to fill PDF form",
+                    "not_found_fields": not_found_fields
+                }), 500
+            
+            print(f"✅ Filled PDF generated successfully")
+            print(f"📝 Filled {len(filled_fields)} fields")
+            if not_found_fields:
+                print(f"⚠️ Could not find {len(not_found_fields)} fields: {not_found_fields}")
+            
+            if FILLED_PDF_CACHE:
+                FILLED_PDF_CACHE.put(cache_key, {
+                    "output": filled_pdf_bytes,
+                    "filled_fields": len(filled_fields),
+                    "not_found_fields": not_found_fields
+                })
         
         # Return the file directly from memory using BytesIO
-        output_filename = f"completed_f1040_{int(time.time())}.pdf"
+        extension = mode if mode in FIELD_DATA_MIMETYPES else "pdf"
+        output_filename = f"completed_f1040_{int(time.time())}.{extension}"
         pdf_stream = io.BytesIO(filled_pdf_bytes)
         
         # Clear large variables from memory
         filled_pdf_bytes = None
-        template_bytes = None
         calculated_data = None
-        cleanup_memory()
         
-        return send_file(
+        response = send_file(
             pdf_stream,
+            mimetype=FIELD_DATA_MIMETYPES.get(mode, 'application/pdf'),
+            as_attachment=mode in FIELD_DATA_MIMETYPES,  # Display PDFs in browser
+            download_name=output_filename,
+            etag=False
+        )
+        response.set_etag(cache_key, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
+        return response
+        
+    except Exception as e:
+        print(f"❌ Error generating filled PDF: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/generate-return-package', methods=['POST'])
+def generate_return_package():
+    """
+    Fill the 1040 and every schedule with data into one merged PDF.
+    Send {"calculated_data": {...}, "forms_data": {"schedule_1": {...}, ...}, "mode": "full"|"fast"};
+    forms_data is the extracted data from /api/process-tax-documents.
+    """
+    try:
+        data = request.get_json(silent=True)
+        
+        if not data or 'calculated_data' not in data:
+            return jsonify({"error": "No calculated data provided"}), 400
+        
+        mode = str(data.get('mode') or request.args.get('mode') or 'full').lower()
+        if mode not in ("full", "fast"):
+            return jsonify({"error": f"Unknown package fill mode: {mode}", "available_modes": ["full", "fast"]}), 400
+        
+        forms_data = {"f1040": data['calculated_data']}
+        skipped_forms = []
+        for form_name, form_data in (data.get('forms_data') or {}).items():
+            if form_name in TEMPLATE_SOURCES and form_name != "f1040" and form_name in get_templates():
+                forms_data[form_name] = normalize_form(form_name, form_data)
+            else:
+                skipped_forms.append(form_name)
+        
+        print(f"🔄 Generating return package with {', '.join(forms_data)} ({mode} mode)...")
+        package_bytes, report = cpu_pool.run(cpu_pool.fill_package_task, forms_data, mode)
+        print(f"✅ Return package generated: {len(report)} form(s)")
+        if skipped_forms:
+            print(f"⚠️ No fillable template for: {skipped_forms}")
+        
+        response = send_file(
+            io.BytesIO(package_bytes),
             mimetype='application/pdf',
             as_attachment=False,  # Display in browser
-            download_name=output_filename
+            download_name=f"completed_return_{int(time.time())}.pdf"
         )
+        response.headers["X-Package-Forms"] = ",".join(report)
+        package_bytes = None
+        return response
         
     except Exception as e:
-        print(f"❌ Error generating filled PDF: {e}")
+        print(f"❌ Error generating return package: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/generate-filled-pdfs', methods=['POST'])
+def generate_filled_pdfs():
+    """
+    Fill many returns on the batch worker pool and stream them back as a ZIP, one entry
+    per return as soon as it is filled, plus a manifest.json. Send {"returns": [...], "mode"}
+    (up to BATCH_FILL_MAX_JSON_BYTES) or an NDJSON body (?mode=...) with one {"name", "calculated_data"}
+    per line, which is read as the returns are filled and so has no size limit of its own.
+    """
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            # Read the returns off the request body as the workers need them
+            payloads = read_payloads(request.stream)
+            mode = request.args.get('mode', 'full')
+        else:
+            # Parsed whole, unlike NDJSON, so its size is capped
+            if request.content_length is None or request.content_length > BATCH_FILL_MAX_JSON_BYTES:
+                return jsonify({"error": f"A JSON batch must declare its length and be at most {BATCH_FILL_MAX_JSON_BYTES} bytes; "
+                                         "send larger batches as NDJSON (application/x-ndjson)"}), 413
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data.get('returns'), list):
+                return jsonify({"error": "Provide a JSON body with a 'returns' list, or NDJSON with one return per line"}), 400
+            payloads = iter(data['returns'])
+            mode = data.get('mode') or request.args.get('mode', 'full')
+            data = None
+        
+        mode = str(mode).lower()
+        if mode not in FILL_MODES:
+            return jsonify({"error": f"Unknown fill mode: {mode}", "available_modes": list(FILL_MODES)}), 400
+        
+        print(f"🔄 Generating filled returns in a batch ({mode} mode)...")
+        
+        def generate():
+            started = time.perf_counter()
+            try:
+                yield from iter_zip(iter_filled(payloads, mode), mode)
+                print(f"✅ Batch of filled returns generated in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                # Headers are already sent, so the truncated ZIP is the only signal left
+                print(f"❌ Error generating batch of filled returns: {e}")
+                import traceback
+                traceback.print_exc()
+                raise
+        
+        headers = {"Content-Disposition": f"attachment; filename=completed_f1040s_{int(time.time())}.zip"}
+        return Response(stream_with_context(generate()), mimetype='application/zip', headers=headers)
+        
+    except Exception as e:
+        print(f"❌ Error generating batch of filled returns: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/classify-documents', methods=['POST'])
+def classify_documents():
+    """
+    Classify many documents against every form template in one vectorized pass.
+    PDFs are read page by page only until their form is clear ("pages_read" in each result).
+    """
+    try:
+        filenames = []
+        texts = []
+        errors = []
+        
+        if 'pdfs' in request.files:
+            classifications = []
+            for file in request.files.getlist('pdfs'):
+                try:
+                    extracted_text, classification = classify_pdf(file.read())
+                except Exception as e:
+                    errors.append({"filename": file.filename, "error": f"Error reading PDF: {str(e)}", "status": "error"})
+                    continue
+                filenames.append(file.filename)
+                texts.append(extracted_text)
+                classifications.append(classification)
+        else:
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data.get('texts'), list):
+                return jsonify({"error": "Provide PDF files as 'pdfs' or a JSON body with a 'texts' list"}), 400
+            texts = [str(text) for text in data['texts']]
+            filenames = [None] * len(texts)
+            classifications = classify_texts(FORM_INDEX, texts)
+        
+        similarity_matrix = score_texts(FORM_INDEX, texts) if texts else []
+        
+        results = []
+        for filename, classification in zip(filenames, classifications):
+            result = {"filename": filename} if filename is not None else {}
+            result.update(classification)
+            results.append(result)
+        
+        return jsonify({
+            "form_names": FORM_INDEX["form_names"],
+            "results": results,
+            "errors": errors,
+            "similarity_matrix": [[float(score) for score in row] for row in similarity_matrix]
+        })
+        
+    except Exception as e:
+        print(f"❌ Error classifying documents: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/recalculate', methods=['POST'])
+def recalculate():
+    """
+    Recalculate the 1040 after correcting a few extracted values, without resubmitting the return.
+    Takes the "forms_data" and "calculated_tax_data" of a previous response and "changes" as
+    {form: {field: value}} (plus tax_year, filing_status or tax_method); only the lines
+    downstream of the changes are evaluated, and only lines whose value changed come back.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('forms_data'), dict) or not isinstance(data.get('changes'), dict):
+            return jsonify({"error": "Provide a JSON body with 'forms_data', 'calculated_tax_data' and 'changes'"}), 400
+        
+        previous = data.get('calculated_tax_data')
+        if not isinstance(previous, dict) or "error" in previous:
+            previous = None
+        
+        try:
+            result = recalculate_form_1040_values(
+                data['forms_data'], previous, data['changes'],
+                tax_year=data.get('tax_year'), filing_status=data.get('filing_status'),
+                tax_method=data.get('tax_method') or TAX_METHOD,
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        print(f"🧮 Recalculated {result['lines_evaluated']} of {result['lines_total']} lines, {len(result['changed'])} changed")
+        return jsonify(result)
+        
+    except Exception as e:
+        print(f"❌ Error recalculating: {e}")
         import traceback
         traceback.print_exc()
-        # Clear memory even on error
-        cleanup_memory()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/tax-scenarios', methods=['POST'])
+def tax_scenarios():
+    """
+    What-if sweep over one return: "forms_data" plus "grids" such as
+    {"field": "form_1099_nec.nonemployee_compensation", "start": 5000, "stop": 50000, "step": 1000}
+    or {"field": "schedule_1.total_adjustments_to_income", "scale": [1, 2]}. Every combination is
+    calculated in one batch and streamed back as NDJSON columns in cents (see iter_sweep_records).
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('forms_data'), dict) or not isinstance(data.get('grids'), list) or not data['grids']:
+            return jsonify({"error": "Provide a JSON body with 'forms_data' and a non-empty 'grids' list"}), 400
+        lines = data.get('lines')
+        if lines is not None and not isinstance(lines, list):
+            return jsonify({"error": "'lines' must be a list of 1040 line names"}), 400
+        
+        started = time.time()
+        try:
+            sweep = sweep_scenarios(
+                data['forms_data'], data['grids'],
+                tax_year=data.get('tax_year'), filing_status=data.get('filing_status'),
+                tax_method=data.get('tax_method') or TAX_METHOD,
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        print(f"🧮 Calculated {sweep['points']} scenarios in {(time.time() - started) * 1000:.0f} ms")
+        
+        records = iter_sweep_records(sweep, lines)
+        return Response(stream_with_context(app.json.dumps(record) + "\n" for record in records),
+                        mimetype=STREAM_MIMETYPES["ndjson"])
+        
+    except Exception as e:
+        print(f"❌ Error calculating scenarios: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/extraction-cache', methods=['GET'])
+def extraction_cache_stats():
+    """Hit/miss counters and size of the extraction cache"""
+    if not EXTRACTION_CACHE:
+        return jsonify({"enabled": False})
+    stats = EXTRACTION_CACHE.stats()
+    stats["enabled"] = True
+    return jsonify(stats)
+
+@app.route('/api/filled-pdf-cache', methods=['GET'])
+def filled_pdf_cache_stats():
+    """Hit ratio and memory use of the filled PDF cache"""
+    if not FILLED_PDF_CACHE:
+        return jsonify({"enabled": False})
+    stats = FILLED_PDF_CACHE.stats()
+    stats["enabled"] = True
+    return jsonify(stats)
 
+@app.route('/api/memory', methods=['GET'])
+def memory_usage():
+    """RSS, garbage collections, and p50/p99 latency and RSS growth per endpoint over recent requests"""
+    return jsonify(MEMORY.stats())
+
+@app.route('/api/cpu-pool', methods=['GET'])
+def cpu_pool_stats():
+    """Size, timeout and restart count of the CPU worker pool"""
+    return jsonify(cpu_pool.stats())
+
+@app.route('/api/tax-tables', methods=['GET'])
+def tax_table_figures():
+    """Tax years, filing statuses, standard deductions and brackets the tax calculation covers"""
+    return jsonify(describe_tax_tables())
+
+@app.route('/api/upload-budget', methods=['GET'])
+def upload_budget_stats():
+    """Upload bytes in flight against the process-wide budget, and requests turned away"""
+    stats = UPLOAD_BUDGET.stats()
+    stats["max_request_bytes"] = MAX_REQUEST_BYTES
+    return jsonify(stats)
 
 @app.route('/api/available-forms', methods=['GET'])
 def get_available_forms():
@@ -429,7 +1172,11 @@ def get_available_forms():
     return jsonify({
         "available_forms": list(map_forms_to_processor_ids.keys()),
         "form_processors": map_forms_to_processor_ids,
-        "template_files": file_paths
+        "template_files": file_paths,
+        "fillable_templates": {
+            name: {"version": template.version, "pages": template.page_count, "fields": len(template.field_index)}
+            for name, template in get_templates().items()
+        }
     })
 
 @app.route('/api/health', methods=['GET'])
@@ -454,8 +1201,22 @@ def home():
         "endpoints": {
             "/api/health": "Health check",
             "/api/available-forms": "Get available tax forms",
-            "/api/process-tax-documents": "POST - Upload and process tax documents with Document AI",
-            "/api/generate-filled-pdf": "POST - Generate filled PDF from calculated data (returns PDF file directly)"
+            "/api/process-tax-documents": "POST - Upload and process tax documents with Document AI (?stream=ndjson or sse for per-form results)",
+            "/api/generate-filled-pdf": "POST - Generate filled PDF from calculated data (returns PDF file directly; mode=full|fast|fdf|xfdf)",
+            "/api/generate-return-package": "POST - Fill the 1040 and its schedules into one merged PDF",
+            "/api/generate-filled-pdfs": "POST - Fill many returns in parallel and stream them back as a ZIP",
+            "/api/classify-documents": "POST - Classify many PDFs (or extracted texts) against all form templates in one pass",
+            "/api/recalculate": "POST - Recalculate the 1040 after correcting extracted values, evaluating only the affected lines",
+            "/api/tax-scenarios": "POST - What-if sweeps over one return, streamed as NDJSON columns",
+            "/api/tax-tables": "GET - Tax brackets and standard deductions by year and filing status",
+            "/api/extraction-cache": "GET - Extraction cache hit/miss counters and size",
+            "/api/filled-pdf-cache": "GET - Filled PDF cache hit ratio and memory use",
+            "/api/memory": "GET - RSS, garbage collections, and latency and RSS growth per endpoint",
+            "/api/cpu-pool": "GET - CPU worker pool size, timeout and restarts",
+            "/api/upload-budget": "GET - Upload bytes in flight against the process-wide budget, and requests turned away",
+            "/api/jobs": "POST - Queue tax documents for background processing (returns a job ID)",
+            "/api/jobs/<job_id>": "GET - Job status and per-file progress",
+            "/api/jobs/<job_id>/result": "GET - Results of a completed job"
         },
         "features": [
             "🤖 Google Cloud Document AI integration",
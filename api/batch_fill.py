@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterable, Iterator
+
+from pdf_templates import get_template, fill_template, FILL_MODES, FIELD_DATA_MIMETYPES
+from cpu_pool import get_pool, submit, result, abandon, shutdown_pool, CpuTaskError, CPU_POOL_WORKERS, CPU_POOL_TIMEOUT
+
+# Returns submitted but not yet written to the ZIP; bounds memory whatever the batch size
+BATCH_FILL_MAX_PENDING = int(os.environ.get('BATCH_FILL_MAX_PENDING', str(2 * max(1, CPU_POOL_WORKERS))))
+
+# Seconds a return may take from being submitted to being filled before it is reported as failed
+BATCH_FILL_TIMEOUT = float(os.environ.get('BATCH_FILL_TIMEOUT', str(CPU_POOL_TIMEOUT)))
+
+# Largest JSON {"returns": [...]} body accepted; a JSON body is parsed whole, NDJSON is read as it is filled
+BATCH_FILL_MAX_JSON_BYTES = int(os.environ.get('BATCH_FILL_MAX_JSON_BYTES', str(16 * 1024 * 1024)))
+
+
+def _fill_one(template_name: str, index: int, name: str, calculated_data: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """Fill one return on the shared CPU pool (see cpu_pool); failures are reported, not raised"""
+    try:
+        output, filled_fields, not_found_fields = fill_template(get_template(template_name), calculated_data, mode=mode)
+        return {"index": index, "name": name, "output": output,
+                "filled_fields": len(filled_fields), "not_found_fields": not_found_fields}
+    except Exception as e:
+        return {"index": index, "name": name, "output": None, "error": str(e)}
+
+
+def return_name(index: int, payload: Dict[str, Any]) -> str:
+    """File-safe name of a return in the ZIP, numbered so entries sort in input order"""
+    label = str(payload.get("name") or payload.get("client_id") or "return")
+    label = re.sub(r"[^A-Za-z0-9._-]+", "_", label).strip("._") or "return"
+    return f"{index + 1:05d}_{label[:80]}"
+
+
+def iter_filled(payloads: Iterable[Dict[str, Any]], mode: str = "full", template_name: str = "f1040",
+                max_pending: int = BATCH_FILL_MAX_PENDING, timeout: float = BATCH_FILL_TIMEOUT) -> Iterator[Dict[str, Any]]:
+    """
+    Fill every payload ({"name", "calculated_data"}) on the CPU pool, yielding each result
+    as it finishes; a payload without a calculated_data object gets an error entry.
+    Payloads are read lazily and at most `max_pending` are in flight at once.
+    A return not filled within `timeout` of being submitted, or whose worker crashed,
+    gets an error entry and the batch carries on.
+    """
+    if mode not in FILL_MODES:
+        raise ValueError(f"Unknown fill mode: {mode} (expected one of {', '.join(FILL_MODES)})")
+
+    payloads = enumerate(payloads)
+    # Future of each return in flight -> (index, name, deadline)
+    pending = {}
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max(1, max_pending):
+                item = next(payloads, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index, payload = item
+                if not isinstance(payload, dict):
+                    yield {"index": index, "name": return_name(index, {}), "output": None,
+                           "error": "Each return must be a JSON object"}
+                    continue
+                name = return_name(index, payload)
+                calculated_data = payload.get("calculated_data")
+                if not isinstance(calculated_data, dict):
+                    yield {"index": index, "name": name, "output": None,
+                           "error": "Each return needs a 'calculated_data' object"}
+                    continue
+                future = submit(_fill_one, template_name, index, name, calculated_data, mode)
+                pending[future] = (index, name, time.monotonic() + timeout)
+
+            if not pending:
+                return
+
+            first_deadline = min(deadline for _, _, deadline in pending.values())
+            done, _ = wait(pending, timeout=max(0.0, first_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future, (index, name, deadline) in list(pending.items()):
+                if future not in done and deadline > now:
+                    continue
+                del pending[future]
+                if future not in done:
+                    abandon(future)
+                    yield {"index": index, "name": name, "output": None,
+                           "error": f"Filling took longer than {timeout:g}s and was stopped"}
+                    continue
+                try:
+                    yield result(future)
+                except CpuTaskError as e:
+                    # Its worker crashed (the pool is restarted once for the rest of the batch)
+                    yield {"index": index, "name": name, "output": None, "error": str(e)}
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class _ZipSink:
+    """Write-only buffer for zipfile that hands out what has been written so far"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(results: Iterable[Dict[str, Any]], mode: str = "full") -> Iterator[bytes]:
+    """
+    Write filled returns into a ZIP as they arrive, yielding its bytes entry by entry,
+    and finish with a manifest.json of what was filled or failed for each return.
+    """
+    extension = mode if mode in FIELD_DATA_MIMETYPES else "pdf"
+    # PDF streams are already compressed; only the FDF/XFDF text is worth deflating
+    compression = zipfile.ZIP_STORED if extension == "pdf" else zipfile.ZIP_DEFLATED
+    sink = _ZipSink()
+    manifest = []
+
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as archive:
+        for result in results:
+            entry = {key: value for key, value in result.items() if key != "output"}
+            if result.get("output") is not None:
+                entry["file"] = f"{result['name']}.{extension}"
+                archive.writestr(entry["file"], result["output"])
+            manifest.append(entry)
+            result = None
+            yield sink.drain()
+
+        manifest.sort(key=lambda entry: entry["index"])
+        archive.writestr("manifest.json", json.dumps({
+            "mode": mode,
+            "total_returns": len(manifest),
+            "filled": sum(1 for entry in manifest if "file" in entry),
+            "returns": manifest
+        }, indent=2))
+    yield sink.drain()
+
+
+def read_payloads(stream) -> Iterator[Dict[str, Any]]:
+    """Yield returns from an NDJSON stream (one per line) without reading it all at once"""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Fill many 1040 returns into one ZIP")
+    parser.add_argument("input", help='NDJSON file with one {"name", "calculated_data"} per line, or a JSON list ("-" for stdin)')
+    parser.add_argument("-o", "--output", required=True, help="ZIP file to write")
+    parser.add_argument("--mode", default="full", choices=FILL_MODES)
+    parser.add_argument("--workers", type=int, default=max(1, CPU_POOL_WORKERS))
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        first = source.read(1)
+        while first.isspace():
+            first = source.read(1)
+        if first == "[":
+            payloads = iter(json.loads(first + source.read()))
+        else:
+            payloads = read_payloads(_prepend(first, source))
+
+        get_pool(workers=args.workers)
+        started = time.perf_counter()
+        count = 0
+        with open(args.output, "wb") as output:
+            for chunk in iter_zip(iter_filled(payloads, args.mode, max_pending=2 * args.workers), args.mode):
+                output.write(chunk)
+                count += 1
+        print(f"✅ Wrote {count - 1} return(s) to {args.output} in {time.perf_counter() - started:.1f}s")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        shutdown_pool()
+
+
+def _prepend(first: str, source) -> Iterator[str]:
+    """Lines of `source`, with a character already read put back in front"""
+    lines = iter(source)
+    yield first + next(lines, "")
+    yield from lines
+
+
+if __name__ == "__main__":
+    main()
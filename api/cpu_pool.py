@@ -0,0 +1,343 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pymupdf
+
+from form_index import load_form_index, classify_texts, classify_pages
+from pdf_templates import get_template, fill_template, fill_package, preload_templates
+from segmenter import iter_page_texts, split_pdf, extract_pages
+
+# Worker processes for CPU-bound stages (PDF parsing, TF-IDF, form filling);
+# 0 runs them inline on the calling thread
+CPU_POOL_WORKERS = int(os.environ.get('CPU_POOL_WORKERS', str(os.cpu_count() or 2)))
+
+# Seconds a single task may run before its worker is killed and the pool restarted
+CPU_POOL_TIMEOUT = float(os.environ.get('CPU_POOL_TIMEOUT', '60'))
+
+# PDFs at least this large go to workers through shared memory instead of being pickled
+CPU_POOL_SHM_BYTES = int(os.environ.get('CPU_POOL_SHM_BYTES', str(1024 * 1024)))
+
+# Workers are spawned, not forked: the API process runs threads and gRPC channels
+# that are not safe to fork. Spawned workers re-import the launching script as
+# "__mp_main__", so it must skip its startup there: batch_fill.py keeps it under
+# `if __name__ == "__main__"`, app.py checks IS_POOL_WORKER
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_restarts = 0
+# Bumped whenever the pool is replaced, so a failure only restarts the pool it happened on
+_generation = 0
+# Unfinished futures per pool generation, and those whose task hung past its timeout;
+# a replaced pool keeps serving its other tasks until only hung ones are left
+_inflight: Dict[int, set] = {}
+_hung: set = set()
+# Set by run_inline() when workers cannot be started; every task then runs on the calling thread
+_inline = False
+
+# Loaded once per worker by _init_worker (or on first inline use)
+_form_index = None
+
+
+class CpuTaskError(Exception):
+    """Raised when a pool task times out or its worker dies; the pool is restarted for the next task"""
+
+
+def _init_worker() -> None:
+    """Load the templates and classifier index once per worker process"""
+    global _form_index
+    preload_templates()
+    _form_index = load_form_index()
+
+
+def get_form_index() -> Dict[str, Any]:
+    global _form_index
+    if _form_index is None:
+        _form_index = load_form_index()
+    return _form_index
+
+
+def _current_pool(workers: int = CPU_POOL_WORKERS) -> Tuple[Optional[ProcessPoolExecutor], int]:
+    """The shared worker pool and its generation, starting it on first use; (None, ...) when tasks run inline"""
+    global _pool
+    if workers <= 0 or _inline:
+        return None, _generation
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool, _generation
+
+
+def get_pool(workers: int = CPU_POOL_WORKERS) -> Optional[ProcessPoolExecutor]:
+    """Return the shared worker pool, starting it on first use; None when tasks run inline"""
+    return _current_pool(workers)[0]
+
+
+def run_inline() -> None:
+    """Stop using worker processes (e.g. when they fail to start); tasks run on the calling thread"""
+    global _inline
+    _inline = True
+    shutdown_pool(kill=True)
+
+
+def _stop(pool: ProcessPoolExecutor, kill: bool) -> None:
+    if kill:
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _detach(generation: Optional[int] = None) -> Tuple[Optional[ProcessPoolExecutor], Optional[int]]:
+    """Take the current pool out of use (only if it is still `generation`); returns it and its generation"""
+    global _pool, _generation
+    with _pool_lock:
+        if generation is not None and generation != _generation:
+            return None, None
+        pool, _pool = _pool, None
+        detached = _generation
+        _generation += 1
+        return pool, detached
+
+
+def shutdown_pool(kill: bool = False) -> None:
+    """Stop the worker pool; the next task starts a new one. `kill` terminates busy workers too"""
+    pool, _ = _detach()
+    if pool is not None:
+        _stop(pool, kill)
+
+
+def restart_pool(generation: Optional[int] = None) -> bool:
+    """
+    Replace a pool whose worker died. With the `generation` of the failed task's pool, a pool
+    another failure already replaced is left alone. Returns whether a pool was replaced
+    """
+    global _restarts
+    pool, _ = _detach(generation)
+    if pool is None:
+        return False
+    _restarts += 1
+    print("⚠️ Restarting the CPU worker pool")
+    _stop(pool, kill=True)
+    return True
+
+
+def generation_of(future: Future) -> Optional[int]:
+    """Generation of the pool a future was submitted to; None for a task that ran inline"""
+    return getattr(future, "cpu_pool_generation", None)
+
+
+def _track(future: Future, generation: int) -> None:
+    future.cpu_pool_generation = generation
+    with _pool_lock:
+        _inflight.setdefault(generation, set()).add(future)
+
+    def untrack(_):
+        with _pool_lock:
+            futures = _inflight.get(generation)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del _inflight[generation]
+            _hung.discard(future)
+
+    future.add_done_callback(untrack)
+
+
+def _retire_after(pool: ProcessPoolExecutor, generation: int) -> None:
+    """Let a replaced pool finish its other tasks, then kill it along with its hung workers"""
+    while True:
+        with _pool_lock:
+            others = _inflight.get(generation, set()) - _hung
+        if not others:
+            break
+        # Rechecked every second: another of its tasks may hang meanwhile
+        wait(others, timeout=1)
+    _stop(pool, kill=True)
+
+
+def abandon(future: Future) -> None:
+    """
+    Give up on a task past its timeout without failing the other tasks on its pool: a task still
+    queued is cancelled; a running one leaves its pool to finish the rest and is killed with it,
+    while new tasks go to a fresh pool
+    """
+    global _restarts
+    if future.cancel():
+        return
+    generation = generation_of(future)
+    with _pool_lock:
+        _hung.add(future)
+    pool, detached = _detach(generation)
+    if pool is None:
+        # Its pool was already replaced and is retiring; it is killed once only hung tasks remain
+        return
+    _restarts += 1
+    print("⚠️ A CPU task hung; new tasks go to a fresh worker pool")
+    threading.Thread(target=_retire_after, args=(pool, detached), daemon=True).start()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def warm_up(workers: int = CPU_POOL_WORKERS) -> None:
+    """Spawn every worker now, so the first uploads do not wait for interpreters to start"""
+    pool = get_pool(workers)
+    if pool is None:
+        return
+    # Workers are spawned on demand, one per task that finds no idle worker
+    for future in [pool.submit(_ping) for _ in range(workers)]:
+        future.result()
+    print(f"✅ CPU worker pool ready: {stats()['running']} process(es)")
+
+
+def stats() -> Dict[str, Any]:
+    with _pool_lock:
+        pool = _pool
+        retiring = sum(1 for generation in _inflight if generation != _generation)
+        hung = len(_hung)
+    processes = (getattr(pool, "_processes", None) or {}) if pool else {}
+    return {
+        "workers": 0 if _inline else CPU_POOL_WORKERS,
+        "running": len(processes),
+        "timeout": CPU_POOL_TIMEOUT,
+        "restarts": _restarts,
+        "retiring_pools": retiring,
+        "hung_tasks": hung,
+    }
+
+
+def share_pdf(content) -> Tuple[Any, Callable[[], None]]:
+    """
+    Prepare PDF bytes for a task: the buffer itself inline, a shared-memory handle for
+    large PDFs, or a bytes copy otherwise. Returns (argument, cleanup once the task is done).
+    """
+    if get_pool() is None:
+        return content, lambda: None
+    size = len(content)
+    if size < CPU_POOL_SHM_BYTES:
+        return bytes(content), lambda: None
+
+    block = shared_memory.SharedMemory(create=True, size=size)
+    block.buf[:size] = content
+
+    def cleanup():
+        block.close()
+        block.unlink()
+
+    return ("shm", block.name, size), cleanup
+
+
+@contextmanager
+def open_pdf(pdf):
+    """Open a PDF passed as bytes, a memoryview, or a shared-memory handle from share_pdf"""
+    block = None
+    view = None
+    if isinstance(pdf, tuple) and pdf[0] == "shm":
+        block = shared_memory.SharedMemory(name=pdf[1])
+        view = block.buf[:pdf[2]]
+        pdf = view
+    doc = pymupdf.open(stream=pdf, filetype="pdf")
+    try:
+        yield doc
+    finally:
+        doc.close()
+        if block is not None:
+            del doc
+            view.release()
+            block.close()
+
+
+def submit(task: Callable, *args) -> Future:
+    """Run `task(*args)` on the pool; inline, the returned future is already done"""
+    pool, generation = _current_pool()
+    if pool is not None:
+        try:
+            future = pool.submit(task, *args)
+        except (BrokenProcessPool, RuntimeError):
+            # Broken, or replaced by another thread since _current_pool (submitting to a shut down pool)
+            restart_pool(generation)
+            pool, generation = _current_pool()
+            future = pool.submit(task, *args)
+        _track(future, generation)
+        return future
+
+    future = Future()
+    try:
+        future.set_result(task(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def result(future: Future, timeout: float = CPU_POOL_TIMEOUT) -> Any:
+    """
+    Wait for a task. A task that hangs past `timeout` or whose worker dies (a malformed PDF
+    crashing pymupdf, running out of memory) raises CpuTaskError; the API process carries on.
+    A hung task is abandoned without disturbing the tasks of other files and requests
+    """
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        abandon(future)
+        raise CpuTaskError(f"Task took longer than {timeout:g}s and was stopped")
+    except BrokenProcessPool:
+        # A dead worker breaks its whole pool; only the first of its failed tasks replaces it
+        restart_pool(generation_of(future))
+        raise CpuTaskError("Worker process crashed while handling the task")
+
+
+def run(task: Callable, *args, timeout: float = CPU_POOL_TIMEOUT) -> Any:
+    return result(submit(task, *args), timeout)
+
+
+def submit_pdf(task: Callable, content, *args) -> Future:
+    """Submit a task whose first argument is PDF bytes, passed through share_pdf"""
+    pdf, cleanup = share_pdf(content)
+    try:
+        future = submit(task, pdf, *args)
+    except Exception:
+        cleanup()
+        raise
+    future.add_done_callback(lambda _: cleanup())
+    return future
+
+
+# Tasks: module-level so workers can unpickle them by name
+
+def split_pdf_task(pdf) -> List[Dict[str, Any]]:
+    """segmenter.split_pdf on PDF bytes"""
+    with open_pdf(pdf) as doc:
+        return split_pdf(doc)
+
+
+def extract_pages_task(pdf, start_page: int, end_page: int) -> bytes:
+    """An inclusive page range of a PDF as a standalone PDF"""
+    with open_pdf(pdf) as doc:
+        return extract_pages(doc, start_page, end_page)
+
+
+def classify_texts_task(texts: List[str]) -> List[Dict[str, Any]]:
+    return classify_texts(get_form_index(), texts)
+
+
+def classify_pdf_task(pdf) -> Tuple[str, Dict[str, Any]]:
+    """Classify a PDF reading only as many pages as it takes to be confident"""
+    with open_pdf(pdf) as doc:
+        return classify_pages(get_form_index(), iter_page_texts(doc))
+
+
+def fill_task(template_name: str, data_to_fill: Dict[str, Any], field_mapping: Optional[Dict[str, Any]], mode: str):
+    return fill_template(get_template(template_name), data_to_fill, field_mapping, mode)
+
+
+def fill_package_task(forms_data: Dict[str, Dict[str, Any]], mode: str):
+    return fill_package(forms_data, mode)
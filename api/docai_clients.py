@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Tuple
+
+from google.cloud import documentai_v1 as documentai
+from google.oauth2 import service_account
+
+# Process-wide Document AI clients, keyed by (location, credentials key)
+_clients: Dict[Tuple[str, str], documentai.DocumentProcessorServiceClient] = {}
+_clients_lock = threading.Lock()
+
+# Parsed service account credentials, keyed by a hash of the raw JSON
+_credentials_cache: Dict[str, service_account.Credentials] = {}
+
+DEFAULT_CREDENTIALS_KEY = "default"
+
+
+def _credentials_from_env():
+    """
+    Return (key, credentials) for the service account in
+    GOOGLE_APPLICATION_CREDENTIALS_JSON, parsing it only once per distinct value.
+    Returns ("default", None) when unset so the client uses application default credentials.
+    """
+    raw_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
+    if not raw_json:
+        return DEFAULT_CREDENTIALS_KEY, None
+
+    key = hashlib.sha256(raw_json.encode("utf-8")).hexdigest()
+    credentials = _credentials_cache.get(key)
+    if credentials is None:
+        credentials = service_account.Credentials.from_service_account_info(json.loads(raw_json))
+        _credentials_cache[key] = credentials
+    return key, credentials
+
+
+def get_client(location: str) -> documentai.DocumentProcessorServiceClient:
+    """
+    Return the shared client for a location, creating it on first use.
+
+    gRPC clients are thread-safe, so one client (and one channel) serves every
+    request thread. google-auth refreshes the access token on the shared
+    credentials when it expires, and rotating GOOGLE_APPLICATION_CREDENTIALS_JSON
+    yields a new key and therefore a new client.
+    """
+    credentials_key, credentials = _credentials_from_env()
+    key = (location, credentials_key)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            opts = {"api_endpoint": f"{location}-documentai.googleapis.com"}
+            if credentials:
+                client = documentai.DocumentProcessorServiceClient(client_options=opts, credentials=credentials)
+            else:
+                # Fall back to default credentials (for local development)
+                client = documentai.DocumentProcessorServiceClient(client_options=opts)
+            _clients[key] = client
+    return client
+
+
+def reset_client(location: str, failed_client: documentai.DocumentProcessorServiceClient) -> None:
+    """
+    Drop the cached client and credentials for a location after `failed_client` failed to
+    authenticate. Once another thread has already replaced it, the new client is left alone
+    """
+    credentials_key, _ = _credentials_from_env()
+    key = (location, credentials_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not failed_client:
+            return
+        del _clients[key]
+        _credentials_cache.pop(credentials_key, None)
+    try:
+        client.transport.close()
+    except Exception as e:
+        print(f"⚠️ Error closing Document AI client for {location}: {e}")
+
+
+def warm_up(locations) -> None:
+    """Create the clients and fetch an access token at app start so the first upload does not pay for it"""
+    for location in locations:
+        try:
+            client = get_client(location)
+            # The transport holds its own scoped copy of the credentials; that is the token requests use
+            credentials = getattr(client.transport, "_credentials", None)
+            if credentials is not None and not credentials.valid:
+                from google.auth.transport.requests import Request
+                credentials.refresh(Request())
+            print(f"✅ Document AI client ready for {location}")
+        except Exception as e:
+            print(f"⚠️ Could not warm up Document AI client for {location}: {e}")
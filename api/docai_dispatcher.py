@@ -0,0 +1,168 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from google.api_core import exceptions as api_exceptions
+
+# Maximum Document AI calls in flight per request
+MAX_CONCURRENCY = int(os.environ.get('DOCAI_MAX_CONCURRENCY', '8'))
+
+# Per-processor quota: sustained requests per second and burst size
+PROCESSOR_RATE = float(os.environ.get('DOCAI_PROCESSOR_RATE', '5'))
+PROCESSOR_BURST = int(os.environ.get('DOCAI_PROCESSOR_BURST', '5'))
+
+# Retry policy for transient errors
+MAX_ATTEMPTS = int(os.environ.get('DOCAI_MAX_ATTEMPTS', '4'))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.InternalServerError,
+    ConnectionError,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Buckets are process-wide so concurrent requests share each processor's quota
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(processor_id: str) -> TokenBucket:
+    """Return the token bucket for a processor, creating it on first use"""
+    with _buckets_lock:
+        bucket = _buckets.get(processor_id)
+        if bucket is None:
+            bucket = TokenBucket(PROCESSOR_RATE, PROCESSOR_BURST)
+            _buckets[processor_id] = bucket
+        return bucket
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (1-based) attempt"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempt - 1))))
+
+
+def call_with_retry(processor_id: str, call: Callable[[], Any], max_attempts: int = MAX_ATTEMPTS) -> Any:
+    """Run one processor call under its quota, retrying transient errors with backoff"""
+    bucket = get_bucket(processor_id)
+    for attempt in range(1, max_attempts + 1):
+        bucket.acquire()
+        try:
+            return call()
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_attempts:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"⚠️ Transient error from processor {processor_id} (attempt {attempt}/{max_attempts}): {e}; retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def dispatch_iter(jobs: List[Dict[str, Any]], process: Callable[..., Any],
+                  max_workers: int = MAX_CONCURRENCY) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Run `process(**job["kwargs"])` for every job on a bounded thread pool.
+    Each job needs a "processor_id" (for its quota) and "kwargs".
+    Yields (job index, {"result": ...} or {"error": exception}) as each job finishes;
+    closing the generator early cancels the jobs that have not started.
+    """
+    if not jobs:
+        return
+
+    def run(job):
+        try:
+            return {"result": call_with_retry(job["processor_id"], lambda: process(**job["kwargs"]))}
+        except Exception as e:
+            return {"error": e}
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs))))
+    try:
+        futures = {executor.submit(run, job): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Closed early (a streaming client went away, the caller gave up): drop the jobs
+        # not yet started rather than sending them to Document AI
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class FakeEntity:
+    """Stand-in for documentai.Document.Entity"""
+
+    def __init__(self, type_: str, mention_text: str, confidence: float):
+        self.type_ = type_
+        self.mention_text = mention_text
+        self.confidence = confidence
+
+
+class FakeDocument:
+    """Stand-in for documentai.Document"""
+
+    def __init__(self, entities):
+        self.entities = entities
+
+
+class FakeProcessor:
+    """
+    Local stand-in for online_process with configurable latency and failure rate,
+    for exercising the dispatcher without Google Cloud.
+    Enable it in the API with DOCAI_FAKE_PROCESSOR="latency=0.5,failure_rate=0.2".
+    """
+
+    def __init__(self, latency: float = 0.5, failure_rate: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "FakeProcessor":
+        """Build from a "key=value,key=value" string"""
+        options = {}
+        for part in spec.split(","):
+            if "=" in part:
+                key, value = part.split("=", 1)
+                options[key.strip()] = float(value)
+        return cls(**options)
+
+    def __call__(self, project_id: str, location: str, processor_id: str, file_content: bytes, mime_type: str, **kwargs) -> FakeDocument:
+        with self.lock:
+            self.calls += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.failure_rate:
+            raise api_exceptions.ServiceUnavailable("Fake processor unavailable")
+        return FakeDocument([
+            FakeEntity("processor_id", processor_id, 1.0),
+            FakeEntity("content_bytes", str(len(file_content)), 1.0),
+        ])
@@ -0,0 +1,166 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# On-disk cache of extraction results; set EXTRACTION_CACHE_PATH="" to disable it.
+# Rows hold the extracted fields in plain text (names, SSNs, amounts) for up to
+# EXTRACTION_CACHE_MAX_AGE seconds; the file is created readable by its owner only
+EXTRACTION_CACHE_PATH = os.environ.get(
+    "EXTRACTION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_cache.sqlite3"),
+)
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EXTRACTION_CACHE_MAX_AGE = int(os.environ.get("EXTRACTION_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Processor version the cached entities were produced with; bump to invalidate
+PROCESSOR_VERSION = os.environ.get("DOCAI_PROCESSOR_VERSION", "default")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    file_hash TEXT NOT NULL,
+    start_page INTEGER NOT NULL,
+    processor_id TEXT NOT NULL,
+    processor_version TEXT NOT NULL,
+    segment_count INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (file_hash, start_page, processor_id, processor_version)
+);
+CREATE INDEX IF NOT EXISTS extractions_accessed_at ON extractions (accessed_at);
+"""
+
+
+class ExtractionCache:
+    """
+    Content-addressed store of per-form extraction results.
+
+    Rows are keyed by the SHA-256 of the uploaded file, the first page of the
+    form inside it, and the processor ID and version that produced them. A file
+    is a hit only when every form in it is cached under the current processors.
+    Entries expire after `max_age` seconds and the least recently used are
+    evicted once the payloads exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES,
+                 max_age: int = EXTRACTION_CACHE_MAX_AGE, processor_version: str = PROCESSOR_VERSION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.processor_version = processor_version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            # SQLite gives its -wal and -shm files the same permissions
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        # Expired rows are otherwise only dropped when something new is stored
+        with self.lock:
+            self._evict(time.time())
+            self.connection.commit()
+
+    def lookup(self, file_hash: str, processor_ids: Dict[str, str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the cached forms of a file in page order, or None on a miss.
+        `processor_ids` maps form names to their current processor, so a remapped
+        processor invalidates old rows.
+        """
+        now = time.time()
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT start_page, processor_id, segment_count, payload FROM extractions "
+                "WHERE file_hash = ? AND processor_version = ? AND created_at >= ? ORDER BY start_page",
+                (file_hash, self.processor_version, now - self.max_age),
+            ).fetchall()
+
+            forms = []
+            for start_page, processor_id, segment_count, payload in rows:
+                form = json.loads(payload)
+                if processor_ids.get(form["identified_form"]) == processor_id:
+                    forms.append((segment_count, form))
+
+            if not forms or any(segment_count != len(forms) for segment_count, _ in forms):
+                self.misses += 1
+                return None
+
+            self.connection.execute(
+                "UPDATE extractions SET accessed_at = ? WHERE file_hash = ? AND processor_version = ?",
+                (now, file_hash, self.processor_version),
+            )
+            self.connection.commit()
+            self.hits += 1
+        return [form for _, form in forms]
+
+    def store(self, file_hash: str, forms: List[Dict[str, Any]]) -> None:
+        """Cache every form extracted from one file; each needs identified_form, processor_id and pages"""
+        now = time.time()
+        rows = []
+        for form in forms:
+            payload = json.dumps(form, separators=(",", ":"))
+            rows.append((file_hash, form["pages"][0], form["processor_id"], self.processor_version,
+                         len(forms), payload, len(payload), now, now))
+
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM extractions WHERE file_hash = ? AND processor_version = ?",
+                (file_hash, self.processor_version),
+            )
+            self.connection.executemany("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._evict(now)
+            self.connection.commit()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired rows, then the least recently used until under the byte budget"""
+        cursor = self.connection.execute("DELETE FROM extractions WHERE created_at < ?", (now - self.max_age,))
+        self.evictions += cursor.rowcount
+
+        total_bytes = self.connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extractions").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        for file_hash, accessed_at, size_bytes in self.connection.execute(
+            "SELECT file_hash, MAX(accessed_at), SUM(size_bytes) FROM extractions GROUP BY file_hash ORDER BY MAX(accessed_at)"
+        ).fetchall():
+            if total_bytes <= self.max_bytes:
+                break
+            cursor = self.connection.execute("DELETE FROM extractions WHERE file_hash = ?", (file_hash,))
+            self.evictions += cursor.rowcount
+            total_bytes -= size_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current size of the store"""
+        with self.lock:
+            entries, total_bytes = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM extractions"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age,
+            "processor_version": self.processor_version,
+        }
+
+
+def open_extraction_cache(path: str = EXTRACTION_CACHE_PATH) -> Optional[ExtractionCache]:
+    """Open the configured cache, or return None when it is disabled or unusable"""
+    if not path:
+        return None
+    try:
+        return ExtractionCache(path)
+    except Exception as e:
+        print(f"⚠️ Extraction cache disabled, could not open {path}: {e}")
+        return None
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import pickle
+import re
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from schemas_ import FILE_TEXT, FORM_SIGNATURES
+
+# Where the fitted index is persisted so workers load it instead of refitting
+FORM_INDEX_PATH = os.environ.get(
+    "FORM_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "form_index.pkl"),
+)
+
+# Bump when the on-disk layout of the index changes
+FORM_INDEX_FORMAT_VERSION = 1
+
+# Minimum cosine similarity for a document to be assigned a form type
+SIMILARITY_THRESHOLD = 0.8
+
+# Fraction of page 1 (from the top) read by the header fingerprint stage
+HEADER_FRACTION = 0.2
+
+# Pages of an unidentified document read for TF-IDF classification; later pages are not extracted
+CLASSIFY_MAX_PAGES = int(os.environ.get("CLASSIFY_MAX_PAGES", "8"))
+
+# Lead over the runner-up form at which incremental classification stops reading pages
+CONFIDENT_MARGIN = 0.2
+
+# Header signatures compiled once at import
+COMPILED_SIGNATURES = {
+    form_name: [re.compile(pattern) for pattern in patterns]
+    for form_name, patterns in FORM_SIGNATURES.items()
+}
+
+
+def templates_fingerprint(templates: Dict[str, str]) -> str:
+    """Hash of the template texts, used to detect a stale persisted index"""
+    digest = hashlib.sha256()
+    for form_name in sorted(templates):
+        digest.update(form_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(templates[form_name].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def build_form_index(templates: Dict[str, str] = FILE_TEXT) -> Dict[str, Any]:
+    """
+    Fit one TF-IDF vectorizer over every form template.
+    The template rows are L2-normalised, so a dot product is the cosine similarity.
+    """
+    form_names = list(templates.keys())
+    vectorizer = TfidfVectorizer()
+    template_matrix = vectorizer.fit_transform([templates[name] for name in form_names])
+
+    return {
+        "format_version": FORM_INDEX_FORMAT_VERSION,
+        "fingerprint": templates_fingerprint(templates),
+        "form_names": form_names,
+        "vectorizer": vectorizer,
+        # Stored transposed (terms x forms) so scoring is a single sparse product
+        "template_matrix_t": template_matrix.T.tocsr(),
+    }
+
+
+def save_form_index(index: Dict[str, Any], path: str = FORM_INDEX_PATH) -> None:
+    """Persist the fitted index atomically"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_form_index(path: str = FORM_INDEX_PATH, templates: Dict[str, str] = FILE_TEXT) -> Dict[str, Any]:
+    """
+    Load the persisted index, rebuilding (and re-saving) it when it is missing,
+    unreadable or was built from different templates.
+    """
+    fingerprint = templates_fingerprint(templates)
+
+    try:
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+        if index.get("format_version") == FORM_INDEX_FORMAT_VERSION and index.get("fingerprint") == fingerprint:
+            return index
+        print(f"⚠️ Form index at {path} is stale, rebuilding")
+    except FileNotFoundError:
+        print(f"🔄 No form index at {path}, building one")
+    except Exception as e:
+        print(f"⚠️ Could not load form index from {path}: {e}, rebuilding")
+
+    index = build_form_index(templates)
+    try:
+        save_form_index(index, path)
+    except OSError as e:
+        print(f"⚠️ Could not persist form index to {path}: {e}")
+    return index
+
+
+def score_texts(index: Dict[str, Any], texts: List[str]):
+    """
+    Cosine similarity of N documents against every template in one sparse product.
+    Returns a dense (N x templates) array whose columns follow index["form_names"].
+    """
+    doc_matrix = index["vectorizer"].transform([text.replace("\n", " ") for text in texts])
+    return (doc_matrix @ index["template_matrix_t"]).toarray()
+
+
+def classify_texts(index: Dict[str, Any], texts: List[str], threshold: float = SIMILARITY_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Classify a batch of documents in one vectorised pass.
+    Each result carries the best form, its score and the margin over the runner-up.
+    """
+    if not texts:
+        return []
+
+    form_names = index["form_names"]
+    scores = score_texts(index, texts)
+    results = []
+
+    for row in scores:
+        ranked = row.argsort()[::-1]
+        best_score = float(row[ranked[0]])
+        runner_up_score = float(row[ranked[1]]) if len(ranked) > 1 else 0.0
+        results.append({
+            "identified_form": form_names[ranked[0]] if best_score >= threshold else None,
+            "best_form": form_names[ranked[0]],
+            "similarity_score": best_score,
+            "runner_up_form": form_names[ranked[1]] if len(ranked) > 1 else None,
+            "runner_up_score": runner_up_score,
+            "margin": best_score - runner_up_score,
+        })
+
+    return results
+
+
+def classify_pages(index: Dict[str, Any], page_texts: Iterable[str], threshold: float = SIMILARITY_THRESHOLD,
+                   min_margin: float = CONFIDENT_MARGIN, max_pages: Optional[int] = CLASSIFY_MAX_PAGES) -> Tuple[str, Dict[str, Any]]:
+    """
+    Classify a document from lazily extracted page texts, stopping as soon as one form
+    is above the threshold with `min_margin` over the runner-up. Scores are checked after
+    pages 1, 2, 4, 8, ... so a long document costs a handful of passes.
+    Returns the text read so far and the classification, with "pages_read".
+    """
+    pages = []
+    result = None
+    scored_pages = None
+    checkpoint = 1
+    for page_text in page_texts:
+        pages.append(page_text)
+        if len(pages) == checkpoint:
+            result = classify_texts(index, ["".join(pages)], threshold)[0]
+            scored_pages = len(pages)
+            if result["identified_form"] and result["margin"] >= min_margin:
+                break
+            checkpoint *= 2
+        if max_pages and len(pages) >= max_pages:
+            break
+
+    text = "".join(pages)
+    if scored_pages != len(pages):
+        result = classify_texts(index, [text], threshold)[0]
+    result["pages_read"] = len(pages)
+    return text, result
+
+
+def match_fingerprints(header_text: str) -> List[str]:
+    """Return every form whose header signatures all appear in the given text"""
+    header_text = " ".join(header_text.split())
+    return [
+        form_name for form_name, patterns in COMPILED_SIGNATURES.items()
+        if all(pattern.search(header_text) for pattern in patterns)
+    ]
+
+
+if __name__ == '__main__':
+    # Build the index ahead of deployment: python form_index.py
+    save_form_index(build_form_index())
+    print(f"✅ Form index written to {FORM_INDEX_PATH}")
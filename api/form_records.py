@@ -0,0 +1,244 @@
+import decimal
+import json
+import re
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, Optional, Tuple
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def parse_amount(raw: Any) -> Tuple[Optional[int], Optional[str]]:
+    """An extracted amount in integer cents ("$1,234.5" -> 123450), as (cents, error); blank is (None, None)"""
+    text = str(raw).replace('$', '').replace(',', '').strip()
+    if not text:
+        return None, None
+    try:
+        amount = decimal.Decimal(text)
+    except (decimal.InvalidOperation, ValueError):
+        return None, "not an amount"
+    if not amount.is_finite():
+        return None, "not an amount"
+    return int((amount * 100).to_integral_value(rounding=decimal.ROUND_HALF_EVEN)), None
+
+
+def parse_ssn(raw: Any) -> Tuple[Optional[str], Optional[str]]:
+    """An SSN as its 9 digits, whatever the separators ("123-45-6789", "123\\n45 6789")"""
+    text = str(raw).strip()
+    if not text:
+        return None, None
+    digits = _NON_DIGITS.sub("", text)
+    if len(digits) != 9:
+        return None, f"expected 9 digits, found {len(digits)}"
+    return digits, None
+
+
+def parse_name(raw: Any) -> Tuple[Optional[str], Optional[str]]:
+    """A name with line breaks and runs of spaces collapsed to single spaces"""
+    return " ".join(str(raw).split()) or None, None
+
+
+PARSERS = {"amount": parse_amount, "ssn": parse_ssn, "name": parse_name}
+
+
+def cents_to_decimal(cents: int) -> decimal.Decimal:
+    """Cents as Decimal dollars, whole dollars without decimal places (as extracted amounts usually are)"""
+    dollars, remainder = divmod(cents, 100)
+    return decimal.Decimal(dollars) if not remainder else decimal.Decimal(cents).scaleb(-2)
+
+
+def format_amount(cents: int) -> str:
+    return str(cents_to_decimal(cents))
+
+
+def format_ssn(ssn: str) -> str:
+    return f"{ssn[:3]}-{ssn[3:5]}-{ssn[5:]}"
+
+
+FORMATTERS = {"amount": format_amount, "ssn": format_ssn, "name": str}
+
+
+class FormRecord:
+    """
+    One extracted form, parsed once right after extraction. Each field in `fields` is an
+    attribute: amounts in integer cents, SSNs as 9 digits, names with whitespace collapsed,
+    None where the form has no usable value. `errors` lists the values that could not be
+    parsed ({"field", "value", "error"}; an empty tuple when all parsed). Other entities (form name, payer address, ...) stay in the extracted form data only.
+    """
+
+    __slots__ = ("errors",)
+    form = ""
+    fields: Dict[str, str] = {}
+
+    def __init__(self, form_data: Dict[str, Any]):
+        self.errors = ()
+        for field, kind in self.fields.items():
+            raw = form_data.get(field)
+            value = None
+            if raw is not None:
+                value, error = PARSERS[kind](raw)
+                if error:
+                    if not self.errors:
+                        self.errors = []
+                    self.errors.append({"field": field, "value": str(raw), "error": error})
+            setattr(self, field, value)
+
+    def fill_values(self) -> Dict[str, str]:
+        """Values for filling the form's PDF: the typed fields formatted back to text"""
+        values = {}
+        for field, kind in self.fields.items():
+            value = getattr(self, field)
+            if value is not None:
+                values[field] = FORMATTERS[kind](value)
+        return values
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.fields)
+        return f"{type(self).__name__}({values})"
+
+
+# Entities of each form the 1040 reads (see widget_schemas_.widget_mapping), by how they parse
+
+class FormW2Record(FormRecord):
+    form = "form_w2"
+    fields = {
+        "employee_first_name": "name",
+        "employee_last_name": "name",
+        "employee_social_security_number": "ssn",
+        "wages_tips_other_compensation": "amount",
+        "federal_income_tax_withheld": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+class Form1099NecRecord(FormRecord):
+    form = "form_1099_nec"
+    fields = {
+        "nonemployee_compensation": "amount",
+        "federal_income_tax_withheld": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+class Schedule1Record(FormRecord):
+    form = "schedule_1"
+    fields = {
+        "name_of_the_taxpayer": "name",
+        "social_security_number": "ssn",
+        "total_additional_income": "amount",
+        "total_adjustments_to_income": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+class Schedule2Record(FormRecord):
+    form = "schedule_2"
+    fields = {
+        "name_of_the_taxpayer": "name",
+        "social_security_number": "ssn",
+        "total_part1_tax": "amount",
+        "total_other_taxes": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+class Schedule3Record(FormRecord):
+    form = "schedule_3"
+    fields = {
+        "name_of_the_taxpayer": "name",
+        "social_security_number": "ssn",
+        "total_nonrefundable_credits": "amount",
+        "total_payments_and_refundable_credits": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+class Schedule8812Record(FormRecord):
+    form = "schedule_8812"
+    fields = {
+        "name_shown_on_return": "name",
+        "social_security_number": "ssn",
+        "child_tax_credit_and_credit_for_other_dependents": "amount",
+        "additional_child_tax_credit": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+class Form8863Record(FormRecord):
+    form = "form_8863"
+    fields = {
+        "name_shown_on_return": "name",
+        "social_security_number": "ssn",
+        "refundable_american_opportunity_credit": "amount",
+    }
+    __slots__ = tuple(fields)
+
+
+RECORD_CLASSES = {
+    record_class.form: record_class
+    for record_class in (FormW2Record, Form1099NecRecord, Schedule1Record, Schedule2Record,
+                         Schedule3Record, Schedule8812Record, Form8863Record)
+}
+
+
+def normalize_form(form_name: str, form_data: Any) -> FormRecord:
+    """The typed record of one extracted form (a record is returned as it is)"""
+    if isinstance(form_data, FormRecord):
+        return form_data
+    return RECORD_CLASSES.get(form_name, FormRecord)(form_data or {})
+
+
+def normalize_forms(forms_data: Dict[str, Any]) -> Dict[str, FormRecord]:
+    """Typed records of a return's forms, keyed by form name like forms_data"""
+    return {form_name: normalize_form(form_name, form_data) for form_name, form_data in forms_data.items()}
+
+
+def benchmark(count: int = 5_000) -> None:
+    """
+    Memory held per return as raw extracted dicts against typed records alone, the time to
+    normalize a return, and the time to calculate its 1040 from raw dicts and from records.
+    The API keeps each form's raw dict too (its response returns form_data), so there the
+    records add to memory rather than replace the dicts; the saving is in the calculation
+    """
+    from tac_calc import calculate_form_1040_values, final_forms_data
+
+    encoded = json.dumps(final_forms_data)
+
+    def copy_return():
+        # Fresh strings per return, as each extraction produces its own
+        return json.loads(encoded)
+
+    def measure(build):
+        tracemalloc.start()
+        started = tracemalloc.get_traced_memory()[0]
+        held = [build() for _ in range(count)]
+        size = tracemalloc.get_traced_memory()[0] - started
+        tracemalloc.stop()
+        return held, size / count
+
+    raw_returns, raw_bytes = measure(copy_return)
+    record_returns, record_bytes = measure(lambda: normalize_forms(copy_return()))
+    print(f"raw dicts {raw_bytes:,.0f} bytes per return, typed records {record_bytes:,.0f} bytes per return")
+
+    started = time.perf_counter()
+    for forms_data in raw_returns:
+        normalize_forms(forms_data)
+    normalize_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for forms_data in raw_returns:
+        calculate_form_1040_values(forms_data)
+    raw_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for records in record_returns:
+        calculate_form_1040_values(records)
+    record_s = time.perf_counter() - started
+    print(f"per return: normalizing {normalize_s / count * 1e6:.1f} µs, "
+          f"1040 from raw dicts {raw_s / count * 1e6:.1f} µs, from records {record_s / count * 1e6:.1f} µs")
+
+
+if __name__ == "__main__":
+    # python form_records.py [returns]
+    # Through the module, so records are the same classes tac_calc sees
+    import form_records
+    form_records.benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
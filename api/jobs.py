@@ -0,0 +1,163 @@
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+# Background workers running queued processing jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+
+# Jobs waiting beyond this are rejected rather than queued
+JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', '50'))
+
+# Finished jobs (and their results) are forgotten after this many seconds
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', '3600'))
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at JOB_QUEUE_LIMIT"""
+
+
+class JobQueue:
+    """
+    In-process job queue: uploads are queued and run through `pipeline` by a
+    small pool of daemon worker threads, with per-file progress recorded as the
+    pipeline reports it. Needs no outside services; jobs live only as long as
+    the API process.
+    """
+
+    def __init__(self, pipeline: Callable[..., Dict[str, Any]], workers: int = JOB_WORKERS,
+                 queue_limit: int = JOB_QUEUE_LIMIT, result_ttl: int = JOB_RESULT_TTL):
+        self.pipeline = pipeline
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.queue = queue.Queue(maxsize=queue_limit)
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+
+    def _start_workers(self) -> None:
+        """Start the worker threads on first use, so importing the app does not spawn threads"""
+        with self.lock:
+            if self.threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, uploads: List[Dict[str, Any]]) -> str:
+        """Queue uploads ({"filename", "content"} dicts) and return the new job ID; the caller keeps them if the queue is full"""
+        self._start_workers()
+        self._expire()
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "files": [{"filename": upload["filename"], "stage": "queued"} for upload in uploads],
+            "uploads": uploads,
+            "result": None,
+            "error": None,
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+        try:
+            self.queue.put_nowait(job_id)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+            raise QueueFullError(f"Job queue is full ({self.queue.maxsize} jobs waiting)")
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status and per-file progress of a job, without its result; None if unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            files = [dict(file_progress) for file_progress in job["files"]]
+            snapshot = {key: job[key] for key in ("job_id", "status", "created_at", "started_at", "finished_at", "error")}
+        snapshot["files"] = files
+        snapshot["files_done"] = sum(1 for file_progress in files if file_progress["stage"] == "done")
+        snapshot["total_files"] = len(files)
+        if snapshot["status"] == "queued":
+            snapshot["queue_position"] = self._queue_position(job_id)
+        return snapshot
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Final pipeline output of a completed job, or None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job["result"] if job else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of jobs in each state"""
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"workers": self.workers, "queued": self.queue.qsize(), "jobs": counts}
+
+    def _queue_position(self, job_id: str) -> Optional[int]:
+        with self.queue.mutex:
+            waiting = list(self.queue.queue)
+        return waiting.index(job_id) + 1 if job_id in waiting else None
+
+    def _set_stage(self, job_id: str, position: int, stage: str) -> None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and 0 <= position < len(job["files"]):
+                job["files"][position]["stage"] = stage
+
+    def _work(self) -> None:
+        while True:
+            job_id = self.queue.get()
+            try:
+                self._run(job_id)
+            finally:
+                self.queue.task_done()
+
+    def _run(self, job_id: str) -> None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            uploads = job["uploads"]
+
+        print(f"🔄 Running job {job_id} with {len(uploads)} file(s)")
+        try:
+            result = self.pipeline(uploads, progress=lambda position, stage: self._set_stage(job_id, position, stage))
+            status, error = "completed", None
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            traceback.print_exc()
+            result, status, error = None, "failed", str(e)
+
+        with self.lock:
+            job["status"] = status
+            job["error"] = error
+            job["result"] = result
+            job["finished_at"] = time.time()
+            # Drop the uploaded bytes as soon as the job is done
+            job["uploads"] = None
+        # Upload batches (see uploads.py) also give back their share of the in-flight budget
+        close = getattr(uploads, "close", None)
+        if close:
+            close()
+        print(f"✅ Job {job_id} {status}")
+
+    def _expire(self) -> None:
+        """Forget finished jobs older than the result TTL"""
+        cutoff = time.time() - self.result_ttl
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job["finished_at"] and job["finished_at"] < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
@@ -0,0 +1,293 @@
+import gc
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, redirect_stdout
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Take a tracemalloc snapshot at every pipeline stage (slow; for finding where memory goes)
+MEMORY_TRACE = os.environ.get('MEMORY_TRACE', '0') == '1'
+
+# Allocation sites reported per stage when tracing
+MEMORY_TRACE_TOP = int(os.environ.get('MEMORY_TRACE_TOP', '5'))
+
+# "adaptive" collects only past the thresholds below, "always" after every request, "off" never
+GC_MODE = os.environ.get('GC_MODE', 'adaptive')
+
+# Collect once RSS has grown this much since the last collection
+GC_RSS_GROWTH_BYTES = int(os.environ.get('GC_RSS_GROWTH_BYTES', str(64 * 1024 * 1024)))
+
+# Collect whenever RSS is above this; uploads are refused while it stays above after collecting (0 disables)
+MEMORY_HIGH_WATER_BYTES = int(os.environ.get('MEMORY_HIGH_WATER_BYTES', '0'))
+
+# Finished requests kept for /api/memory
+MEMORY_HISTORY = int(os.environ.get('MEMORY_HISTORY', '200'))
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+def peak_rss() -> int:
+    """Highest RSS this process has reached, in bytes"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile, or None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class AdaptiveCollector:
+    """Runs gc.collect() only when RSS has grown past GC_RSS_GROWTH_BYTES or sits above the high-water mark"""
+
+    def __init__(self, mode: str = GC_MODE, growth_bytes: int = GC_RSS_GROWTH_BYTES,
+                 high_water_bytes: int = MEMORY_HIGH_WATER_BYTES):
+        self.mode = mode
+        self.growth_bytes = growth_bytes
+        self.high_water_bytes = high_water_bytes
+        self.baseline_rss = current_rss()
+        self.collections = 0
+        self.collected_objects = 0
+        self.pause_ms = 0.0
+        self.lock = threading.Lock()
+
+    def should_collect(self, rss: int) -> bool:
+        if self.mode == "always":
+            return True
+        if self.mode != "adaptive":
+            return False
+        if self.high_water_bytes and rss > self.high_water_bytes:
+            return True
+        return rss - self.baseline_rss > self.growth_bytes
+
+    def maybe_collect(self, rss: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Collect if a threshold is crossed; returns what the collection did, or None"""
+        rss = current_rss() if rss is None else rss
+        if not self.should_collect(rss):
+            return None
+        # One collection at a time; concurrent requests skip rather than queue behind it
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            started = time.perf_counter()
+            collected = gc.collect()
+            pause_ms = (time.perf_counter() - started) * 1000
+            after = current_rss()
+            self.baseline_rss = after
+            self.collections += 1
+            self.collected_objects += collected
+            self.pause_ms += pause_ms
+        finally:
+            self.lock.release()
+        return {"collected": collected, "pause_ms": pause_ms, "rss_before": rss, "rss_after": after}
+
+    def under_pressure(self) -> bool:
+        """True when RSS stays above the high-water mark even after collecting"""
+        if not self.high_water_bytes or current_rss() <= self.high_water_bytes:
+            return False
+        result = self.maybe_collect()
+        return (result["rss_after"] if result else current_rss()) > self.high_water_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "collections": self.collections,
+            "collected_objects": self.collected_objects,
+            "pause_ms_total": self.pause_ms,
+            "growth_bytes": self.growth_bytes,
+            "high_water_bytes": self.high_water_bytes,
+        }
+
+
+class RequestMemory:
+    """
+    Memory and timing of one request or job: RSS at start and end, and with
+    MEMORY_TRACE, traced-allocation peaks and the top growing allocation sites per stage.
+    tracemalloc is process-wide, so traced figures overlap when requests run concurrently.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.rss_start = current_rss()
+        self.stages: List[Dict[str, Any]] = []
+        self.snapshot = None
+        if MEMORY_TRACE and tracemalloc.is_tracing():
+            if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+                tracemalloc.reset_peak()
+            self.snapshot = tracemalloc.take_snapshot()
+
+    def stage(self, name: str) -> None:
+        record = {
+            "stage": name,
+            "elapsed_ms": (time.perf_counter() - self.started) * 1000,
+            "rss": current_rss(),
+        }
+        if self.snapshot is not None:
+            traced, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            record["traced_bytes"] = traced
+            record["traced_peak_bytes"] = peak
+            record["top_allocations"] = [
+                {"site": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in snapshot.compare_to(self.snapshot, "lineno")[:MEMORY_TRACE_TOP]
+            ]
+            self.snapshot = snapshot
+        self.stages.append(record)
+
+    def finish(self, status: Optional[int] = None) -> Dict[str, Any]:
+        rss_end = current_rss()
+        record = {
+            "name": self.name,
+            "status": status,
+            "duration_ms": (time.perf_counter() - self.started) * 1000,
+            "rss_start": self.rss_start,
+            "rss_end": rss_end,
+            "rss_delta": rss_end - self.rss_start,
+            "peak_rss": peak_rss(),
+        }
+        if self.snapshot is not None:
+            record["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.snapshot = None
+        if self.stages:
+            record["stages"] = self.stages
+        return record
+
+
+class MemoryMonitor:
+    """Tracks the request running on each thread, keeps recent records, and collects adaptively"""
+
+    def __init__(self, history: int = MEMORY_HISTORY, collector: Optional[AdaptiveCollector] = None):
+        self.collector = collector or AdaptiveCollector()
+        self.records = deque(maxlen=history)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        if MEMORY_TRACE and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            print("⚠️ MEMORY_TRACE is on: tracemalloc slows every allocation")
+
+    def start(self, name: str) -> RequestMemory:
+        tracker = RequestMemory(name)
+        self.local.tracker = tracker
+        return tracker
+
+    def stage(self, name: str) -> None:
+        """Mark a pipeline stage of the current thread's request; a no-op outside one"""
+        tracker = getattr(self.local, "tracker", None)
+        if tracker is not None:
+            tracker.stage(name)
+
+    def finish(self, tracker: Optional[RequestMemory] = None, status: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        tracker = tracker or getattr(self.local, "tracker", None)
+        if tracker is None:
+            return None
+        if getattr(self.local, "tracker", None) is tracker:
+            self.local.tracker = None
+        record = tracker.finish(status)
+        collection = self.collector.maybe_collect(record["rss_end"])
+        if collection:
+            record["gc"] = collection
+            print(f"♻️ Collected {collection['collected']} objects in {collection['pause_ms']:.1f} ms "
+                  f"after {record['name']} (RSS {collection['rss_before'] >> 20} -> {collection['rss_after'] >> 20} MB)")
+        with self.lock:
+            self.records.append(record)
+        return record
+
+    @contextmanager
+    def track(self, name: str):
+        """Track a block of work (such as a background job) like a request"""
+        tracker = self.start(name)
+        try:
+            yield tracker
+        finally:
+            self.finish(tracker)
+
+    def under_pressure(self) -> bool:
+        return self.collector.under_pressure()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current RSS, collector counters, and latency/RSS percentiles per endpoint over recent requests"""
+        with self.lock:
+            records = list(self.records)
+        endpoints = {}
+        for record in records:
+            endpoints.setdefault(record["name"], []).append(record)
+        return {
+            "rss": current_rss(),
+            "peak_rss": peak_rss(),
+            "tracing": tracemalloc.is_tracing(),
+            "gc": self.collector.stats(),
+            "endpoints": {
+                name: {
+                    "requests": len(entries),
+                    "p50_ms": percentile([entry["duration_ms"] for entry in entries], 0.50),
+                    "p99_ms": percentile([entry["duration_ms"] for entry in entries], 0.99),
+                    "p50_rss_delta": percentile([entry["rss_delta"] for entry in entries], 0.50),
+                    "max_rss_delta": max(entry["rss_delta"] for entry in entries),
+                }
+                for name, entries in endpoints.items()
+            },
+            "recent": records[-10:],
+        }
+
+
+def benchmark(runs: int = 50) -> None:
+    """
+    p50/p99 latency of /api/process-tax-documents on the dummy documents with a
+    collection after every request (the old behaviour) against adaptive collection
+    """
+    os.environ.setdefault('DOCAI_FAKE_PROCESSOR', 'latency=0')
+    os.environ.setdefault('DOCAI_WARM_UP', '0')
+    import glob
+    import io
+    import app as api
+
+    client = api.app.test_client()
+    paths = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dummy_docs', '*.pdf')))
+    documents = [(open(path, 'rb').read(), os.path.basename(path)) for path in paths]
+
+    def post():
+        files = [(io.BytesIO(content), filename) for content, filename in documents]
+        started = time.perf_counter()
+        # Keep the pipeline's progress output out of the report
+        with redirect_stdout(io.StringIO()):
+            client.post('/api/process-tax-documents', data={'pdfs': files}, content_type='multipart/form-data').get_data()
+        return (time.perf_counter() - started) * 1000
+
+    for mode in ("always", "adaptive"):
+        api.MEMORY.collector.mode = mode
+        api.MEMORY.collector.collections = 0
+        for _ in range(3):
+            post()
+        latencies = [post() for _ in range(runs)]
+        print(f"{mode:>8}: p50 {percentile(latencies, 0.50):7.1f} ms   p99 {percentile(latencies, 0.99):7.1f} ms   "
+              f"{api.MEMORY.collector.collections} collection(s)   RSS {current_rss() >> 20} MB")
+
+
+if __name__ == "__main__":
+    # python memory_stats.py [runs]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
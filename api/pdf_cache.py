@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Memory budget for filled PDFs kept for repeat requests; 0 disables the cache
+FILLED_PDF_CACHE_MAX_BYTES = int(os.environ.get('FILLED_PDF_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+
+def mapping_fingerprint(field_mapping: Dict[str, str]) -> str:
+    """Hash of a field mapping, so editing it changes every cache key built on it"""
+    return hashlib.sha256(json.dumps(field_mapping, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def filled_pdf_key(template_fingerprint: str, field_mapping: Dict[str, str], data_to_fill: Dict[str, Any], mode: str) -> str:
+    """
+    Cache key (and ETag) for a fill: the template and mapping it uses, the mode, and
+    the data normalized the way the filler sees it (every value as a string, keys sorted).
+    """
+    normalized = json.dumps({str(key): str(value) for key, value in data_to_fill.items()}, sort_keys=True)
+    digest = hashlib.sha256()
+    for part in (template_fingerprint, mapping_fingerprint(field_mapping), mode, normalized):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class FilledPdfCache:
+    """
+    Thread-safe LRU of filled forms, bounded by the total size of the stored bytes.
+    Entries are {"output", "filled_fields", "not_found_fields"} dicts.
+    """
+
+    def __init__(self, max_bytes: int = FILLED_PDF_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        """Store an entry, evicting the least recently used until it fits; oversized entries are skipped"""
+        size = len(entry["output"])
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous["output"])
+            while self.entries and self.size_bytes + size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size_bytes -= len(evicted["output"])
+                self.evictions += 1
+            self.entries[key] = entry
+            self.size_bytes += size
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and memory use"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def open_filled_pdf_cache(max_bytes: int = FILLED_PDF_CACHE_MAX_BYTES) -> Optional[FilledPdfCache]:
+    """The configured cache, or None when it is disabled"""
+    return FilledPdfCache(max_bytes) if max_bytes > 0 else None
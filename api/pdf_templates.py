@@ -0,0 +1,466 @@
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from xml.sax.saxutils import escape, quoteattr
+from typing import Any, Dict, List, Optional, Tuple
+
+import pymupdf
+
+from form_records import FormRecord
+from schemas_ import field_mapping, file_paths
+from widget_schemas_ import widget_mapping
+
+# Directory the fillable templates are read from
+TEMPLATE_DIR = os.environ.get('PDF_TEMPLATE_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# Where the built registry (template bytes plus widget indexes) is persisted
+TEMPLATE_REGISTRY_PATH = os.environ.get(
+    "TEMPLATE_REGISTRY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_registry.pkl"),
+)
+
+# Bump when the on-disk layout of the registry changes
+TEMPLATE_REGISTRY_FORMAT_VERSION = 1
+
+# How generated forms are produced:
+#   full - set each widget and regenerate its appearance stream (renders everywhere)
+#   fast - write field values directly and set NeedAppearances so the viewer draws them
+#   fdf / xfdf - only the field data, to be imported into the blank template
+FILL_MODES = ("full", "fast", "fdf", "xfdf")
+FIELD_DATA_MIMETYPES = {"fdf": "application/vnd.fdf", "xfdf": "application/vnd.adobe.xfdf"}
+
+# Every fillable form: its source PDF (relative to TEMPLATE_DIR), the form revision it
+# is, and the mapping from our field names to its widgets. The schedules are built from
+# the filled IRS samples with their values cleared ("clear_values").
+TEMPLATE_SOURCES = {
+    "f1040": {"file": "f1040.pdf", "version": "2024", "field_mapping": field_mapping},
+    **{
+        form_name: {"file": file_paths[form_name], "version": "2024", "field_mapping": widget_mapping[form_name], "clear_values": True}
+        for form_name in ("schedule_1", "schedule_2", "schedule_3", "schedule_8812", "form_8863")
+    },
+}
+
+# Order forms are assembled in when a whole return is filled into one PDF
+PACKAGE_ORDER = ["f1040", "schedule_1", "schedule_2", "schedule_3", "schedule_8812", "form_8863"]
+
+
+class PdfTemplate:
+    """
+    A fillable PDF held in memory, with its widgets indexed by field name.
+
+    `field_index` maps each field name to the (page number, widget xref) of its
+    first widget, so filling a field is a direct lookup instead of a scan over
+    every widget on every page. `on_states` holds the "on" value of each
+    checkbox and radio button. `field_mapping` maps our field names to widget
+    names; a tuple spreads one "-"-separated value over several widgets.
+    """
+
+    def __init__(self, name: str, pdf_bytes: bytes, version: str = "", field_mapping: Optional[Dict[str, Any]] = None,
+                 file: Optional[str] = None):
+        self.name = name
+        self.version = version
+        self.file = file or f"{name}.pdf"
+        self.pdf_bytes = pdf_bytes
+        self.field_mapping = field_mapping or {}
+        # Covers the revision too, so caches keyed on it drop outputs of an older template
+        self.fingerprint = hashlib.sha256(version.encode("utf-8") + b"\0" + pdf_bytes).hexdigest()
+        self.field_index: Dict[str, Tuple[int, int]] = {}
+        self.on_states: Dict[str, str] = {}
+        self.page_count = 0
+
+    @classmethod
+    def build(cls, name: str, pdf_bytes: bytes, version: str = "", field_mapping: Optional[Dict[str, Any]] = None,
+              file: Optional[str] = None, clear_values: bool = False) -> "PdfTemplate":
+        """Index a template's widgets, first blanking every field if it was built from a filled copy"""
+        doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            if clear_values:
+                clear_field_values(doc)
+                pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+                doc.close()
+                doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+
+            template = cls(name, pdf_bytes, version, field_mapping, file)
+            template.page_count = len(doc)
+            for page in doc:
+                for widget in page.widgets():
+                    if widget.field_name in template.field_index:
+                        continue
+                    template.field_index[widget.field_name] = (page.number, widget.xref)
+                    if widget.field_type in (pymupdf.PDF_WIDGET_TYPE_CHECKBOX, pymupdf.PDF_WIDGET_TYPE_RADIOBUTTON):
+                        template.on_states[widget.field_name] = widget.on_state()
+            return template
+        finally:
+            doc.close()
+
+    def to_artifact(self) -> Dict[str, Any]:
+        """Plain-data form of the template for the persisted registry"""
+        return {
+            "name": self.name,
+            "version": self.version,
+            "file": self.file,
+            "pdf_bytes": self.pdf_bytes,
+            "field_mapping": self.field_mapping,
+            "field_index": self.field_index,
+            "on_states": self.on_states,
+            "page_count": self.page_count,
+        }
+
+    @classmethod
+    def from_artifact(cls, artifact: Dict[str, Any]) -> "PdfTemplate":
+        """Rebuild a template from the registry without reopening or rescanning the PDF"""
+        template = cls(artifact["name"], artifact["pdf_bytes"], artifact["version"], artifact["field_mapping"], artifact["file"])
+        template.field_index = artifact["field_index"]
+        template.on_states = artifact["on_states"]
+        template.page_count = artifact["page_count"]
+        return template
+
+    def open(self):
+        """A fresh, independent document opened from the in-memory bytes"""
+        return pymupdf.open(stream=self.pdf_bytes, filetype="pdf")
+
+
+def clear_field_values(doc) -> None:
+    """Blank every field of a filled PDF, dropping the stale appearance of each text field"""
+    for page in doc:
+        for widget in page.widgets():
+            if widget.field_type in (pymupdf.PDF_WIDGET_TYPE_CHECKBOX, pymupdf.PDF_WIDGET_TYPE_RADIOBUTTON):
+                doc.xref_set_key(widget.xref, "V", "/Off")
+                doc.xref_set_key(widget.xref, "AS", "/Off")
+            else:
+                doc.xref_set_key(widget.xref, "V", "()")
+                doc.xref_set_key(widget.xref, "AP", "null")
+
+
+def source_path(source: Dict[str, Any]) -> str:
+    return os.path.normpath(os.path.join(TEMPLATE_DIR, source["file"]))
+
+
+def registry_fingerprint(sources: Dict[str, Dict[str, Any]] = TEMPLATE_SOURCES) -> str:
+    """Hash of every template source and its settings, used to detect a stale persisted registry"""
+    digest = hashlib.sha256()
+    for name in sorted(sources):
+        source = sources[name]
+        settings = {key: value for key, value in source.items() if key != "file"}
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update(json.dumps(settings, sort_keys=True).encode("utf-8") + b"\0")
+        try:
+            with open(source_path(source), "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+def build_template_registry(sources: Dict[str, Dict[str, Any]] = TEMPLATE_SOURCES) -> Dict[str, Any]:
+    """Read, blank (where needed) and index every template source that exists"""
+    templates = {}
+    for name, source in sources.items():
+        path = source_path(source)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+        except OSError as e:
+            print(f"⚠️ Skipping PDF template {name}: {e}")
+            continue
+        template = PdfTemplate.build(name, pdf_bytes, source["version"], source["field_mapping"],
+                                     os.path.basename(path), source.get("clear_values", False))
+        templates[name] = template.to_artifact()
+
+    return {
+        "format_version": TEMPLATE_REGISTRY_FORMAT_VERSION,
+        "fingerprint": registry_fingerprint(sources),
+        "templates": templates,
+    }
+
+
+def save_template_registry(registry: Dict[str, Any], path: str = TEMPLATE_REGISTRY_PATH) -> None:
+    """Persist the built registry atomically"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(registry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_template_registry(path: str = TEMPLATE_REGISTRY_PATH,
+                           sources: Dict[str, Dict[str, Any]] = TEMPLATE_SOURCES) -> Dict[str, PdfTemplate]:
+    """
+    Load the persisted registry, rebuilding (and re-saving) it when it is missing,
+    unreadable or was built from different sources.
+    """
+    fingerprint = registry_fingerprint(sources)
+    registry = None
+
+    try:
+        with open(path, "rb") as f:
+            registry = pickle.load(f)
+        if registry.get("format_version") != TEMPLATE_REGISTRY_FORMAT_VERSION or registry.get("fingerprint") != fingerprint:
+            print(f"⚠️ Template registry at {path} is stale, rebuilding")
+            registry = None
+    except FileNotFoundError:
+        print(f"🔄 No template registry at {path}, building one")
+    except Exception as e:
+        print(f"⚠️ Could not load template registry from {path}: {e}, rebuilding")
+
+    if registry is None:
+        registry = build_template_registry(sources)
+        try:
+            save_template_registry(registry, path)
+        except OSError as e:
+            print(f"⚠️ Could not persist template registry to {path}: {e}")
+
+    return {name: PdfTemplate.from_artifact(artifact) for name, artifact in registry["templates"].items()}
+
+
+# Loaded templates, shared by every request
+_templates: Optional[Dict[str, PdfTemplate]] = None
+_templates_lock = threading.Lock()
+
+
+def get_templates() -> Dict[str, PdfTemplate]:
+    """Every loaded template, loading the registry on first use"""
+    global _templates
+    if _templates is None:
+        with _templates_lock:
+            if _templates is None:
+                _templates = load_template_registry()
+                print(f"✅ Loaded PDF templates: {', '.join(f'{name} v{t.version} ({len(t.field_index)} fields)' for name, t in _templates.items())}")
+    return _templates
+
+
+def get_template(name: str) -> PdfTemplate:
+    """Return a registered template"""
+    if name not in TEMPLATE_SOURCES:
+        raise KeyError(f"Unknown PDF template: {name}")
+    template = get_templates().get(name)
+    if template is None:
+        raise FileNotFoundError(f"Template file not found: {source_path(TEMPLATE_SOURCES[name])}")
+    return template
+
+
+def preload_templates() -> None:
+    """Load the template registry at app start so the first request does not pay for it"""
+    try:
+        get_templates()
+    except Exception as e:
+        print(f"⚠️ Could not load PDF templates: {e}")
+
+
+def resolve_fields(template: PdfTemplate, data_to_fill: Dict[str, Any], field_mapping: Dict[str, Any]):
+    """
+    Match `data_to_fill` (keyed by the names in `field_mapping`, or a form record) to template fields.
+    Returns ([(user field, PDF field, value)], fields that could not be filled).
+    """
+    if isinstance(data_to_fill, FormRecord):
+        data_to_fill = data_to_fill.fill_values()
+    fields = []
+    not_found_fields = []
+
+    for user_field_name, value in data_to_fill.items():
+        pdf_field_name = field_mapping.get(user_field_name)
+
+        if not pdf_field_name:
+            not_found_fields.append(user_field_name)
+            continue
+
+        if isinstance(pdf_field_name, tuple):
+            # One value spread over several widgets, e.g. an SSN in three boxes
+            parts = str(value).split("-")
+            missing = [name for name in pdf_field_name if name not in template.field_index]
+            if missing or len(parts) != len(pdf_field_name):
+                not_found_fields.append(f"{user_field_name} (PDF fields: {', '.join(pdf_field_name)})")
+                continue
+            fields.extend((user_field_name, name, part) for name, part in zip(pdf_field_name, parts))
+            continue
+
+        if pdf_field_name not in template.field_index:
+            not_found_fields.append(f"{user_field_name} (PDF field: {pdf_field_name})")
+            continue
+
+        fields.append((user_field_name, pdf_field_name, value))
+
+    return fields, not_found_fields
+
+
+def checkbox_state(template: PdfTemplate, pdf_field_name: str, value: Any) -> str:
+    """State a checkbox ends up in for `value`, matching what widget.update() does"""
+    on_state = template.on_states[pdf_field_name]
+    return on_state if str(value) in (on_state, "Yes") else "Off"
+
+
+def fill_document(template: PdfTemplate, data_to_fill: Dict[str, Any], field_mapping: Dict[str, Any], mode: str = "full"):
+    """
+    Fill a copy of the template in "full" or "fast" mode.
+    Returns (open document, filled field descriptions, fields that could not be filled).
+    """
+    fields, not_found_fields = resolve_fields(template, data_to_fill, field_mapping)
+    filled_fields = [f"{user_field_name} -> {pdf_field_name}: {value}" for user_field_name, pdf_field_name, value in fields]
+
+    doc = template.open()
+    try:
+        if mode == "full":
+            pages = {}
+            for _, pdf_field_name, value in fields:
+                page_number, xref = template.field_index[pdf_field_name]
+                page = pages.get(page_number)
+                if page is None:
+                    page = pages[page_number] = doc[page_number]
+                widget = page.load_widget(xref)
+                widget.field_value = str(value)
+                widget.update()
+        else:
+            # Write /V (and a checkbox's /AS) straight into each widget; no appearance streams
+            for _, pdf_field_name, value in fields:
+                _, xref = template.field_index[pdf_field_name]
+                if pdf_field_name in template.on_states:
+                    state = "/" + checkbox_state(template, pdf_field_name, value)
+                    doc.xref_set_key(xref, "V", state)
+                    doc.xref_set_key(xref, "AS", state)
+                else:
+                    doc.xref_set_key(xref, "V", pymupdf.get_pdf_str(str(value)))
+            set_need_appearances(doc)
+    except Exception:
+        doc.close()
+        raise
+
+    return doc, filled_fields, not_found_fields
+
+
+def fill_template(template: PdfTemplate, data_to_fill: Dict[str, Any],
+                  field_mapping: Optional[Dict[str, Any]] = None, mode: str = "full") -> Tuple[Optional[bytes], List[str], List[str]]:
+    """
+    Fill a template's fields with `data_to_fill` (keyed by the names in `field_mapping`,
+    the template's own mapping by default).
+    `mode` is one of FILL_MODES; "fdf" and "xfdf" return field data instead of a PDF.
+    Returns (output bytes, filled field descriptions, fields that could not be filled).
+    """
+    if mode not in FILL_MODES:
+        raise ValueError(f"Unknown fill mode: {mode} (expected one of {', '.join(FILL_MODES)})")
+    if field_mapping is None:
+        field_mapping = template.field_mapping
+
+    if mode in FIELD_DATA_MIMETYPES:
+        fields, not_found_fields = resolve_fields(template, data_to_fill, field_mapping)
+        filled_fields = [f"{user_field_name} -> {pdf_field_name}: {value}" for user_field_name, pdf_field_name, value in fields]
+        build = build_fdf if mode == "fdf" else build_xfdf
+        return build(template, fields), filled_fields, not_found_fields
+
+    doc, filled_fields, not_found_fields = fill_document(template, data_to_fill, field_mapping, mode)
+    try:
+        # Object streams make the save itself several times faster, which matters most in fast mode
+        return doc.tobytes(use_objstms=1) if mode == "fast" else doc.tobytes(), filled_fields, not_found_fields
+    finally:
+        doc.close()
+
+
+def fill_package(forms_data: Dict[str, Dict[str, Any]], mode: str = "full") -> Tuple[bytes, Dict[str, Dict[str, Any]]]:
+    """
+    Fill several forms of one return into a single merged PDF, in PACKAGE_ORDER.
+    `forms_data` maps template names to the data for that form, keyed by its field mapping
+    (or to the form's form_records record).
+    Returns (pdf bytes, {template name: {"pages", "filled_fields", "not_found_fields"}}).
+    """
+    if mode not in ("full", "fast"):
+        raise ValueError(f"A merged package needs a PDF fill mode (full or fast), not {mode}")
+
+    names = sorted(forms_data, key=lambda name: PACKAGE_ORDER.index(name) if name in PACKAGE_ORDER else len(PACKAGE_ORDER))
+    package = pymupdf.open()
+    report = {}
+    try:
+        for name in names:
+            template = get_template(name)
+            doc, filled_fields, not_found_fields = fill_document(template, forms_data[name], template.field_mapping, mode)
+            try:
+                first_page = len(package) + 1
+                # Widgets keep their values; clashing field names across forms are renamed on insert
+                package.insert_pdf(doc)
+            finally:
+                doc.close()
+            report[name] = {
+                "version": template.version,
+                "pages": [first_page, len(package)],
+                "filled_fields": len(filled_fields),
+                "not_found_fields": not_found_fields,
+            }
+
+        if mode == "fast":
+            set_need_appearances(package)
+            return package.tobytes(use_objstms=1), report
+        return package.tobytes(garbage=1), report
+    finally:
+        package.close()
+
+
+def set_need_appearances(doc) -> None:
+    """Ask viewers to generate field appearances themselves"""
+    kind, value = doc.xref_get_key(doc.pdf_catalog(), "AcroForm")
+    if kind == "xref":
+        doc.xref_set_key(int(value.split()[0]), "NeedAppearances", "true")
+    else:
+        doc.xref_set_key(doc.pdf_catalog(), "AcroForm/NeedAppearances", "true")
+
+
+def build_fdf(template: PdfTemplate, fields) -> bytes:
+    """FDF document carrying the field values, referencing the template file"""
+    entries = []
+    for _, pdf_field_name, value in fields:
+        if pdf_field_name in template.on_states:
+            field_value = "/" + checkbox_state(template, pdf_field_name, value)
+        else:
+            field_value = pymupdf.get_pdf_str(str(value))
+        entries.append(f"<< /T {pymupdf.get_pdf_str(pdf_field_name)} /V {field_value} >>")
+
+    template_file = pymupdf.get_pdf_str(template.file)
+    return (
+        "%FDF-1.2\n"
+        f"1 0 obj\n<< /FDF << /F {template_file} /Fields [\n" + "\n".join(entries) + "\n] >> >>\nendobj\n"
+        "trailer\n<< /Root 1 0 R >>\n%%EOF\n"
+    ).encode("latin-1")
+
+
+def build_xfdf(template: PdfTemplate, fields) -> bytes:
+    """XFDF document carrying the field values, referencing the template file"""
+    entries = []
+    for _, pdf_field_name, value in fields:
+        field_value = checkbox_state(template, pdf_field_name, value) if pdf_field_name in template.on_states else str(value)
+        entries.append(f"    <field name={quoteattr(pdf_field_name)}><value>{escape(field_value)}</value></field>")
+
+    template_file = quoteattr(template.file)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<xfdf xmlns="http://ns.adobe.com/xfdf/" xml:space="preserve">\n'
+        f"  <f href={template_file}/>\n"
+        "  <fields>\n" + "\n".join(entries) + "\n  </fields>\n"
+        "</xfdf>\n"
+    ).encode("utf-8")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["benchmark"]:
+        # Benchmark each fill mode on the example return from tac_calc: python pdf_templates.py benchmark
+        from tac_calc import calculate_form_1040_values, final_forms_data
+
+        calculated_data = calculate_form_1040_values(final_forms_data)
+        template = get_template("f1040")
+        runs = 10
+
+        for mode in FILL_MODES:
+            fill_template(template, calculated_data, field_mapping, mode)
+            started = time.perf_counter()
+            for _ in range(runs):
+                output, filled_fields, _ = fill_template(template, calculated_data, field_mapping, mode)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / runs
+            print(f"{mode:>5}: {elapsed_ms:8.1f} ms per fill, {len(output):>7} bytes, {len(filled_fields)} fields")
+    elif sys.argv[1:]:
+        sys.exit("usage: python pdf_templates.py [benchmark]  (no argument builds the template registry)")
+    else:
+        # Build the registry ahead of deployment: python pdf_templates.py
+        registry = build_template_registry()
+        save_template_registry(registry)
+        for name, artifact in registry["templates"].items():
+            print(f"  {name} v{artifact['version']}: {artifact['page_count']} page(s), {len(artifact['field_index'])} fields, {len(artifact['pdf_bytes'])} bytes")
+        print(f"✅ Template registry written to {TEMPLATE_REGISTRY_PATH}")
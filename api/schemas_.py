@@ -8,6 +8,13 @@ map_forms_to_processor_ids = {
     "form_1099_nec": "79562a8dbe765539"
 }
 
+# Leading pages each processor extracts from; later pages (other copies of the form) are not sent.
+# Forms not listed are sent whole
+processor_page_limits = {
+    "form_w2": 1,
+    "form_1099_nec": 1
+}
+
 FILE_TEXT = {
     "schedule_1": """SCHEDULE 1  (Form 1040) 2024 Additional Income and Adjustments to Income Department of the Treasury   Internal Revenue Service   Attach to Form 1040, 1040-SR, or 1040-NR.  Go to www.irs.gov/Form1040 for instructions and the latest information OMB No. 1545-0074 Attachment    Sequence No. 01  Name(s) shown on Form 1040, 1040-SR, or 1040-NR Your social security number For 2024, enter the amount reported to you on Form(s) 1099-K that was included in error or for personal items sold at a loss                               Note: The remaining amounts reported to you on Form(s) 1099-K should be reported elsewhere on your return depending on the  nature of the transaction. See www.irs.gov/1099k.  Part I  Additional Income 1 Taxable refunds, credits, or offsets of state and local income taxes             1 2a Alimony received                              2a b Date of original divorce or separation agreement (see instructions): 3 Business income or (loss). Attach Schedule C                    3 4 Other gains or (losses). Attach Form 4797                     4 5 Rental real estate, royalties, partnerships, S corporations, trusts, etc. Attach Schedule E      5 6 Farm income or (loss). Attach Schedule F                     6 7 Unemployment compensation                         7 8 Other income: a Net operating loss                     8a (                          ) b Gambling                        8b c Cancellation of debt                     8c d Foreign earned income exclusion from Form 2555           8d (                          ) e Income from Form 8853                   8e f Income from Form 8889                   8f g Alaska Permanent Fund dividends                8g h Jury duty pay                       8h i Prizes and awards                     8i j Activity not engaged in for profit income              8j k Stock options                       8k l  Income from the rental of personal property if you engaged in the rental for  profit but were not in the business of renting such property        8l m Olympic and Paralympic medals and USOC prize money (see instructions)  8m n Section 951(a) inclusion (see instructions)             8n o Section 951A(a) inclusion (see instructions)             8o p Section 461(l) excess business loss adjustment           8p q Taxable distributions from an ABLE account (see instructions)       8q r Scholarship and fellowship grants not reported on Form W-2       8r s Nontaxable amount of Medicaid waiver payments included on Form 1040, line 1a or 1d                         8s (                          ) t  Pension or annuity from a nonqualifed deferred compensation plan or a  nongovernmental section 457 plan                8t u Wages earned while incarcerated                8u v  Digital assets received as ordinary income not reported elsewhere. See  instructions                       8v z Other income. List type and amount: 8z 9 Total other income. Add lines 8a through 8z                     9 10  Combine lines 1 through 7 and 9. This is your additional income. Enter here and on Form 1040,  1040-SR, or 1040-NR, line 8                          10 For Paperwork Reduction Act Notice, see your tax return instructions.  Cat. No. 71479F Schedule 1 (Form 1040) 2024  Schedule 1 (Form 1040) 2024 Page 2 Part II Adjustments to Income 11 Educator expenses                             11 12  Certain business expenses of reservists, performing artists, and fee-basis government officials. Attach Form 2106                                12 13 Health savings account deduction. Attach Form 8889                 13 14 Moving expenses for members of the Armed Forces. Attach Form 3903           14 15 Deductible part of self-employment tax. Attach Schedule SE               15 16 Self-employed SEP, SIMPLE, and qualified plans                   16 17 Self-employed health insurance deduction                     17 18 Penalty on early withdrawal of savings                       18 19a Alimony paid                               19a b Recipient's SSN                        c Date of original divorce or separation agreement (see instructions): 20 IRA deduction                               20 21 Student loan interest deduction                         21 22 Reserved for future use                           22 23 Archer MSA deduction                            23 24 Other adjustments: a Jury duty pay (see instructions)                 24a b Deductible expenses related to income reported on line 8l from the rental of personal property engaged in for profit              24b c Nontaxable amount of the value of Olympic and Paralympic medals and USOC  prize money reported on line 8m                24c d Reforestation amortization and expenses              24d e Repayment of supplemental unemployment benefits under the Trade Act of 1974                          24e f Contributions to section 501(c)(18)(D) pension plans          24f g Contributions by certain chaplains to section 403(b) plans        24g h Attorney fees and court costs for actions involving certain unlawful  discrimination claims (see instructions)              24h i  Attorney fees and court costs you paid in connection with an award from the IRS for information you provided that helped the IRS detect tax law violations   24i j Housing deduction from Form 2555               24j k Excess deductions of section 67(e) expenses from Schedule K-1 (Form 1041)   24k z Other adjustments. List type and amount: 24z 25 Total other adjustments. Add lines 24a through 24z                  25 26  Add lines 11 through 23 and 25. These are your adjustments to income. Enter here and on Form 1040, 1040-SR, or 1040-NR, line 10                       26 Schedule 1 (Form 1040) 2024  """,
     "schedule_2": """SCHEDULE 2  (Form 1040) 2024 Additional Taxes Department of the Treasury   Internal Revenue Service   Attach to Form 1040, 1040-SR, or 1040-NR.   Go to www.irs.gov/Form1040 for instructions and the latest information OMB No. 1545-0074 Attachment    Sequence No. 02  Name(s) shown on Form 1040, 1040-SR, or 1040-NR Your social security number Part I  Tax 1 Additions to tax: a Excess advance premium tax credit repayment. Attach Form 8962     1a b    Repayment of new clean vehicle credit(s) transferred to a registered dealer  from Schedule A (Form 8936), Part II. Attach Form 8936 and Schedule A (Form 8936)                         1b c    Repayment of previously owned clean vehicle credit(s) transferred to a  registered dealer from Schedule A (Form 8936), Part IV. Attach Form 8936 and  Schedule A (Form 8936)                   1c d Recapture of net EPE from Form 4255, line 2a, column (l)        1d e Excessive payments (EP) from Form 4255. Check applicable box and enter  amount (i) Line 1a, column (n) (ii) Line 1c, column (n) (iii) Line 1d, column (n) (iv) Line 2a, column (n)     1e f  20% EP from Form 4255. Check applicable box and enter amount. See  instructions (i) Line 1a, column (o) (ii) Line 1c, column (o) (iii) Line 1d, column (o) (iv) Line 2a, column (o)     1f y Other additions to tax (see instructions): 1y z Add lines 1a through 1y                           1z 2 Alternative minimum tax. Attach Form 6251                     2 3 Add lines 1z and 2. Enter here and on Form 1040, 1040-SR, or 1040-NR, line 17         3 Part II Other Taxes 4 Self-employment tax. Attach Schedule SE                     4 5 Social security and Medicare tax on unreported tip income. Attach Form 4137   5 6 Uncollected social security and Medicare tax on wages. Attach Form 8919  6 7 Total additional social security and Medicare tax. Add lines 5 and 6             7 8 Additional tax on IRAs or other tax-favored accounts. Attach Form 5329 if required.  If not required, check here                         8 9 Household employment taxes. Attach Schedule H                   9 10 Repayment of first-time homebuyer credit. Attach Form 5405 if required           10 11 Additional Medicare Tax. Attach Form 8959                     11 12 Net investment income tax. Attach Form 8960                    12  13  Uncollected social security and Medicare or RRTA tax on tips or group-term life insurance from Form W-2, box 12                               13 14 Interest on tax due on installment income from the sale of certain residential lots and timeshares   14 15 Interest on the deferred tax on gain from certain installment sales with a sales price over $150,000  15 16 Recapture of low-income housing credit. Attach Form 8611               16 (continued on page 2) For Paperwork Reduction Act Notice, see your tax return instructions.  Cat. No. 71478U Schedule 2 (Form 1040) 2024  Schedule 2 (Form 1040) 2024 Page 2 Part II Other Taxes (continued) 17 Other additional taxes: a Recapture of other credits. List type, form number, and amount: 17a b Recapture of federal mortgage subsidy, if you sold your home see instructions  17b c Additional tax on HSA distributions. Attach Form 8889         17c d Additional tax on an HSA because you didn't remain an eligible individual.  Attach Form 8889                     17d e Additional tax on Archer MSA distributions. Attach Form 8853       17e f Additional tax on Medicare Advantage MSA distributions. Attach Form 8853   17f g Recapture of a charitable contribution deduction related to a fractional interest  in tangible personal property                  17g h Income you received from a nonqualified deferred compensation plan that fails to meet the requirements of section 409A             17h i  Compensation you received from a nonqualified deferred compensation plan  described in section 457A                   17i j Section 72(m)(5) excess benefits tax               17j k Golden parachute payments                  17k l Tax on accumulation distribution of trusts             17l m Excise tax on insider stock compensation from an expatriated corporation   17m n Look-back interest under section 167(g) or 460(b) from Form 8697 or 8866  17n o Tax on non-effectively connected income for any part of the year you were a  nonresident alien from Form 1040-NR               17o p Any interest from Form 8621, line 16f, relating to distributions from, and  dispositions of, stock of a section 1291 fund            17p q Any interest from Form 8621, line 24               17q z Any other taxes. List type and amount: 17z 18 Total additional taxes. Add lines 17a through 17z                   18 19 Recapture of net EPE from Form 4255, line 1d, column (l)                19 20 Section 965 net tax liability installment from Form 965-A         20 21  Add lines 4, 7 through 16, 18, and 19. These are your total other taxes. Enter here and on Form 1040  or 1040-SR, line 23, or Form 1040-NR, line 23b                   21 Schedule 2 (Form 1040) 2024""",
@@ -19,6 +26,19 @@ FILE_TEXT = {
 }
 
 
+# Header signatures checked against the top of page 1 before full-text classification.
+# Every pattern in a form's list must match (case-sensitive, whitespace collapsed).
+FORM_SIGNATURES = {
+    "schedule_1": [r"SCHEDULE 1 \(Form 1040\)", r"Sequence No\. 01\b"],
+    "schedule_2": [r"SCHEDULE 2 \(Form 1040\)", r"Sequence No\. 02\b"],
+    "schedule_3": [r"SCHEDULE 3 \(Form 1040\)", r"Sequence No\. 03\b"],
+    "schedule_8812": [r"SCHEDULE 8812 \(Form 1040\)", r"Sequence No\. 47\b"],
+    "form_8863": [r"\bForm 8863\b", r"Education Credits", r"Sequence No\. 50\b"],
+    "form_w2": [r"\b22222\b", r"OMB No\. 1545-0029"],
+    "form_1099_nec": [r"\bForm 1099-NEC\b", r"OMB No\. 1545-0116"]
+}
+
+
 field_mapping = {
     'tax_yr_begin_month_date': 'topmostSubform[0].Page1[0].f1_01[0]',
     'tax_yr_end_month_date': 'topmostSubform[0].Page1[0].f1_02[0]',
@@ -163,12 +183,14 @@ field_mapping = {
     'Chk_self_employed': 'topmostSubform[0].Page2[0].c2_7[0]'
  }
 
+# Filled IRS samples of each form, relative to this directory; pdf_templates blanks
+# the schedules among them into fillable templates
 file_paths = {
-    "schedule_1": "../pdfs/f1040s1_schedule1_filled.pdf",
-    "schedule_2": "../pdfs/f1040s2_schedule2_filled.pdf",
-    "schedule_3": "../pdfs/f1040s3_schedule3_filled.pdf",
-    "schedule_8812": "../pdfs/f1040s8_schedule8812_filled.pdf",
-    "form_8863": "../pdfs/f8863_filled.pdf",
-    "form_w2": "../pdfs/fw2_filled.pdf",
-    "form_1099_nec": "../NEC/IRS-1099-NEC-2024-3-filled1.pdf"
+    "schedule_1": "../dummy_docs/f1040s1_schedule1_filled.pdf",
+    "schedule_2": "../dummy_docs/f1040s2_schedule2_filled.pdf",
+    "schedule_3": "../dummy_docs/f1040s3_schedule3_filled.pdf",
+    "schedule_8812": "../dummy_docs/f1040s8_schedule8812_filled.pdf",
+    "form_8863": "../dummy_docs/f8863_filled.pdf",
+    "form_w2": "../dummy_docs/fw2_filled.pdf",
+    "form_1099_nec": "../dummy_docs/IRS-1099-NEC-2024-3-filled1.pdf"
 }
\ No newline at end of file
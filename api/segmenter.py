@@ -0,0 +1,129 @@
+import itertools
+import time
+import pymupdf
+from typing import Dict, Any, Iterator, List, Optional
+
+from form_index import match_fingerprints, HEADER_FRACTION, CLASSIFY_MAX_PAGES
+from acroform_extract import read_widget_values
+
+
+def get_header_text(page, fraction: float = HEADER_FRACTION) -> str:
+    """Extract only the text in the top band of a page, for header fingerprinting"""
+    rect = page.rect
+    clip = pymupdf.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * fraction)
+    return page.get_text(clip=clip)
+
+
+def normalize_page_text(text: str) -> str:
+    """One page's text flattened for classification: sentence-ending and plain newlines become spaces"""
+    return (text + "\n").replace(".\n", " ").replace("\n", " ")
+
+
+def iter_page_texts(doc, max_pages: Optional[int] = None, clip=None, start_page: int = 0) -> Iterator[str]:
+    """
+    Yield the normalized text of each page, extracted only when asked for.
+    `max_pages` caps how many pages are read and `clip` (a rect-like) limits each page
+    to a region. Joining every page gives the whole document's text, as the classifier reads it.
+    """
+    end_page = len(doc) if not max_pages else min(len(doc), start_page + max_pages)
+    for page_number in range(start_page, end_page):
+        yield normalize_page_text(doc[page_number].get_text(clip=clip))
+
+
+def iter_segments(doc, max_text_pages: Optional[int] = CLASSIFY_MAX_PAGES) -> Iterator[Dict[str, Any]]:
+    """
+    Walk a PDF page by page and yield one segment per form it contains.
+
+    A page whose header matches exactly one form signature starts a new segment;
+    any other page continues the current one. Leading pages with no signature form
+    an unidentified segment whose text (its first `max_text_pages` pages) is kept for
+    TF-IDF classification. Each segment is yielded as soon as the next boundary is found.
+    """
+    current = None
+
+    for page_number, page in enumerate(doc):
+        matches = match_fingerprints(get_header_text(page))
+
+        if len(matches) == 1:
+            if current is not None:
+                yield current
+            current = {
+                "identified_form": matches[0],
+                "start_page": page_number,
+                "end_page": page_number,
+                "classification_path": "fingerprint",
+            }
+            continue
+
+        if current is None:
+            current = {
+                "identified_form": None,
+                "start_page": page_number,
+                "end_page": page_number,
+                "classification_path": "tfidf",
+                "page_texts": [],
+            }
+        current["end_page"] = page_number
+        if current["identified_form"] is None and not (max_text_pages and len(current["page_texts"]) >= max_text_pages):
+            current["page_texts"].append(page.get_text())
+
+    if current is not None:
+        yield current
+
+
+def extract_pages(doc, start_page: int, end_page: int) -> bytes:
+    """Copy an inclusive page range into a standalone PDF"""
+    sub_doc = pymupdf.open()
+    try:
+        sub_doc.insert_pdf(doc, from_page=start_page, to_page=end_page)
+        return sub_doc.tobytes(garbage=3, deflate=True)
+    finally:
+        sub_doc.close()
+
+
+def segment_text(segment: Dict[str, Any]) -> str:
+    """Text of an unidentified segment, normalised like the joined pages of iter_page_texts"""
+    res_text = "\n".join(segment.get("page_texts", [])) + "\n"
+    return res_text.replace(".\n", " ").replace("\n", " ")
+
+
+def split_pdf(doc) -> List[Dict[str, Any]]:
+    """
+    Everything the pipeline needs from an upload's pages, in one pass: one record per
+    form with its page range, header fingerprint match, widget values, and either its
+    text for TF-IDF or nothing to classify. Forms of a combined packet also carry their
+    pages as a standalone PDF in "content"; a single form leaves it None (the whole upload).
+    "elapsed_ms" is the time spent on the document up to that form.
+    """
+    started = time.perf_counter()
+    # Look one segment ahead to tell a single form from a combined packet
+    segments = iter_segments(doc)
+    first_segment = next(segments, None)
+    second_segment = next(segments, None)
+    is_packet = second_segment is not None
+    if first_segment is None:
+        return []
+
+    records = []
+    for segment in itertools.chain([first_segment], [second_segment] if is_packet else [], segments):
+        first_page = segment["start_page"] + 1
+        last_page = segment["end_page"] + 1
+        record = {
+            "identified_form": segment["identified_form"],
+            "start_page": segment["start_page"],
+            "end_page": segment["end_page"],
+            "segment_label": "",
+            "content": None,
+            # Fillable PDFs carry their values in form widgets
+            "widget_values": read_widget_values(doc, segment["start_page"], segment["end_page"]),
+        }
+        if is_packet:
+            # Upload only this form's pages, not the whole packet
+            record["segment_label"] = f" (pages {first_page}-{last_page})" if last_page > first_page else f" (page {first_page})"
+            record["content"] = extract_pages(doc, segment["start_page"], segment["end_page"])
+        if not segment["identified_form"]:
+            # The segment already holds its page text; no second parse of the upload
+            record["extracted_text"] = segment_text(segment)
+        record["elapsed_ms"] = (time.perf_counter() - started) * 1000
+        records.append(record)
+    return records
@@ -1,220 +1,279 @@
 import decimal
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from form_records import cents_to_decimal, normalize_forms
+from tax_tables import DEFAULT_FILING_STATUS, DEFAULT_TAX_YEAR, TAX_METHOD, get_tax_schedule
 
 # Set the precision for Decimal calculations
 decimal.getcontext().prec = 10
 
-def get_numerical_value(data: Dict[str, Any], keys: list) -> decimal.Decimal:
+def calculate_owed_tax(taxable_income: decimal.Decimal, tax_year: Optional[int] = None,
+                       filing_status: Optional[str] = None, method: str = TAX_METHOD) -> decimal.Decimal:
     """
-    Safely extracts a numerical value from a nested dictionary.
-    Handles missing keys and non-numeric characters.
+    Calculate tax for a tax year and filing status from the compiled tax tables
+    (tax_tables.json): a bisect for the bracket plus one multiply, or with
+    method="table" the IRS Tax Table row for incomes under $100,000.
     """
-    current_data = data
-    for i, key in enumerate(keys):
-        if key not in current_data:
-            return decimal.Decimal(0)
-        if i == len(keys) - 1:
-            raw_value = str(current_data[key]).replace('$', '').replace(',', '')
-            try:
-                return decimal.Decimal(raw_value)
-            except (decimal.InvalidOperation, ValueError):
-                return decimal.Decimal(0)
-        current_data = current_data[key]
+    return get_tax_schedule(tax_year, filing_status).tax(taxable_income, method)
+
+
+# Inputs are the typed attributes of form_records records (None where a form has no value)
+
+def _amount(cents: Optional[int]) -> decimal.Decimal:
+    """An amount in cents as Decimal dollars (missing or unreadable -> 0)"""
+    return decimal.Decimal(0) if cents is None else cents_to_decimal(cents)
+
+def _first_name(first_name: Optional[str], *full_names: Optional[str]) -> str:
+    # W-2 has the first name on its own; the schedules have full names
+    return first_name or next((name.split(' ')[0] for name in full_names if name), "")
+
+def _last_name(last_name: Optional[str], *full_names: Optional[str]) -> str:
+    return last_name or next((name.split(' ')[-1] for name in full_names if name), "")
+
+def _ssn(*ssns: Optional[str]) -> str:
+    return next((ssn for ssn in ssns if ssn), "")
+
+def _sum(*values: decimal.Decimal) -> decimal.Decimal:
+    total = values[0]
+    for value in values[1:]:
+        total += value
+    return total
+
+def _zero() -> decimal.Decimal:
     return decimal.Decimal(0)
 
-def get_string_value(data: Dict[str, Any], keys: list) -> str:
+
+class Line(NamedTuple):
     """
-    Safely extracts a string value from a nested dictionary.
+    One Form 1040 field: `compute` is called with the values of `inputs`, each the name
+    of an earlier line or an input ("form.field", an attribute of that form's record, or tax_year,
+    filing_status, tax_method). `kind` is "amount" (Decimal) or "text".
     """
-    current_data = data
-    for i, key in enumerate(keys):
-        if key not in current_data:
-            return ""
-        if i == len(keys) - 1:
-            return str(current_data[key])
-        current_data = current_data[key]
-    return ""
-
-def calculate_owed_tax(taxable_income: decimal.Decimal) -> decimal.Decimal:
+    name: str
+    inputs: Tuple[str, ...]
+    compute: Callable[..., Any]
+    kind: str = "amount"
+
+
+class Form1040Graph:
     """
-    Calculate Tax Based on 2024 Brackets for Single Filers.
-    This is a simplified calculation for demonstration purposes.
-    A real tax processor would use precise tax tables.
+    Form 1040 as a dependency graph of inputs -> lines, declared in form order (every line
+    after the lines it reads). Evaluating against the values of a previous evaluation
+    recomputes only the lines downstream of changed inputs, and stops following a branch
+    as soon as a recomputed line comes out unchanged.
     """
-    # 2024 Tax Brackets for Single Filers
-    # Source: https://www.irs.gov/newsroom/irs-provides-tax-inflation-adjustments-for-tax-year-2024
-    # (Note: This is a simplified representation of the brackets)
-    brackets_2024 = [
-        (decimal.Decimal('0'), decimal.Decimal('0.10')),
-        (decimal.Decimal('11600'), decimal.Decimal('0.12')),
-        (decimal.Decimal('47150'), decimal.Decimal('0.22')),
-        (decimal.Decimal('100525'), decimal.Decimal('0.24')),
-        (decimal.Decimal('191950'), decimal.Decimal('0.32')),
-        (decimal.Decimal('243725'), decimal.Decimal('0.35')),
-        (decimal.Decimal('609350'), decimal.Decimal('0.37'))
-    ]
-
-    owed_tax = decimal.Decimal(0)
-    remaining_income = taxable_income
-
-    for i, (bracket_start, rate) in enumerate(brackets_2024):
-        if remaining_income <= 0:
-            break
-
-        if i == len(brackets_2024) - 1: # Last bracket (top rate)
-            owed_tax += remaining_income * rate
-            remaining_income = decimal.Decimal(0)
-        else:
-            next_bracket_start = brackets_2024[i+1][0]
-            taxable_in_bracket = min(remaining_income, next_bracket_start - bracket_start)
-            owed_tax += taxable_in_bracket * rate
-            remaining_income -= taxable_in_bracket
 
-    return owed_tax.quantize(decimal.Decimal("0.01"))
+    def __init__(self, lines: List[Line]):
+        self.lines = lines
+        self.by_name = {}
+        self.dependents: Dict[str, List[str]] = {}
+        self.inputs: List[str] = []
+        for line in lines:
+            for dependency in line.inputs:
+                if dependency not in self.by_name and dependency[:4] == "LINE":
+                    raise ValueError(f"{line.name} reads {dependency} before it is declared")
+                if dependency not in self.by_name and dependency not in self.dependents:
+                    self.inputs.append(dependency)
+                self.dependents.setdefault(dependency, []).append(line.name)
+            self.by_name[line.name] = line
+        self.plan = [(line.name, line.compute, line.inputs) for line in lines]
+
+    def _coerce(self, line: Line, value: Any) -> Any:
+        """A previous value as it was computed (JSON turns Decimals into strings)"""
+        if line.kind == "text":
+            return str(value)
+        return value if isinstance(value, decimal.Decimal) else decimal.Decimal(str(value))
+
+    def evaluate(self, inputs: Dict[str, Any], previous: Optional[Dict[str, Any]] = None,
+                 changed_inputs: Iterable[str] = ()) -> Tuple[Dict[str, Any], Dict[str, Any], int]:
+        """
+        Evaluate the lines, reusing `previous` values for every line not downstream of
+        `changed_inputs` (lines missing from `previous` are computed).
+        Returns (every line's value, the lines whose value changed, lines evaluated).
+        """
+        # Inputs and lines share one namespace: inputs are "form.field" names or settings
+        scope = dict.fromkeys(self.inputs)
+        scope.update(inputs)
+        read = scope.__getitem__
+        if previous is None:
+            values = {}
+            for name, compute, sources in self.plan:
+                values[name] = scope[name] = compute(*map(read, sources))
+            return values, dict(values), len(self.plan)
+
+        values = {}
+        for name, value in previous.items():
+            line = self.by_name.get(name)
+            if line is not None:
+                try:
+                    values[name] = self._coerce(line, value)
+                except (decimal.InvalidOperation, ValueError, TypeError):
+                    pass
+        scope.update(values)
+        dirty = set()
+        for name in changed_inputs:
+            dirty.update(self.dependents.get(name, ()))
+
+        changed = {}
+        evaluated = 0
+        for name, compute, sources in self.plan:
+            if name in values and name not in dirty:
+                continue
+            value = compute(*map(read, sources))
+            evaluated += 1
+            if name not in values or values[name] != value:
+                changed[name] = value
+                dirty.update(self.dependents.get(name, ()))
+            values[name] = scope[name] = value
+        return {name: values[name] for name, _, _ in self.plan}, changed, evaluated
+
 
+def _standard_deduction(tax_year: int, filing_status: str) -> decimal.Decimal:
+    return get_tax_schedule(tax_year, filing_status).standard_deduction
+
+def _owed_tax(taxable_income: decimal.Decimal, tax_year: int, filing_status: str, tax_method: str) -> decimal.Decimal:
+    return get_tax_schedule(tax_year, filing_status).tax(taxable_income, tax_method)
+
+NAME_INPUTS = ('schedule_1.name_of_the_taxpayer', 'schedule_2.name_of_the_taxpayer', 'schedule_3.name_of_the_taxpayer', 'form_8863.name_shown_on_return')
+
+FORM_1040_GRAPH = Form1040Graph([
+    # Personal Information, prioritizing W2 for employee info, then Schedule 1, 2, 3, then 8863
+    Line("tax_payer_first_name_and_middle_initial", ('form_w2.employee_first_name',) + NAME_INPUTS, _first_name, "text"),
+    Line("tax_payer_last_name", ('form_w2.employee_last_name',) + NAME_INPUTS, _last_name, "text"),
+    Line("tax_payer_ssn", ('form_w2.employee_social_security_number', 'schedule_1.social_security_number', 'schedule_2.social_security_number',
+                           'schedule_3.social_security_number', 'form_8863.social_security_number'), _ssn, "text"),
+    Line("tax_year_last_2_digits", ('tax_year',), lambda tax_year: str(tax_year)[-2:], "text"),
+
+    # Part I: Income
+    Line("LINE1a_total_amount_from_w2", ('form_w2.wages_tips_other_compensation',), _amount),
+    Line("LINE1h_other_earned_income", ('form_1099_nec.nonemployee_compensation',), _amount),
+    Line("LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income", ("LINE1a_total_amount_from_w2", "LINE1h_other_earned_income"), _sum),
+    Line("LINE8_additional_income_from_schedule1", ('schedule_1.total_additional_income',), _amount),
+    # Assuming other lines (2b, 3b, 4b, 5b, 6b, 7) are 0 for this data
+    Line("LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income", ("LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income", "LINE8_additional_income_from_schedule1"), _sum),
+    Line("LINE10_adjustments_to_income_from_sched1", ('schedule_1.total_adjustments_to_income',), _amount),
+    Line("LINE11_adjusted_gross_income_equals_total_income_minus_adjustments", ("LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income", "LINE10_adjustments_to_income_from_sched1"),
+         lambda total_income, adjustments: total_income - adjustments),
 
-def calculate_form_1040_values(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Part II: Tax and Credits
+    Line("LINE12_standard_deductions_or_itemized_deductions", ('tax_year', 'filing_status'), _standard_deduction),
+    Line("LINE13_qbi_deduction_form_8995", (), _zero), # Not provided in input
+    Line("LINE14_total_deductions_add_line12_and_line13", ("LINE12_standard_deductions_or_itemized_deductions", "LINE13_qbi_deduction_form_8995"), _sum),
+    Line("LINE15_taxable_income", ("LINE11_adjusted_gross_income_equals_total_income_minus_adjustments", "LINE14_total_deductions_add_line12_and_line13"),
+         lambda agi, deductions: max(decimal.Decimal(0), agi - deductions)),
+    Line("LINE16_calculated_tax", ("LINE15_taxable_income", 'tax_year', 'filing_status', 'tax_method'), _owed_tax),
+    Line("LINE17_amount_tax_schedule2_line3", ('schedule_2.total_part1_tax',), _amount),
+    Line("LINE18_SUM_LINE16_AND_17", ("LINE16_calculated_tax", "LINE17_amount_tax_schedule2_line3"), _sum),
+    Line("LINE19_child_and_dependent_tax_credit_from_schedule_8812", ('schedule_8812.child_tax_credit_and_credit_for_other_dependents',), _amount),
+    Line("LINE20_amount_from_sched3_line8", ('schedule_3.total_nonrefundable_credits',), _amount),
+    Line("LINE21_SUM_LINE19_AND_20", ("LINE19_child_and_dependent_tax_credit_from_schedule_8812", "LINE20_amount_from_sched3_line8"), _sum),
+    Line("LINE22_equals_line18_minus_line21_if_positive_else_0", ("LINE18_SUM_LINE16_AND_17", "LINE21_SUM_LINE19_AND_20"),
+         lambda tax, credits: max(decimal.Decimal(0), tax - credits)),
+    Line("LINE23_other_taxes_from_sched2_line21", ('schedule_2.total_other_taxes',), _amount),
+    Line("LINE24_total_tax_add_line22_and_line23", ("LINE22_equals_line18_minus_line21_if_positive_else_0", "LINE23_other_taxes_from_sched2_line21"), _sum),
+
+    # Part III: Payments
+    Line("LINE25a_fed_withholding_w2", ('form_w2.federal_income_tax_withheld',), _amount),
+    Line("LINE25b_fed_withholding_1099", ('form_1099_nec.federal_income_tax_withheld',), _amount),
+    Line("LINE25c_fed_withholding_other_forms", (), _zero), # Not provided in input
+    Line("LINE25d_fed_total_withholding_payments_sum_25a_25b_25c", ("LINE25a_fed_withholding_w2", "LINE25b_fed_withholding_1099", "LINE25c_fed_withholding_other_forms"), _sum),
+    Line("LINE26_estimated_tax_payments", (), _zero), # Not provided in input
+    Line("LINE27_earned_income_credit", (), _zero), # Not provided in input
+    Line("LINE28_additional_child_tax_credit_from_schedule_8812", ('schedule_8812.additional_child_tax_credit',), _amount),
+    Line("LINE29_american_opportunity_credit_from_schedule_8863_line8", ('form_8863.refundable_american_opportunity_credit',), _amount),
+    Line("LINE31_amount_from_sched3_line15", ('schedule_3.total_payments_and_refundable_credits',), _amount),
+    Line("LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31", ("LINE26_estimated_tax_payments", "LINE27_earned_income_credit", "LINE28_additional_child_tax_credit_from_schedule_8812",
+                                                                                    "LINE29_american_opportunity_credit_from_schedule_8863_line8", "LINE31_amount_from_sched3_line15"), _sum),
+    Line("LINE33_total_payments_add_lines_25d_26_32", ("LINE25d_fed_total_withholding_payments_sum_25a_25b_25c", "LINE26_estimated_tax_payments",
+                                                       "LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31"), _sum),
+
+    # Part IV: Refund or Amount You Owe
+    Line("LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0", ("LINE33_total_payments_add_lines_25d_26_32", "LINE24_total_tax_add_line22_and_line23"),
+         lambda payments, tax: payments - tax if payments > tax else decimal.Decimal(0)),
+    # Assuming full refund unless specified otherwise
+    Line("LINE35a_wanted_refund_amount", ("LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0",), lambda overpayment: overpayment),
+    Line("LINE36_amount_from_line_34_you_want_applied_to_next_year_credit", (), _zero), # Not specified, assuming 0
+    Line("LINE37_amount_you_owe_line24_minus_line33", ("LINE33_total_payments_add_lines_25d_26_32", "LINE24_total_tax_add_line22_and_line23"),
+         lambda payments, tax: decimal.Decimal(0) if payments > tax else tax - payments),
+])
+
+# Extracted fields the graph reads, as (input name, form, field)
+FORM_1040_FIELDS = [(name, *name.split('.', 1)) for name in FORM_1040_GRAPH.inputs if '.' in name]
+
+def form_1040_inputs(data: Dict[str, Any], tax_year: Optional[int] = None, filing_status: Optional[str] = None,
+                     tax_method: str = TAX_METHOD) -> Dict[str, Any]:
+    """
+    The typed values FORM_1040_GRAPH reads, plus the tax settings. `data` maps form names
+    to form_records records, or to extracted form data, which is normalized here.
+    """
+    records = normalize_forms(data)
+    inputs = {
+        "tax_year": DEFAULT_TAX_YEAR if tax_year is None else int(tax_year),
+        "filing_status": filing_status or DEFAULT_FILING_STATUS,
+        "tax_method": tax_method or TAX_METHOD,
+    }
+    for name, form_name, field_name in FORM_1040_FIELDS:
+        record = records.get(form_name)
+        if record is not None:
+            inputs[name] = getattr(record, field_name, None)
+    return inputs
+
+def calculate_form_1040_values(data: Dict[str, Any], tax_year: Optional[int] = None,
+                               filing_status: Optional[str] = None, tax_method: str = TAX_METHOD) -> Dict[str, Any]:
     """
     Calculates and populates Form 1040 fields based on provided tax data.
 
     Args:
         data (Dict[str, Any]): A dictionary containing extracted data from
                                various tax forms and schedules.
+        tax_year (int): Tax year of the brackets and standard deduction (DEFAULT_TAX_YEAR if None).
+        filing_status (str): Filing status, e.g. "single" or "married_filing_jointly" (DEFAULT_FILING_STATUS if None).
+        tax_method (str): "schedule" or "table" (the IRS Tax Table under $100,000).
 
     Returns:
         Dict[str, Any]: A dictionary with calculated Form 1040 fields.
     """
-    # Personal Information (from any relevant form)
-    # Prioritizing W2 for employee info, then Schedule 1, then 8863
-    tax_payer_first_name_and_middle_initial = get_string_value(data, ['form_w2', 'employee_first_name']) or \
-                 get_string_value(data, ['schedule_1', 'name_of_the_taxpayer']).split(' ')[0] or \
-                 get_string_value(data, ['schedule_2', 'name_of_the_taxpayer']).split(' ')[0] or \
-                 get_string_value(data, ['schedule_3', 'name_of_the_taxpayer']).split(' ')[0] or \
-                 get_string_value(data, ['form_8863', 'name_shown_on_return']).split(' ')[0]
-
-    tax_payer_last_name = get_string_value(data, ['form_w2', 'employee_last_name']) or \
-                get_string_value(data, ['schedule_1', 'name_of_the_taxpayer']).split(' ')[-1] or \
-                get_string_value(data, ['schedule_2', 'name_of_the_taxpayer']).split(' ')[-1] or \
-                get_string_value(data, ['schedule_3', 'name_of_the_taxpayer']).split(' ')[-1] or\
-                get_string_value(data, ['form_8863', 'name_shown_on_return']).split(' ')[-1] 
-                
-
-    tax_payer_ssn = get_string_value(data, ['form_w2', 'employee_social_security_number']) or \
-          get_string_value(data, ['schedule_1', 'social_security_number']) or \
-          get_string_value(data, ['schedule_2', 'social_security_number']) or \
-          get_string_value(data, ['schedule_3', 'social_security_number']) or \
-          get_string_value(data, ['form_8863', 'social_security_number']) 
-          
-
-    # Standard Deduction for Single Filing in 2024
-    # Source: https://www.irs.gov/newsroom/irs-provides-tax-inflation-adjustments-for-tax-year-2024
-    standard_deduction_2024_single = decimal.Decimal('14600')
-
-    # Initialize 1040 fields dictionary
-    form_1040_fields = {
-        "tax_payer_first_name_and_middle_initial": tax_payer_first_name_and_middle_initial,
-        "tax_payer_last_name": tax_payer_last_name,
-        "tax_payer_ssn": tax_payer_ssn.replace('-', ''),
-        "tax_year_last_2_digits": "24", # Assuming 2024 for 1040 as per summary
-    }
+    values, _, _ = FORM_1040_GRAPH.evaluate(form_1040_inputs(data, tax_year, filing_status, tax_method))
+    return values
 
-    # Part I: Income
-    LINE1a_total_amount_from_w2 = get_numerical_value(data, ['form_w2', 'wages_tips_other_compensation'])
-    LINE1h_other_earned_income = get_numerical_value(data, ['form_1099_nec', 'nonemployee_compensation'])
-    LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income = LINE1a_total_amount_from_w2 + LINE1h_other_earned_income
-    LINE8_additional_income_from_schedule1 = get_numerical_value(data, ['schedule_1', 'total_additional_income'])
-    LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income = LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income + LINE8_additional_income_from_schedule1 # Assuming other lines (2b, 3b, 4b, 5b, 6b, 7) are 0 for this data
-    LINE10_adjustments_to_income_from_sched1 = get_numerical_value(data, ['schedule_1', 'total_adjustments_to_income'])
-    LINE11_adjusted_gross_income_equals_total_income_minus_adjustments = LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income - LINE10_adjustments_to_income_from_sched1
-
-    form_1040_fields.update({
-        "LINE1a_total_amount_from_w2": LINE1a_total_amount_from_w2,
-        "LINE1h_other_earned_income": LINE1h_other_earned_income,
-        "LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income": LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income,
-        "LINE8_additional_income_from_schedule1": LINE8_additional_income_from_schedule1,
-        "LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income": LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income,
-        "LINE10_adjustments_to_income_from_sched1": LINE10_adjustments_to_income_from_sched1,
-        "LINE11_adjusted_gross_income_equals_total_income_minus_adjustments": LINE11_adjusted_gross_income_equals_total_income_minus_adjustments,
-    })
+def recalculate_form_1040_values(data: Dict[str, Any], previous: Optional[Dict[str, Any]], changes: Dict[str, Any],
+                                 tax_year: Optional[int] = None, filing_status: Optional[str] = None,
+                                 tax_method: str = TAX_METHOD) -> Dict[str, Any]:
+    """
+    Recalculate Form 1040 after a few corrections, from a previous calculation of `data`.
 
-    # Part II: Tax and Credits
-    LINE12_standard_deductions_or_itemized_deductions = standard_deduction_2024_single # Assuming single filing status
-    LINE13_qbi_deduction_form_8995 = decimal.Decimal(0) # Not provided in input
-    LINE14_total_deductions_add_line12_and_line13 = LINE12_standard_deductions_or_itemized_deductions + LINE13_qbi_deduction_form_8995
-    LINE15_taxable_income = max(decimal.Decimal(0), LINE11_adjusted_gross_income_equals_total_income_minus_adjustments - LINE14_total_deductions_add_line12_and_line13)
-    LINE16_calculated_tax = calculate_owed_tax(LINE15_taxable_income) # Using the simplified tax calculation
-    LINE17_amount_tax_schedule2_line3 = get_numerical_value(data, ['schedule_2', 'total_part1_tax'])
-    LINE18_SUM_LINE16_AND_17 = LINE16_calculated_tax + LINE17_amount_tax_schedule2_line3
-    LINE19_child_and_dependent_tax_credit_from_schedule_8812 = get_numerical_value(data, ['schedule_8812', 'child_tax_credit_and_credit_for_other_dependents'])
-    LINE20_amount_from_sched3_line8 = get_numerical_value(data, ['schedule_3', 'total_nonrefundable_credits'])
-    LINE21_SUM_LINE19_AND_20 = LINE19_child_and_dependent_tax_credit_from_schedule_8812 + LINE20_amount_from_sched3_line8
-    LINE22_equals_line18_minus_line21_if_positive_else_0 = max(decimal.Decimal(0), LINE18_SUM_LINE16_AND_17 - LINE21_SUM_LINE19_AND_20)
-    LINE23_other_taxes_from_sched2_line21 = get_numerical_value(data, ['schedule_2', 'total_other_taxes'])
-    LINE24_total_tax_add_line22_and_line23 = LINE22_equals_line18_minus_line21_if_positive_else_0 + LINE23_other_taxes_from_sched2_line21
-
-    form_1040_fields.update({
-        "LINE12_standard_deductions_or_itemized_deductions": LINE12_standard_deductions_or_itemized_deductions,
-        "LINE13_qbi_deduction_form_8995": LINE13_qbi_deduction_form_8995,
-        "LINE14_total_deductions_add_line12_and_line13": LINE14_total_deductions_add_line12_and_line13,
-        "LINE15_taxable_income": LINE15_taxable_income,
-        "LINE16_calculated_tax": LINE16_calculated_tax,
-        "LINE17_amount_tax_schedule2_line3": LINE17_amount_tax_schedule2_line3,
-        "LINE18_SUM_LINE16_AND_17": LINE18_SUM_LINE16_AND_17,
-        "LINE19_child_and_dependent_tax_credit_from_schedule_8812": LINE19_child_and_dependent_tax_credit_from_schedule_8812,
-        "LINE20_amount_from_sched3_line8": LINE20_amount_from_sched3_line8,
-        "LINE21_SUM_LINE19_AND_20": LINE21_SUM_LINE19_AND_20,
-        "LINE22_equals_line18_minus_line21_if_positive_else_0": LINE22_equals_line18_minus_line21_if_positive_else_0,
-        "LINE23_other_taxes_from_sched2_line21": LINE23_other_taxes_from_sched2_line21,
-        "LINE24_total_tax_add_line22_and_line23": LINE24_total_tax_add_line22_and_line23,
-    })
+    Args:
+        data (Dict[str, Any]): The forms data `previous` was calculated from.
+        previous (Dict[str, Any]): The previous calculate_form_1040_values result (values may be strings).
+        changes (Dict[str, Any]): Corrected fields as {form: {field: value}}, and tax_year,
+                                  filing_status or tax_method to change those settings.
+        tax_year, filing_status, tax_method: The settings `previous` was calculated with.
 
-    # Part III: Payments
-    LINE25a_fed_withholding_w2 = get_numerical_value(data, ['form_w2', 'federal_income_tax_withheld'])
-    LINE25b_fed_withholding_1099 = get_numerical_value(data, ['form_1099_nec', 'federal_income_tax_withheld'])
-    LINE25c_fed_withholding_other_forms = decimal.Decimal(0) # Not provided in input
-    LINE25d_fed_total_withholding_payments_sum_25a_25b_25c = LINE25a_fed_withholding_w2 + LINE25b_fed_withholding_1099 + LINE25c_fed_withholding_other_forms
-    LINE26_estimated_tax_payments = decimal.Decimal(0) # Not provided in input (EIC)
-    LINE27_earned_income_credit = decimal.Decimal(0) # Not provided in input (Estimated tax payments)
-    LINE28_additional_child_tax_credit_from_schedule_8812 = get_numerical_value(data, ['schedule_8812', 'additional_child_tax_credit'])
-    LINE29_american_opportunity_credit_from_schedule_8863_line8 = get_numerical_value(data, ['form_8863', 'refundable_american_opportunity_credit'])
-    LINE31_amount_from_sched3_line15 = get_numerical_value(data, ['schedule_3', 'total_payments_and_refundable_credits'])
-    LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31 = LINE26_estimated_tax_payments + LINE27_earned_income_credit + LINE28_additional_child_tax_credit_from_schedule_8812 + LINE29_american_opportunity_credit_from_schedule_8863_line8 + LINE31_amount_from_sched3_line15
-    LINE33_total_payments_add_lines_25d_26_32 = LINE25d_fed_total_withholding_payments_sum_25a_25b_25c + LINE26_estimated_tax_payments + LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31
-
-    form_1040_fields.update({
-        "LINE25a_fed_withholding_w2": LINE25a_fed_withholding_w2,
-        "LINE25b_fed_withholding_1099": LINE25b_fed_withholding_1099,
-        "LINE25c_fed_withholding_other_forms": LINE25c_fed_withholding_other_forms,
-        "LINE25d_fed_total_withholding_payments_sum_25a_25b_25c": LINE25d_fed_total_withholding_payments_sum_25a_25b_25c,
-        "LINE26_estimated_tax_payments": LINE26_estimated_tax_payments, # This was EIC in the previous mapping, but now it's estimated tax payments
-        "LINE27_earned_income_credit": LINE27_earned_income_credit, # This was estimated tax payments in the previous mapping, but now it's EIC
-        "LINE28_additional_child_tax_credit_from_schedule_8812": LINE28_additional_child_tax_credit_from_schedule_8812,
-        "LINE29_american_opportunity_credit_from_schedule_8863_line8": LINE29_american_opportunity_credit_from_schedule_8863_line8,
-        "LINE31_amount_from_sched3_line15": LINE31_amount_from_sched3_line15,
-        "LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31": LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31,
-        "LINE33_total_payments_add_lines_25d_26_32": LINE33_total_payments_add_lines_25d_26_32,
-    })
+    Returns:
+        Dict[str, Any]: "forms_data" with the corrections applied, "changed" with only the
+        fields whose value changed, and the number of lines evaluated.
+    """
+    before = form_1040_inputs(data, tax_year, filing_status, tax_method)
+    updated = dict(data)
+    settings = {"tax_year": tax_year, "filing_status": filing_status, "tax_method": tax_method}
+    for name, value in changes.items():
+        if name in settings:
+            settings[name] = value
+        elif isinstance(value, dict):
+            updated[name] = {**(updated.get(name) or {}), **value}
+        else:
+            raise ValueError(f"Changes to {name} must be a {{field: value}} object")
+    after = form_1040_inputs(updated, **settings)
 
-    # Part IV: Refund or Amount You Owe
-    LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0 = decimal.Decimal(0)
-    LINE35a_wanted_refund_amount = decimal.Decimal(0)
-    LINE36_amount_from_line_34_you_want_applied_to_next_year_credit = decimal.Decimal(0)
-    LINE37_amount_you_owe_line24_minus_line33 = decimal.Decimal(0)
-
-    if LINE33_total_payments_add_lines_25d_26_32 > LINE24_total_tax_add_line22_and_line23:
-        LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0 = LINE33_total_payments_add_lines_25d_26_32 - LINE24_total_tax_add_line22_and_line23
-        LINE35a_wanted_refund_amount = LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0 # Assuming full refund unless specified otherwise
-    else:
-        LINE37_amount_you_owe_line24_minus_line33 = LINE24_total_tax_add_line22_and_line23 - LINE33_total_payments_add_lines_25d_26_32
-
-    form_1040_fields.update({
-        "LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0": LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0,
-        "LINE35a_wanted_refund_amount": LINE35a_wanted_refund_amount,
-        "LINE36_amount_from_line_34_you_want_applied_to_next_year_credit": LINE36_amount_from_line_34_you_want_applied_to_next_year_credit, # Not specified, assuming 0
-        "LINE37_amount_you_owe_line24_minus_line33": LINE37_amount_you_owe_line24_minus_line33,
-    })
-
-    return form_1040_fields
+    changed_inputs = [name for name in set(before) | set(after) if before.get(name) != after.get(name)]
+    values, changed, evaluated = FORM_1040_GRAPH.evaluate(after, previous, changed_inputs)
+    return {
+        "forms_data": updated,
+        "changed": changed,
+        "changed_inputs": sorted(changed_inputs),
+        "lines_evaluated": evaluated,
+        "lines_total": len(FORM_1040_GRAPH.lines),
+    }
 
 # Example Usage with your provided data:
 final_forms_data = {
@@ -0,0 +1,295 @@
+import decimal
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from form_records import normalize_forms, parse_amount
+from tac_calc import calculate_form_1040_values
+from tax_tables import TAX_METHOD, get_tax_schedule
+
+# Extracted fields the 1040 reads, as "form.field" columns (see calculate_form_1040_values)
+INPUT_COLUMNS = [
+    "form_w2.wages_tips_other_compensation",
+    "form_1099_nec.nonemployee_compensation",
+    "schedule_1.total_additional_income",
+    "schedule_1.total_adjustments_to_income",
+    "schedule_2.total_part1_tax",
+    "schedule_8812.child_tax_credit_and_credit_for_other_dependents",
+    "schedule_3.total_nonrefundable_credits",
+    "schedule_2.total_other_taxes",
+    "form_w2.federal_income_tax_withheld",
+    "form_1099_nec.federal_income_tax_withheld",
+    "schedule_8812.additional_child_tax_credit",
+    "form_8863.refundable_american_opportunity_credit",
+    "schedule_3.total_payments_and_refundable_credits",
+]
+
+# Largest what-if sweep accepted (the product of the grid sizes); every line costs 8 bytes per point
+SWEEP_MAX_POINTS = int(os.environ.get('SWEEP_MAX_POINTS', '250000'))
+
+# Points per streamed chunk of sweep results
+SWEEP_CHUNK_POINTS = int(os.environ.get('SWEEP_CHUNK_POINTS', '5000'))
+
+
+def parse_cents(value: Any) -> int:
+    """An amount in cents, parsed like form records ("$1,234.5" -> 123450; blank or unreadable -> 0)"""
+    return parse_amount(value)[0] or 0
+
+
+def columns_from_returns(returns: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Turn many returns (forms_data dicts, or their form_records records) into int64 cent
+    columns keyed by INPUT_COLUMNS
+    """
+    values = {column: [] for column in INPUT_COLUMNS}
+    fields = [(column, *column.split(".", 1)) for column in INPUT_COLUMNS]
+    for forms_data in returns:
+        records = normalize_forms(forms_data)
+        for column, form_name, field_name in fields:
+            values[column].append(getattr(records.get(form_name), field_name, None) or 0)
+    return {column: np.array(column_values, dtype=np.int64) for column, column_values in values.items()}
+
+
+def calculate_1040_batch(columns: Dict[str, np.ndarray], tax_year: Optional[int] = None,
+                         filing_status: Optional[str] = None, tax_method: str = TAX_METHOD,
+                         broadcast: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Every numeric 1040 line (1a to 37) for many returns at once, as int64 cent arrays
+    keyed like calculate_form_1040_values. Missing columns count as zero.
+
+    One-element columns stand for a value shared by every return, and lines that read
+    only those are computed once. With broadcast=False such lines are returned as they
+    are; otherwise every line is (a read-only view) as long as the longest column.
+    """
+    tax_schedule = get_tax_schedule(tax_year, filing_status)
+    size = max((len(values) for values in columns.values()), default=0)
+    zeros = np.zeros(1, dtype=np.int64)
+
+    def column(name):
+        return columns.get(name, zeros)
+
+    lines = {}
+    # Part I: Income
+    lines["LINE1a_total_amount_from_w2"] = column("form_w2.wages_tips_other_compensation")
+    lines["LINE1h_other_earned_income"] = column("form_1099_nec.nonemployee_compensation")
+    lines["LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income"] = lines["LINE1a_total_amount_from_w2"] + lines["LINE1h_other_earned_income"]
+    lines["LINE8_additional_income_from_schedule1"] = column("schedule_1.total_additional_income")
+    lines["LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income"] = lines["LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income"] + lines["LINE8_additional_income_from_schedule1"]
+    lines["LINE10_adjustments_to_income_from_sched1"] = column("schedule_1.total_adjustments_to_income")
+    lines["LINE11_adjusted_gross_income_equals_total_income_minus_adjustments"] = lines["LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income"] - lines["LINE10_adjustments_to_income_from_sched1"]
+
+    # Part II: Tax and Credits
+    lines["LINE12_standard_deductions_or_itemized_deductions"] = np.full(1, tax_schedule.standard_deduction_cents, dtype=np.int64)
+    lines["LINE13_qbi_deduction_form_8995"] = zeros
+    lines["LINE14_total_deductions_add_line12_and_line13"] = lines["LINE12_standard_deductions_or_itemized_deductions"] + lines["LINE13_qbi_deduction_form_8995"]
+    lines["LINE15_taxable_income"] = np.maximum(0, lines["LINE11_adjusted_gross_income_equals_total_income_minus_adjustments"] - lines["LINE14_total_deductions_add_line12_and_line13"])
+    lines["LINE16_calculated_tax"] = tax_schedule.tax_cents(lines["LINE15_taxable_income"], tax_method)
+    lines["LINE17_amount_tax_schedule2_line3"] = column("schedule_2.total_part1_tax")
+    lines["LINE18_SUM_LINE16_AND_17"] = lines["LINE16_calculated_tax"] + lines["LINE17_amount_tax_schedule2_line3"]
+    lines["LINE19_child_and_dependent_tax_credit_from_schedule_8812"] = column("schedule_8812.child_tax_credit_and_credit_for_other_dependents")
+    lines["LINE20_amount_from_sched3_line8"] = column("schedule_3.total_nonrefundable_credits")
+    lines["LINE21_SUM_LINE19_AND_20"] = lines["LINE19_child_and_dependent_tax_credit_from_schedule_8812"] + lines["LINE20_amount_from_sched3_line8"]
+    lines["LINE22_equals_line18_minus_line21_if_positive_else_0"] = np.maximum(0, lines["LINE18_SUM_LINE16_AND_17"] - lines["LINE21_SUM_LINE19_AND_20"])
+    lines["LINE23_other_taxes_from_sched2_line21"] = column("schedule_2.total_other_taxes")
+    lines["LINE24_total_tax_add_line22_and_line23"] = lines["LINE22_equals_line18_minus_line21_if_positive_else_0"] + lines["LINE23_other_taxes_from_sched2_line21"]
+
+    # Part III: Payments
+    lines["LINE25a_fed_withholding_w2"] = column("form_w2.federal_income_tax_withheld")
+    lines["LINE25b_fed_withholding_1099"] = column("form_1099_nec.federal_income_tax_withheld")
+    lines["LINE25c_fed_withholding_other_forms"] = zeros
+    lines["LINE25d_fed_total_withholding_payments_sum_25a_25b_25c"] = lines["LINE25a_fed_withholding_w2"] + lines["LINE25b_fed_withholding_1099"] + lines["LINE25c_fed_withholding_other_forms"]
+    lines["LINE26_estimated_tax_payments"] = zeros
+    lines["LINE27_earned_income_credit"] = zeros
+    lines["LINE28_additional_child_tax_credit_from_schedule_8812"] = column("schedule_8812.additional_child_tax_credit")
+    lines["LINE29_american_opportunity_credit_from_schedule_8863_line8"] = column("form_8863.refundable_american_opportunity_credit")
+    lines["LINE31_amount_from_sched3_line15"] = column("schedule_3.total_payments_and_refundable_credits")
+    lines["LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31"] = (
+        lines["LINE26_estimated_tax_payments"] + lines["LINE27_earned_income_credit"]
+        + lines["LINE28_additional_child_tax_credit_from_schedule_8812"]
+        + lines["LINE29_american_opportunity_credit_from_schedule_8863_line8"] + lines["LINE31_amount_from_sched3_line15"]
+    )
+    lines["LINE33_total_payments_add_lines_25d_26_32"] = (
+        lines["LINE25d_fed_total_withholding_payments_sum_25a_25b_25c"] + lines["LINE26_estimated_tax_payments"]
+        + lines["LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31"]
+    )
+
+    # Part IV: Refund or Amount You Owe
+    balance = lines["LINE33_total_payments_add_lines_25d_26_32"] - lines["LINE24_total_tax_add_line22_and_line23"]
+    lines["LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0"] = np.maximum(balance, 0)
+    lines["LINE35a_wanted_refund_amount"] = lines["LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0"]
+    lines["LINE36_amount_from_line_34_you_want_applied_to_next_year_credit"] = zeros
+    lines["LINE37_amount_you_owe_line24_minus_line33"] = np.maximum(-balance, 0)
+
+    if broadcast:
+        return {name: np.broadcast_to(values, size) for name, values in lines.items()}
+    return lines
+
+
+def sweep_values(spec: Dict[str, Any], base_cents: int) -> np.ndarray:
+    """
+    The cent values one sweep parameter takes: "values" (amounts), "start"/"stop"/"step"
+    (amounts, stop included) or "scale" (factors applied to the base return's value)
+    """
+    if "values" in spec:
+        values = [parse_cents(value) for value in spec["values"]]
+    elif "scale" in spec:
+        try:
+            factors = [decimal.Decimal(str(factor)) for factor in spec["scale"]]
+        except decimal.InvalidOperation:
+            raise ValueError(f"{spec.get('field')}: scale factors must be numbers")
+        values = [int((base_cents * factor).to_integral_value(rounding=decimal.ROUND_HALF_EVEN)) for factor in factors]
+    elif "start" in spec and "stop" in spec and "step" in spec:
+        start, stop, step = parse_cents(spec["start"]), parse_cents(spec["stop"]), parse_cents(spec["step"])
+        if step <= 0:
+            raise ValueError(f"{spec.get('field')}: step must be positive")
+        count = max(0, (stop - start) // step + 1)
+        if count > SWEEP_MAX_POINTS:
+            raise ValueError(f"{spec.get('field')}: {count} values, over the {SWEEP_MAX_POINTS} point limit")
+        values = np.arange(start, stop + 1, step, dtype=np.int64)
+    else:
+        raise ValueError(f"{spec.get('field')}: give 'values', 'scale' or 'start', 'stop' and 'step'")
+    if not len(values):
+        raise ValueError(f"{spec.get('field')}: no values to sweep")
+    return np.asarray(values, dtype=np.int64)
+
+
+def sweep_scenarios(forms_data: Dict[str, Any], grids: List[Dict[str, Any]], tax_year: Optional[int] = None,
+                    filing_status: Optional[str] = None, tax_method: str = TAX_METHOD) -> Dict[str, Any]:
+    """
+    What-if sweep: the 1040 for every combination of the grids' values applied to one
+    return, in one batch. Each grid is {"field": "form.field" from INPUT_COLUMNS, ...}
+    with its values as in sweep_values. Point i is the row-major index over the grids
+    (the last grid varies fastest).
+
+    Returns the grids' values, the grid shape and every line as a cent array: one
+    element for lines no swept field reaches (computed once), one per point otherwise.
+    """
+    base = columns_from_returns([forms_data])
+    parameters = []
+    for spec in grids:
+        field = spec.get("field") if isinstance(spec, dict) else None
+        if field not in base:
+            raise ValueError(f"Cannot sweep {field!r}; sweepable fields: {', '.join(INPUT_COLUMNS)}")
+        if any(parameter["field"] == field for parameter in parameters):
+            raise ValueError(f"{field} is swept twice")
+        parameters.append({"field": field, "values": sweep_values(spec, int(base[field][0]))})
+
+    shape = [len(parameter["values"]) for parameter in parameters]
+    points = 1
+    for size in shape:
+        points *= size
+    if points > SWEEP_MAX_POINTS:
+        raise ValueError(f"{points} scenarios, over the {SWEEP_MAX_POINTS} point limit")
+
+    columns = dict(base)
+    repeat = points
+    for parameter, size in zip(parameters, shape):
+        # Row-major: each value repeats for every combination of the grids after it
+        repeat //= size
+        columns[parameter["field"]] = np.tile(np.repeat(parameter["values"], repeat), points // (size * repeat))
+
+    return {
+        "parameters": parameters,
+        "shape": shape,
+        "points": points,
+        "lines": calculate_1040_batch(columns, tax_year, filing_status, tax_method, broadcast=False),
+    }
+
+
+def iter_sweep_records(sweep: Dict[str, Any], lines: Optional[List[str]] = None,
+                       chunk_points: int = SWEEP_CHUNK_POINTS) -> Iterator[Dict[str, Any]]:
+    """
+    A sweep as compact JSON-ready records, amounts in cents: a "sweep" header with the
+    grids and the lines that are the same at every point, then "points" records holding
+    a column per varying line for the next `chunk_points` points
+    """
+    selected = {name: values for name, values in sweep["lines"].items() if lines is None or name in lines}
+    constant = {name: int(values[0]) for name, values in selected.items() if len(values) == 1 or sweep["points"] == 1}
+    varying = [name for name in selected if name not in constant]
+    yield {
+        "type": "sweep",
+        "unit": "cents",
+        "points": sweep["points"],
+        "shape": sweep["shape"],
+        "parameters": [{"field": parameter["field"], "values": parameter["values"].tolist()} for parameter in sweep["parameters"]],
+        "constant_lines": constant,
+        "lines": varying,
+    }
+    if not varying:
+        return
+    for offset in range(0, sweep["points"], chunk_points):
+        count = min(chunk_points, sweep["points"] - offset)
+        yield {
+            "type": "points",
+            "offset": offset,
+            "count": count,
+            "columns": {name: selected[name][offset:offset + count].tolist() for name in varying},
+        }
+
+
+def lines_for_return(lines: Dict[str, np.ndarray], index: int) -> Dict[str, decimal.Decimal]:
+    """One return's lines as Decimal dollars, comparable with calculate_form_1040_values"""
+    return {name: decimal.Decimal(int(values[index])).scaleb(-2) for name, values in lines.items()}
+
+
+def random_returns(count: int, seed: int = 0, max_dollars: int = 800_000) -> List[Dict[str, Any]]:
+    """
+    Random forms_data dicts for equivalence checks: amounts in whole cents (sometimes
+    "$1,234.56" formatted, blank or unreadable), some forms missing.
+    tac_calc adds lines at 10 significant digits, which rounds totals past $100M;
+    amounts stay far below that, where it is exact.
+    """
+    rng = random.Random(seed)
+
+    def amount():
+        roll = rng.random()
+        if roll < 0.1:
+            return "0"
+        if roll < 0.13:
+            return rng.choice(["", "n/a", "-"])
+        cents = rng.randrange(0, max_dollars * 100 if roll < 0.5 else 20_000_000)
+        dollars = cents // 100
+        fraction = f".{cents % 100:02d}" if rng.random() < 0.7 else ""
+        if rng.random() < 0.2:
+            return f"${dollars:,}{fraction}"
+        return f"{'-' if rng.random() < 0.02 else ''}{dollars}{fraction}"
+
+    returns = []
+    for _ in range(count):
+        forms_data = {}
+        for column in INPUT_COLUMNS:
+            form_name, field_name = column.split(".", 1)
+            if rng.random() < 0.85:
+                forms_data.setdefault(form_name, {})[field_name] = amount()
+        returns.append(forms_data)
+    return returns
+
+
+if __name__ == "__main__":
+    # Timing: python tax_batch.py [returns] (equivalence with tac_calc is checked in tests/test_tax_batch.py)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    returns = random_returns(count, seed=1)
+    started = time.perf_counter()
+    for forms_data in returns:
+        calculate_form_1040_values(forms_data)
+    scalar_s = time.perf_counter() - started
+    started = time.perf_counter()
+    columns = columns_from_returns(returns)
+    parse_s = time.perf_counter() - started
+    started = time.perf_counter()
+    calculate_1040_batch(columns)
+    batch_s = time.perf_counter() - started
+    print(f"scalar {scalar_s * 1000:.0f} ms, batch {batch_s * 1000:.1f} ms (+ {parse_s * 1000:.0f} ms to build columns)")
+
+    started = time.perf_counter()
+    sweep = sweep_scenarios(returns[0], [
+        {"field": "form_1099_nec.nonemployee_compensation", "start": 5000, "stop": 54000, "step": 1000},
+        {"field": "schedule_1.total_adjustments_to_income", "scale": [0, 0.5, 1, 2]},
+        {"field": "form_w2.wages_tips_other_compensation", "start": 0, "stop": 98000, "step": 2000},
+    ])
+    sweep_s = time.perf_counter() - started
+    print(f"sweep of {sweep['points']} scenarios {sweep_s * 1000:.1f} ms")
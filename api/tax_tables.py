@@ -0,0 +1,256 @@
+import bisect
+import decimal
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from form_records import cents_to_decimal
+
+# Brackets and standard deductions by tax year and filing status
+TAX_TABLES_PATH = os.environ.get(
+    'TAX_TABLES_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "tax_tables.json"),
+)
+
+# Year and filing status used when a return does not say
+DEFAULT_TAX_YEAR = int(os.environ.get('DEFAULT_TAX_YEAR', '2024'))
+DEFAULT_FILING_STATUS = os.environ.get('DEFAULT_FILING_STATUS', 'single')
+
+# "schedule" taxes the exact taxable income; "table" reads the IRS Tax Table below TAX_TABLE_CEILING
+# like Form 1040 line 16 does, and falls back to the schedule above it
+TAX_METHOD = os.environ.get('TAX_METHOD', 'schedule')
+TAX_METHODS = ("schedule", "table")
+
+# The IRS Tax Table covers taxable income under $100,000
+TAX_TABLE_CEILING = 100_000
+
+# Rates are held in basis points, so integer tax amounts are in cents x RATE_SCALE until rounded
+RATE_SCALE = 10_000
+
+CENT = decimal.Decimal("0.01")
+
+# Wide enough for any lookup to be exact, whatever the global precision tac_calc sets
+_EXACT = decimal.Context(prec=28, rounding=decimal.ROUND_HALF_EVEN)
+
+
+class TaxTableError(ValueError):
+    """Raised for a tax year, filing status or method the tables do not cover, or a malformed tables file"""
+
+
+def _dollars_to_cents(value: Any) -> int:
+    cents = decimal.Decimal(str(value)) * 100
+    if cents != cents.to_integral_value():
+        raise TaxTableError(f"{value} is not a whole number of cents")
+    return int(cents)
+
+
+def _rate_to_basis_points(value: Any) -> int:
+    basis_points = decimal.Decimal(str(value)) * RATE_SCALE
+    if basis_points != basis_points.to_integral_value():
+        raise TaxTableError(f"Rate {value} is finer than a basis point")
+    return int(basis_points)
+
+
+def tax_table_bands() -> List[int]:
+    """
+    Lower edges of the IRS Tax Table rows in dollars, ending with TAX_TABLE_CEILING:
+    $0-5, $5-15, $15-25, then $25 rows up to $3,000 and $50 rows up to $100,000
+    """
+    return [0, 5, 15] + list(range(25, 3000, 25)) + list(range(3000, TAX_TABLE_CEILING + 1, 50))
+
+
+class TaxSchedule:
+    """
+    The rate schedule and standard deduction of one tax year and filing status, compiled
+    for lookups: the tax owed at the start of each bracket is precomputed, so the tax on an
+    income is a bisect for its bracket plus one multiply. The IRS Tax Table (the tax on the
+    midpoint of each row, rounded to whole dollars) is precomputed too.
+
+    Decimal lookups (`tax`) serve tac_calc; int64 cent arrays serve the batch engine.
+    """
+
+    def __init__(self, tax_year: int, filing_status: str, brackets: List[Tuple[Any, Any]], standard_deduction: Any):
+        self.tax_year = tax_year
+        self.filing_status = filing_status
+        starts_cents = [_dollars_to_cents(start) for start, _ in brackets]
+        rates_basis_points = [_rate_to_basis_points(rate) for _, rate in brackets]
+        if not starts_cents or starts_cents[0] != 0 or starts_cents != sorted(set(starts_cents)):
+            raise TaxTableError(f"{tax_year} {filing_status}: brackets must start at 0 and increase")
+
+        # Tax owed at the start of each bracket, in cents x RATE_SCALE
+        base = [0]
+        for index in range(1, len(starts_cents)):
+            base.append(base[-1] + (starts_cents[index] - starts_cents[index - 1]) * rates_basis_points[index - 1])
+
+        self.standard_deduction_cents = _dollars_to_cents(standard_deduction)
+        # Whole dollars stay whole (14600, not 14600.00), so lines 12-15 read as they always have
+        self.standard_deduction = cents_to_decimal(self.standard_deduction_cents)
+        self.starts = [decimal.Decimal(cents).scaleb(-2) for cents in starts_cents]
+        self.rates = [decimal.Decimal(basis_points).scaleb(-4) for basis_points in rates_basis_points]
+        self.base = [decimal.Decimal(units).scaleb(-6) for units in base]
+
+        self.starts_cents = np.array(starts_cents, dtype=np.int64)
+        self.rates_basis_points = np.array(rates_basis_points, dtype=np.int64)
+        self.base_units = np.array(base, dtype=np.int64)
+
+        # IRS Tax Table: row lower edges and the tax for each row, in cents
+        edges = [dollars * 100 for dollars in tax_table_bands()]
+        midpoints = np.array([(low + high) // 2 for low, high in zip(edges, edges[1:])], dtype=np.int64)
+        # The table rounds the tax at the midpoint to the nearest dollar, halves up
+        midpoint_units = self._schedule_units(midpoints)
+        self.table_edges_cents = np.array(edges[:-1], dtype=np.int64)
+        self.table_tax_cents = (midpoint_units + 50 * RATE_SCALE) // (100 * RATE_SCALE) * 100
+        self.table_edges = [decimal.Decimal(cents).scaleb(-2) for cents in edges[:-1]]
+        self.table_tax = [decimal.Decimal(int(cents)).scaleb(-2) for cents in self.table_tax_cents]
+        self.table_ceiling = decimal.Decimal(TAX_TABLE_CEILING)
+
+    def _schedule_units(self, taxable_cents: np.ndarray) -> np.ndarray:
+        bracket = np.searchsorted(self.starts_cents, taxable_cents, side="right") - 1
+        return self.base_units[bracket] + (taxable_cents - self.starts_cents[bracket]) * self.rates_basis_points[bracket]
+
+    def tax(self, taxable_income: decimal.Decimal, method: str = TAX_METHOD) -> decimal.Decimal:
+        """Tax on a taxable income in dollars, to the cent (whole dollars from the Tax Table)"""
+        if method not in TAX_METHODS:
+            raise TaxTableError(f"Unknown tax method {method!r}; expected one of {', '.join(TAX_METHODS)}")
+        if taxable_income <= 0:
+            return CENT * 0
+        if method == "table" and taxable_income < self.table_ceiling:
+            return self.table_tax[bisect.bisect_right(self.table_edges, taxable_income) - 1]
+        bracket = bisect.bisect_right(self.starts, taxable_income) - 1
+        owed = _EXACT.add(self.base[bracket], _EXACT.multiply(_EXACT.subtract(taxable_income, self.starts[bracket]), self.rates[bracket]))
+        return _EXACT.quantize(owed, CENT)
+
+    def tax_cents(self, taxable_cents: np.ndarray, method: str = TAX_METHOD) -> np.ndarray:
+        """`tax` over an int64 array of taxable incomes in cents"""
+        if method not in TAX_METHODS:
+            raise TaxTableError(f"Unknown tax method {method!r}; expected one of {', '.join(TAX_METHODS)}")
+        taxable_cents = np.maximum(np.asarray(taxable_cents, dtype=np.int64), 0)
+        # Cents x RATE_SCALE to cents, rounding half to even like Decimal.quantize
+        quotient, remainder = np.divmod(self._schedule_units(taxable_cents), RATE_SCALE)
+        owed = quotient + ((remainder > RATE_SCALE // 2) | ((remainder == RATE_SCALE // 2) & (quotient % 2 == 1)))
+        if method == "table":
+            in_table = taxable_cents < TAX_TABLE_CEILING * 100
+            row = np.searchsorted(self.table_edges_cents, taxable_cents, side="right") - 1
+            owed = np.where(in_table, self.table_tax_cents[np.minimum(row, len(self.table_tax_cents) - 1)], owed)
+        return owed
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "standard_deduction": str(self.standard_deduction),
+            "brackets": [
+                {"start": str(start), "rate": str(rate.normalize()), "tax_at_start": str(base.quantize(CENT))}
+                for start, rate, base in zip(self.starts, self.rates, self.base)
+            ],
+        }
+
+
+def load_tax_tables(path: str = TAX_TABLES_PATH) -> Dict[Tuple[int, str], TaxSchedule]:
+    """Compile every year and filing status in the tables file"""
+    with open(path, encoding="utf-8") as source:
+        raw = json.load(source)
+    schedules = {}
+    try:
+        for year, entry in raw.items():
+            for status, figures in entry["filing_statuses"].items():
+                schedules[(int(year), status)] = TaxSchedule(int(year), status, figures["brackets"], figures["standard_deduction"])
+    except (KeyError, TypeError, ValueError, decimal.InvalidOperation) as e:
+        raise TaxTableError(f"Malformed tax tables in {path}: {e}") from e
+    return schedules
+
+
+_schedules: Optional[Dict[Tuple[int, str], TaxSchedule]] = None
+_schedules_lock = threading.Lock()
+
+
+def tax_schedules() -> Dict[Tuple[int, str], TaxSchedule]:
+    """Every compiled schedule, loaded from TAX_TABLES_PATH on first use"""
+    global _schedules
+    if _schedules is None:
+        with _schedules_lock:
+            if _schedules is None:
+                _schedules = load_tax_tables()
+    return _schedules
+
+
+def get_tax_schedule(tax_year: Optional[int] = None, filing_status: Optional[str] = None) -> TaxSchedule:
+    """The compiled schedule for a year and filing status (defaults from the environment)"""
+    tax_year = DEFAULT_TAX_YEAR if tax_year is None else int(tax_year)
+    filing_status = filing_status or DEFAULT_FILING_STATUS
+    schedule = tax_schedules().get((tax_year, filing_status))
+    if schedule is None:
+        covered = ", ".join(f"{year} {status}" for year, status in sorted(tax_schedules()))
+        raise TaxTableError(f"No tax table for {tax_year} {filing_status}; covered: {covered}")
+    return schedule
+
+
+def describe_tax_tables() -> Dict[str, Any]:
+    """Years, filing statuses, standard deductions and brackets the tables cover"""
+    years: Dict[str, Any] = {}
+    for (year, status), schedule in sorted(tax_schedules().items()):
+        years.setdefault(str(year), {})[status] = schedule.describe()
+    return {
+        "default_tax_year": DEFAULT_TAX_YEAR,
+        "default_filing_status": DEFAULT_FILING_STATUS,
+        "method": TAX_METHOD,
+        "years": years,
+    }
+
+
+def _walk_brackets(schedule: TaxSchedule, taxable_income: decimal.Decimal) -> decimal.Decimal:
+    """The tax worked out bracket by bracket, as tac_calc used to"""
+    owed = decimal.Decimal(0)
+    for index, (start, rate) in enumerate(zip(schedule.starts, schedule.rates)):
+        end = schedule.starts[index + 1] if index + 1 < len(schedule.starts) else None
+        if taxable_income <= start:
+            break
+        owed = _EXACT.add(owed, _EXACT.multiply(_EXACT.subtract(min(taxable_income, end) if end is not None else taxable_income, start), rate))
+    return _EXACT.quantize(owed, CENT)
+
+
+if __name__ == "__main__":
+    # Check lookups against a bracket walk and time them: python tax_tables.py [incomes]
+    import random
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rng = random.Random(0)
+    incomes = [decimal.Decimal(rng.randrange(0, 150_000_000)).scaleb(-2) for _ in range(count)]
+    mismatches = 0
+    for (year, status), schedule in sorted(tax_schedules().items()):
+        edges = [start + offset for start in schedule.starts for offset in (-CENT, 0, CENT)]
+        cents = np.array([int(income * 100) for income in incomes + edges], dtype=np.int64)
+        batch = {method: schedule.tax_cents(cents, method) for method in TAX_METHODS}
+        for index, income in enumerate(incomes + edges):
+            expected = _walk_brackets(schedule, income)
+            if income >= TAX_TABLE_CEILING or income < 0:
+                table = expected
+            else:
+                row = bisect.bisect_right(schedule.table_edges, income) - 1
+                low = schedule.table_edges[row]
+                high = schedule.table_edges[row + 1] if row + 1 < len(schedule.table_edges) else schedule.table_ceiling
+                table = _walk_brackets(schedule, (low + high) / 2).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP)
+            checks = [
+                (schedule.tax(income, "schedule"), expected),
+                (decimal.Decimal(int(batch["schedule"][index])).scaleb(-2), expected),
+                (schedule.tax(income, "table"), table),
+                (decimal.Decimal(int(batch["table"][index])).scaleb(-2), table),
+            ]
+            for actual, wanted in checks:
+                if actual != wanted:
+                    mismatches += 1
+                    if mismatches <= 10:
+                        print(f"❌ {year} {status} at {income}: {actual} != {wanted}")
+    print(f"{'✅' if not mismatches else '❌'} {len(tax_schedules())} schedules, {count} incomes and bracket edges each, {mismatches} mismatch(es)")
+
+    schedule = get_tax_schedule()
+    for name, function in (("bracket walk", lambda income: _walk_brackets(schedule, income)),
+                           ("schedule lookup", lambda income: schedule.tax(income, "schedule")),
+                           ("table lookup", lambda income: schedule.tax(income, "table"))):
+        started = time.perf_counter()
+        for income in incomes:
+            function(income)
+        print(f"{name:>16}: {(time.perf_counter() - started) / count * 1e6:.2f} µs per income")
@@ -0,0 +1,64 @@
+import random
+import time
+
+import pytest
+
+import docai_dispatcher
+from docai_dispatcher import FakeProcessor, dispatch_iter
+
+
+@pytest.fixture(autouse=True)
+def fast_quota_and_backoff(monkeypatch):
+    # Fresh buckets with a quota and backoff that do not slow the tests down
+    monkeypatch.setattr(docai_dispatcher, "_buckets", {})
+    monkeypatch.setattr(docai_dispatcher, "PROCESSOR_RATE", 10_000.0)
+    monkeypatch.setattr(docai_dispatcher, "PROCESSOR_BURST", 10_000)
+    monkeypatch.setattr(docai_dispatcher, "BACKOFF_BASE", 0.001)
+
+
+def make_jobs(count):
+    """Jobs with distinct contents, so each outcome shows which job it came from"""
+    return [
+        {"processor_id": "fake", "kwargs": {"project_id": "p", "location": "us", "processor_id": "fake",
+                                            "file_content": b"x" * (index + 1), "mime_type": "application/pdf"}}
+        for index in range(count)
+    ]
+
+
+def content_bytes(outcome):
+    return next(entity.mention_text for entity in outcome["result"].entities if entity.type_ == "content_bytes")
+
+
+def test_outcomes_match_their_jobs_in_input_order():
+    jobs = make_jobs(16)
+    outcomes = [None] * len(jobs)
+    finish_order = []
+    for index, outcome in dispatch_iter(jobs, FakeProcessor(latency=0.01, jitter=0.01), max_workers=4):
+        finish_order.append(index)
+        outcomes[index] = outcome
+
+    assert sorted(finish_order) == list(range(len(jobs)))
+    assert [content_bytes(outcome) for outcome in outcomes] == [str(index + 1) for index in range(len(jobs))]
+
+
+def test_transient_failures_are_retried():
+    # One worker keeps the fake's failures in a fixed sequence for the seed
+    random.seed(7)
+    processor = FakeProcessor(latency=0.0, failure_rate=0.3)
+    jobs = make_jobs(20)
+    outcomes = dict(dispatch_iter(jobs, processor, max_workers=1))
+
+    assert all("result" in outcome for outcome in outcomes.values())
+    assert processor.calls > len(jobs)
+
+
+def test_closing_early_cancels_jobs_not_started():
+    processor = FakeProcessor(latency=0.1)
+    jobs = make_jobs(12)
+    outcomes = dispatch_iter(jobs, processor, max_workers=2)
+    next(outcomes)
+    outcomes.close()
+    time.sleep(0.5)
+
+    # At most the two running when it closed, plus the two started as the first ones finished
+    assert processor.calls <= 4
@@ -0,0 +1,46 @@
+import pymupdf
+import pytest
+
+from pdf_templates import TEMPLATE_SOURCES, fill_template, get_template, source_path
+from schemas_ import field_mapping
+from tac_calc import calculate_form_1040_values, final_forms_data
+
+
+def reference_fill(pdf_path, data_to_fill):
+    """The original filler: open the PDF and scan its widgets for each mapped field"""
+    doc = pymupdf.open(pdf_path)
+    try:
+        for user_field_name, value in data_to_fill.items():
+            pdf_field_name = field_mapping.get(user_field_name)
+            if not pdf_field_name:
+                continue
+            for page in doc:
+                widget = next((widget for widget in page.widgets() if widget.field_name == pdf_field_name), None)
+                if widget is not None:
+                    widget.field_value = str(value)
+                    widget.update()
+                    break
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def widget_values(pdf_bytes):
+    doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return {(page.number, widget.field_name): widget.field_value for page in doc for widget in page.widgets()}
+    finally:
+        doc.close()
+
+
+@pytest.mark.parametrize("mode", ["full", "fast"])
+def test_fill_matches_reference_filler(mode):
+    data = calculate_form_1040_values(final_forms_data)
+    expected = widget_values(reference_fill(source_path(TEMPLATE_SOURCES["f1040"]), data))
+    assert "39959" in expected.values()
+
+    output, filled_fields, not_found_fields = fill_template(get_template("f1040"), data, field_mapping, mode)
+
+    assert not_found_fields == []
+    assert len(filled_fields) == len(data)
+    assert widget_values(output) == expected
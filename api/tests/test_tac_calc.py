@@ -0,0 +1,49 @@
+from tac_calc import calculate_form_1040_values, final_forms_data
+
+# Form 1040 of the example return, as the API has always returned it (values as strings)
+EXPECTED_FORM_1040 = {
+    "tax_payer_first_name_and_middle_initial": "Jane",
+    "tax_payer_last_name": "Doe",
+    "tax_payer_ssn": "123451234",
+    "tax_year_last_2_digits": "24",
+    "LINE1a_total_amount_from_w2": "50000",
+    "LINE1h_other_earned_income": "322",
+    "LINE1z_sum_lines_1a_through_1h_total_ie_from_w2_through_other_income": "50322",
+    "LINE8_additional_income_from_schedule1": "4427",
+    "LINE9_sum_income_lines_1z_to_8_from_prev_sum_to_additional_income": "54749",
+    "LINE10_adjustments_to_income_from_sched1": "190",
+    "LINE11_adjusted_gross_income_equals_total_income_minus_adjustments": "54559",
+    "LINE12_standard_deductions_or_itemized_deductions": "14600",
+    "LINE13_qbi_deduction_form_8995": "0",
+    "LINE14_total_deductions_add_line12_and_line13": "14600",
+    "LINE15_taxable_income": "39959",
+    "LINE16_calculated_tax": "4563.08",
+    "LINE17_amount_tax_schedule2_line3": "0",
+    "LINE18_SUM_LINE16_AND_17": "4563.08",
+    "LINE19_child_and_dependent_tax_credit_from_schedule_8812": "4500",
+    "LINE20_amount_from_sched3_line8": "250",
+    "LINE21_SUM_LINE19_AND_20": "4750",
+    "LINE22_equals_line18_minus_line21_if_positive_else_0": "0",
+    "LINE23_other_taxes_from_sched2_line21": "2500",
+    "LINE24_total_tax_add_line22_and_line23": "2500",
+    "LINE25a_fed_withholding_w2": "7500",
+    "LINE25b_fed_withholding_1099": "764",
+    "LINE25c_fed_withholding_other_forms": "0",
+    "LINE25d_fed_total_withholding_payments_sum_25a_25b_25c": "8264",
+    "LINE26_estimated_tax_payments": "0",
+    "LINE27_earned_income_credit": "0",
+    "LINE28_additional_child_tax_credit_from_schedule_8812": "0",
+    "LINE29_american_opportunity_credit_from_schedule_8863_line8": "0",
+    "LINE31_amount_from_sched3_line15": "0",
+    "LINE32_total_other_payments_or_refundable_credits_sum_lines_27_28_29_31": "0",
+    "LINE33_total_payments_add_lines_25d_26_32": "8264",
+    "LINE34_overpayment_amount_line33_minus_line24_if_positive_else_0": "5764",
+    "LINE35a_wanted_refund_amount": "5764",
+    "LINE36_amount_from_line_34_you_want_applied_to_next_year_credit": "0",
+    "LINE37_amount_you_owe_line24_minus_line33": "0",
+}
+
+
+def test_example_return_matches_previous_output():
+    values = calculate_form_1040_values(final_forms_data)
+    assert {field: str(value) for field, value in values.items()} == EXPECTED_FORM_1040
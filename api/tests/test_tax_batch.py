@@ -0,0 +1,42 @@
+import pytest
+
+from tac_calc import calculate_form_1040_values, final_forms_data
+from tax_batch import calculate_1040_batch, columns_from_returns, lines_for_return, random_returns
+from tax_tables import DEFAULT_TAX_YEAR, TAX_METHODS, tax_schedules
+
+# Random returns per tax year and filing status (other years get a tenth), from a fixed seed
+RANDOM_RETURNS = 2_000
+SEED = 0
+
+SCHEDULES = sorted(tax_schedules())
+
+
+def returns_for(tax_year, filing_status):
+    """Random returns plus wages a cent either side of every bracket boundary"""
+    returns = random_returns(RANDOM_RETURNS if tax_year == DEFAULT_TAX_YEAR else RANDOM_RETURNS // 10, SEED)
+    tax_schedule = tax_schedules()[(tax_year, filing_status)]
+    for start in tax_schedule.starts_cents.tolist():
+        for offset in (-1, 0, 1):
+            cents = tax_schedule.standard_deduction_cents + start + offset
+            returns.append({"form_w2": {"wages_tips_other_compensation": f"{cents // 100}.{cents % 100:02d}"}})
+    return returns
+
+
+@pytest.mark.parametrize("tax_method", TAX_METHODS)
+@pytest.mark.parametrize("tax_year, filing_status", SCHEDULES)
+def test_batch_matches_scalar(tax_year, filing_status, tax_method):
+    returns = returns_for(tax_year, filing_status)
+    lines = calculate_1040_batch(columns_from_returns(returns), tax_year, filing_status, tax_method)
+    mismatches = []
+    for index, forms_data in enumerate(returns):
+        expected = calculate_form_1040_values(forms_data, tax_year, filing_status, tax_method)
+        for name, value in lines_for_return(lines, index).items():
+            if expected[name] != value:
+                mismatches.append((index, name, expected[name], value))
+    assert mismatches == []
+
+
+def test_example_return():
+    lines = calculate_1040_batch(columns_from_returns([final_forms_data]))
+    expected = calculate_form_1040_values(final_forms_data)
+    assert lines_for_return(lines, 0) == {name: expected[name] for name in lines}
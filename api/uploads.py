@@ -0,0 +1,210 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Uploads up to this size are buffered in memory; larger ones are spooled to a temp file and mmapped
+UPLOAD_SPOOL_BYTES = int(os.environ.get('UPLOAD_SPOOL_BYTES', str(8 * 1024 * 1024)))
+
+# Largest upload request accepted; bigger ones are rejected with 413 before they are read
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', str(100 * 1024 * 1024)))
+
+# Upload bytes held by requests and queued jobs across the whole process
+MAX_INFLIGHT_BYTES = int(os.environ.get('MAX_INFLIGHT_BYTES', str(512 * 1024 * 1024)))
+
+# Seconds a request waits for room under MAX_INFLIGHT_BYTES before it is turned away with 503
+UPLOAD_ADMISSION_TIMEOUT = float(os.environ.get('UPLOAD_ADMISSION_TIMEOUT', '10'))
+
+_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when a request's uploads exceed MAX_REQUEST_BYTES"""
+
+
+class UploadBudgetExceeded(Exception):
+    """Raised when no room frees up under MAX_INFLIGHT_BYTES within the admission timeout"""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ByteBudget:
+    """Process-wide count of upload bytes in flight; callers wait for room before reading"""
+
+    def __init__(self, max_bytes: int = MAX_INFLIGHT_BYTES):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.rejected = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size: int, timeout: float = UPLOAD_ADMISSION_TIMEOUT) -> bool:
+        """Reserve `size` bytes, waiting up to `timeout` seconds; False if there was no room"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            # A request on its own is always let through once nothing else is in flight
+            while self.in_flight and self.in_flight + size > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                self.condition.wait(remaining)
+            self.in_flight += size
+            return True
+
+    def release(self, size: int) -> None:
+        with self.condition:
+            self.in_flight = max(0, self.in_flight - size)
+            self.condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {"in_flight_bytes": self.in_flight, "max_bytes": self.max_bytes, "rejected": self.rejected}
+
+
+UPLOAD_BUDGET = ByteBudget()
+
+
+class UploadBuffer:
+    """
+    One uploaded file, read once. `view` is a memoryview over the only copy of its
+    bytes (a bytearray, or an mmapped temp file past UPLOAD_SPOOL_BYTES) that is
+    hashed, parsed by pymupdf and sent to Document AI without further copies.
+    """
+
+    def __init__(self, stream, size: int, spool_bytes: int = UPLOAD_SPOOL_BYTES):
+        self.size = size
+        self.file = None
+        self.mapping = None
+        digest = hashlib.sha256()
+
+        if size > spool_bytes:
+            self.file = tempfile.TemporaryFile(prefix="upload-")
+            written = 0
+            while True:
+                chunk = stream.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                self.file.write(chunk)
+                written += len(chunk)
+            self.file.flush()
+            self.size = written
+            self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if written else None
+            self.view = memoryview(self.mapping) if self.mapping is not None else memoryview(b"")
+        else:
+            buffer = bytearray(size)
+            view = memoryview(buffer)
+            filled = 0
+            while filled < size:
+                count = stream.readinto(view[filled:filled + _CHUNK_BYTES])
+                if not count:
+                    break
+                digest.update(view[filled:filled + count])
+                filled += count
+            view.release()
+            del buffer[filled:]
+            self.size = filled
+            self.view = memoryview(buffer)
+
+        self.sha256 = digest.hexdigest()
+
+    def close(self) -> None:
+        """Drop the buffer; an mmap still referenced elsewhere is left to the garbage collector"""
+        try:
+            self.view.release()
+            if self.mapping is not None:
+                self.mapping.close()
+        except BufferError:
+            pass
+        if self.file is not None:
+            self.file.close()
+        self.mapping = None
+        self.file = None
+
+
+class UploadBatch(list):
+    """
+    The uploads of one request as {"filename", "content", "sha256", "size"} dicts,
+    holding their share of the in-flight budget until closed. close() is idempotent.
+    """
+
+    def __init__(self, uploads: List[Dict[str, Any]], buffers: List[UploadBuffer],
+                 reserved: int = 0, budget: Optional[ByteBudget] = None):
+        super().__init__(uploads)
+        self.buffers = buffers
+        self.reserved = reserved
+        self.budget = budget
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        with self.lock:
+            buffers, self.buffers = self.buffers, []
+            reserved, self.reserved = self.reserved, 0
+        for upload in self:
+            upload["content"] = None
+        for buffer in buffers:
+            buffer.close()
+        if reserved and self.budget is not None:
+            self.budget.release(reserved)
+
+
+def upload_size(file) -> int:
+    """Size of an uploaded file, found by seeking its stream rather than reading it"""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell() - position
+    stream.seek(position)
+    return size
+
+
+def is_pdf_upload(file) -> bool:
+    return bool(file and file.filename and file.filename.lower().endswith('.pdf'))
+
+
+def read_uploads(files, budget: Optional[ByteBudget] = UPLOAD_BUDGET,
+                 max_request_bytes: int = MAX_REQUEST_BYTES,
+                 timeout: float = UPLOAD_ADMISSION_TIMEOUT) -> UploadBatch:
+    """
+    Read uploaded PDFs once each into an UploadBatch, after reserving their total size
+    under the in-flight budget. Non-PDF uploads get no content.
+    Raises UploadTooLargeError or UploadBudgetExceeded instead of reading anything.
+    """
+    sizes = [upload_size(file) if is_pdf_upload(file) else 0 for file in files]
+    total = sum(sizes)
+    if total > max_request_bytes:
+        raise UploadTooLargeError(f"Uploads total {total} bytes, over the {max_request_bytes} byte limit per request")
+
+    reserved = 0
+    if budget is not None and total:
+        if not budget.acquire(total, timeout):
+            raise UploadBudgetExceeded(f"Server is busy with {budget.stats()['in_flight_bytes']} bytes of uploads; try again shortly")
+        reserved = total
+
+    uploads = []
+    buffers = []
+    try:
+        for file, size in zip(files, sizes):
+            upload = {"filename": file.filename if file else "Unknown", "content": None, "sha256": None, "size": 0}
+            if is_pdf_upload(file):
+                buffer = UploadBuffer(file.stream, size)
+                buffers.append(buffer)
+                upload.update(content=buffer.view, sha256=buffer.sha256, size=buffer.size)
+            uploads.append(upload)
+    except Exception:
+        UploadBatch(uploads, buffers, reserved, budget).close()
+        raise
+
+    return UploadBatch(uploads, buffers, reserved, budget)
+
+
+def close_uploads(uploads) -> None:
+    """Release an upload batch; plain lists of uploads need nothing"""
+    close = getattr(uploads, "close", None)
+    if close:
+        close()
@@ -0,0 +1,75 @@
+# Fillable-PDF widget names for each form, mapped to the entity names the
+# Document AI processors in schemas_.map_forms_to_processor_ids emit.
+# A tuple value means the entity is split across several widgets, joined with "-".
+widget_mapping = {
+    "schedule_1": {
+        "name_of_the_taxpayer": "form1[0].Page1[0].f1_01[0]",
+        "social_security_number": "form1[0].Page1[0].f1_02[0]",
+        "total_additional_income": "form1[0].Page1[0].f1_38[0]",
+        "total_adjustments_to_income": "form1[0].Page2[0].f2_31[0]"
+    },
+    "schedule_2": {
+        "name_of_the_taxpayer": "form1[0].Page1[0].f1_01[0]",
+        "social_security_number": "form1[0].Page1[0].f1_02[0]",
+        "total_part1_tax": "form1[0].Page1[0].f1_13[0]",
+        "total_other_taxes": "form1[0].Page2[0].f2_25[0]"
+    },
+    "schedule_3": {
+        "name_of_the_taxpayer": "topmostSubform[0].Page1[0].f1_01[0]",
+        "social_security_number": "topmostSubform[0].Page1[0].f1_02[0]",
+        "total_nonrefundable_credits": "topmostSubform[0].Page1[0].f1_26[0]",
+        "total_payments_and_refundable_credits": "topmostSubform[0].Page1[0].f1_39[0]"
+    },
+    "schedule_8812": {
+        "name_shown_on_return": "topmostSubform[0].Page1[0].f1_1[0]",
+        "social_security_number": "topmostSubform[0].Page1[0].f1_2[0]",
+        "child_tax_credit_and_credit_for_other_dependents": "topmostSubform[0].Page1[0].f1_19[0]",
+        "additional_child_tax_credit": "topmostSubform[0].Page2[0].f2_15[0]"
+    },
+    "form_8863": {
+        "name_shown_on_return": "topmostSubform[0].Page1[0].f1_1[0]",
+        "social_security_number": (
+            "topmostSubform[0].Page1[0].SocialSecurity[0].f1_2[0]",
+            "topmostSubform[0].Page1[0].SocialSecurity[0].f1_3[0]",
+            "topmostSubform[0].Page1[0].SocialSecurity[0].f1_4[0]"
+        ),
+        "refundable_american_opportunity_credit": "topmostSubform[0].Page1[0].f1_13[0]"
+    },
+    "form_w2": {
+        "employee_social_security_number": "topmostSubform[0].Copy1[0].BoxA_ReadOrder[0].f2_01[0]",
+        "employee_first_name": "topmostSubform[0].Copy1[0].Col_Left[0].FirstName_ReadOrder[0].f2_05[0]",
+        "employee_last_name": "topmostSubform[0].Copy1[0].Col_Left[0].LastName_ReadOrder[0].f2_06[0]",
+        "wages_tips_other_compensation": "topmostSubform[0].Copy1[0].Col_Right[0].Box1_ReadOrder[0].f2_09[0]",
+        "federal_income_tax_withheld": "topmostSubform[0].Copy1[0].Col_Right[0].f2_10[0]"
+    },
+    "form_1099_nec": {
+        "calendar_year": "topmostSubform[0].Copy1[0].Copy1Header[0].CalendarYear[0].f2_1[0]",
+        "payer_name_and_address": "topmostSubform[0].Copy1[0].LeftColumn[0].f2_2[0]",
+        "payer_tin": "topmostSubform[0].Copy1[0].LeftColumn[0].f2_3[0]",
+        "nonemployee_compensation": "topmostSubform[0].Copy1[0].RightColumn[0].f2_9[0]",
+        "federal_income_tax_withheld": "topmostSubform[0].Copy1[0].RightColumn[0].f2_10[0]"
+    }
+}
+
+# Entities the processors read from the printed form title rather than a widget
+widget_form_names = {
+    "schedule_1": "SCHEDULE 1 (Form 1040)",
+    "schedule_2": "SCHEDULE 2 (Form 1040)",
+    "schedule_3": "SCHEDULE 3 (Form 1040)",
+    "schedule_8812": "Schedule 8812 (Form 1040)",
+    "form_8863": "Form 8863",
+    "form_w2": "W-2 Wage and Tax Statement",
+    "form_1099_nec": "Form 1099-NEC"
+}
+
+# Entities the tax calculation depends on; if any is blank the widgets are not
+# trusted and the document goes to Document AI instead
+widget_required_entities = {
+    "schedule_1": ["name_of_the_taxpayer", "total_additional_income"],
+    "schedule_2": ["name_of_the_taxpayer", "total_other_taxes"],
+    "schedule_3": ["name_of_the_taxpayer", "total_nonrefundable_credits"],
+    "schedule_8812": ["name_shown_on_return", "child_tax_credit_and_credit_for_other_dependents"],
+    "form_8863": ["name_shown_on_return", "refundable_american_opportunity_credit"],
+    "form_w2": ["employee_social_security_number", "wages_tips_other_compensation"],
+    "form_1099_nec": ["payer_tin", "nonemployee_compensation"]
+}
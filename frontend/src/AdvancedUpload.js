@@ -15,6 +15,7 @@ function AdvancedUpload() {
   const [pageNumber, setPageNumber] = useState(1);
   const [isProcessing, setIsProcessing] = useState(false);
   const [availableForms, setAvailableForms] = useState([]);
+  const [fileResults, setFileResults] = useState({});
   const navigate = useNavigate();
 
   // Load available forms on component mount
@@ -52,6 +53,7 @@ function AdvancedUpload() {
     }
 
     setUploadedFiles(prevFiles => [...prevFiles, ...pdfFiles]);
+    setFileResults({});
   };
 
   const handleFileSelect = (file) => {
@@ -80,8 +82,10 @@ function AdvancedUpload() {
       });
 
       console.log(`Processing ${uploadedFiles.length} files with Document AI...`);
+      setFileResults({});
 
-      const response = await fetch(`${API_BASE_URL}/api/process-tax-documents`, {
+      // Stream one NDJSON record per form as it finishes, then a summary record
+      const response = await fetch(`${API_BASE_URL}/api/process-tax-documents?stream=ndjson`, {
         method: 'POST',
         body: formData
       });
@@ -90,7 +94,44 @@ function AdvancedUpload() {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const result = await response.json();
+      const records = [];
+      let summary = null;
+      const handleRecord = (record) => {
+        if (record.type === 'result') {
+          records.push(record);
+          setFileResults(prev => ({
+            ...prev,
+            [record.index]: [...(prev[record.index] || []), record.result]
+          }));
+        } else if (record.type === 'summary') {
+          summary = record;
+        } else if (record.type === 'error') {
+          throw new Error(record.error);
+        }
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleRecord(JSON.parse(line)));
+      }
+      if (buffer.trim()) {
+        handleRecord(JSON.parse(buffer));
+      }
+
+      if (!summary) {
+        throw new Error('Processing ended before all results were received');
+      }
+
+      records.sort((a, b) => a.index - b.index || a.sequence - b.sequence);
+      const { type, ...totals } = summary;
+      const result = { ...totals, results: records.map(record => record.result) };
       
       console.log('Document AI processing complete:', result);
 
@@ -108,6 +149,7 @@ function AdvancedUpload() {
   };
 
   const removeFile = (indexToRemove) => {
+    setFileResults({});
     setUploadedFiles(prevFiles => 
       prevFiles.filter((_, index) => index !== indexToRemove)
     );
@@ -263,6 +305,14 @@ function AdvancedUpload() {
                       <small style={{ color: '#666' }}>
                         📏 {(file.size / 1024 / 1024).toFixed(2)} MB
                       </small>
+                      {(fileResults[index] || []).map((result, resultIndex) => (
+                        <div key={resultIndex}>
+                          <small style={{ color: result.status === 'success' ? '#28a745' : result.status === 'warning' ? '#b8860b' : '#dc3545' }}>
+                            {result.status === 'success' ? '✅' : result.status === 'warning' ? '⚠️' : '❌'} {result.filename}
+                            {result.identified_form ? ` — ${result.identified_form}` : ''}
+                          </small>
+                        </div>
+                      ))}
                     </div>
                     <div style={{ display: 'flex', gap: '10px' }}>
                       <button 